@@ -2,13 +2,16 @@ from flask import Flask, request, jsonify
 from flask_cors import CORS
 import os
 import logging
+import threading
+import time
 from dotenv import load_dotenv
-import google.generativeai as genai
 from typing import Dict, Any
 import json
 import re
 from datetime import datetime
 
+import prefork
+
 # Load environment variables
 load_dotenv()
 
@@ -22,39 +25,70 @@ logger = logging.getLogger(__name__)
 
 # Global variables
 gemini_model = None
+gemini_status = 'pending'  # pending, ready or failed
+_gemini_lock = threading.Lock()
+warmup_seconds = None
 
 def initialize_gemini():
-    """Initialize Gemini AI model"""
-    global gemini_model
-    
-    logger.info("🚀 Initializing Gemini AI Service...")
-    
-    # Get API key from environment
-    api_key = os.getenv('GEMINI_API_KEY')
-    if not api_key:
-        logger.error("❌ GEMINI_API_KEY not found in environment variables!")
-        logger.info("Please set your Gemini API key: export GEMINI_API_KEY='your-api-key-here'")
-        return False
+    """Initialize Gemini AI model.
+
+    The google.generativeai SDK is imported here rather than at module load,
+    and no generation request is made: connectivity is checked on demand via
+    /api/test-gemini instead of costing every replica a live call at boot.
+    """
+    global gemini_model, gemini_status
     
-    try:
-        # Configure Gemini
-        genai.configure(api_key=api_key)
-        
-        # Initialize the model
-        gemini_model = genai.GenerativeModel('gemini-pro')
-        
-        # Test the connection
-        test_response = gemini_model.generate_content("Hello, are you working?")
-        logger.info(f"✅ Gemini AI initialized successfully! Test response: {test_response.text[:50]}...")
+    with _gemini_lock:
+        if gemini_model is not None:
+            return True
+
+        logger.info("🚀 Initializing Gemini AI Service...")
         
-        return True
+        # Get API key from environment
+        api_key = os.getenv('GEMINI_API_KEY')
+        if not api_key:
+            logger.error("❌ GEMINI_API_KEY not found in environment variables!")
+            logger.info("Please set your Gemini API key: export GEMINI_API_KEY='your-api-key-here'")
+            gemini_status = 'failed'
+            return False
         
-    except Exception as e:
-        logger.error(f"❌ Failed to initialize Gemini: {e}")
-        return False
+        try:
+            import google.generativeai as genai
+
+            # Configure Gemini
+            genai.configure(api_key=api_key)
+            
+            # Initialize the model
+            gemini_model = genai.GenerativeModel('gemini-pro')
+            gemini_status = 'ready'
+            logger.info("✅ Gemini AI initialized successfully!")
+            
+            return True
+            
+        except Exception as e:
+            logger.error(f"❌ Failed to initialize Gemini: {e}")
+            gemini_status = 'failed'
+            return False
+
+def start_background_warmup() -> threading.Thread:
+    """Initialize Gemini off the request path so traffic is accepted immediately"""
+    def warmup():
+        global warmup_seconds
+        started = time.perf_counter()
+        if not initialize_gemini():
+            logger.error("Failed to initialize Gemini. Please check your API key.")
+            logger.info("Set your API key with: export GEMINI_API_KEY='your-api-key-here'")
+        warmup_seconds = round(time.perf_counter() - started, 3)
+
+    thread = threading.Thread(target=warmup, name='gemini-warmup', daemon=True)
+    thread.start()
+    return thread
 
 def query_gemini(prompt: str, context: str = "") -> Dict[str, Any]:
     """Query Gemini AI model"""
+    if gemini_model is None and gemini_status == 'pending':
+        initialize_gemini()
+
     if not gemini_model:
         return {
             "response": "Gemini AI is not available. Please check your API key configuration.",
@@ -104,14 +138,30 @@ Response:"""
 
 @app.route('/health', methods=['GET'])
 def health_check():
-    """Health check endpoint"""
-    gemini_status = gemini_model is not None
+    """Health check endpoint (liveness plus warm-up details)"""
     return jsonify({
         'status': 'healthy',
-        'gemini_available': gemini_status,
+        'ready': gemini_status != 'pending',
+        'gemini_available': gemini_model is not None,
+        'gemini_status': gemini_status,
+        'warmup_seconds': warmup_seconds,
         'timestamp': datetime.now().isoformat()
     })
 
+@app.route('/health/live', methods=['GET'])
+def liveness_check():
+    """Liveness probe: the process is up and serving requests"""
+    return jsonify({'status': 'alive'})
+
+@app.route('/health/ready', methods=['GET'])
+def readiness_check():
+    """Readiness probe: 503 until background warm-up has finished"""
+    ready = gemini_status != 'pending'
+    return jsonify({
+        'status': 'ready' if ready else 'warming_up',
+        'gemini_status': gemini_status
+    }), 200 if ready else 503
+
 @app.route('/api/query', methods=['POST'])
 def query_ai():
     """Query Gemini AI with context"""
@@ -214,6 +264,8 @@ Document text:"""
 def test_gemini():
     """Test Gemini connection"""
     try:
+        if gemini_model is None:
+            initialize_gemini()
         if not gemini_model:
             return jsonify({
                 'status': 'error',
@@ -236,9 +288,6 @@ def test_gemini():
         }), 500
 
 if __name__ == '__main__':
-    success = initialize_gemini()
-    if not success:
-        logger.error("Failed to initialize Gemini. Please check your API key.")
-        logger.info("Set your API key with: export GEMINI_API_KEY='your-api-key-here'")
-    
-    app.run(host='0.0.0.0', port=5001, debug=True)
+    # Nothing heavy to share here, and gRPC clients must not cross fork(): each worker initializes Gemini itself
+    prefork.run(app, int(os.getenv('PORT', '5001')), post_fork=start_background_warmup,
+                start_dev_server=start_background_warmup)
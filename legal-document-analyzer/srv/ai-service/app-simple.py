@@ -1,18 +1,36 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 import logging
 import re
 import json
-from typing import List, Dict, Any
+import threading
+import time
+from typing import List, Dict, Any, Iterator, Tuple
 from datetime import datetime
 import numpy as np
 import sqlite3
 import os
-from collections import defaultdict
-import math
+from collections import Counter, OrderedDict, defaultdict
+from functools import partial
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import ingestion
+import prefork
+from chunking import iter_chunk_spans
+from clauses import ClauseRecord, compile_clause_patterns, find_clauses
+from embedding_index import EmbeddingIndex
+from revisions import content_key, match_unchanged, paragraph_spans
+from profiling import install_profiler
+from reranking import merge_adjacent, mmr
+from telemetry import instrument_app, response_timings, span
+import wire_format
 
 app = Flask(__name__)
 CORS(app)
+instrument_app(app)
+install_profiler(app)
+wire_format.install_compression(app)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -23,6 +41,17 @@ document_store = {}
 vector_store = {}
 chunk_store = {}
 
+# Worker processes for batch analysis (defaults to one per core); the pool is
+# created on the first batch request
+ANALYSIS_WORKERS = int(os.getenv('ANALYSIS_WORKERS', '0')) or os.cpu_count() or 1
+_analysis_pool = None
+_analysis_pool_lock = threading.Lock()
+
+# Semantic search re-ranks RETRIEVAL_OVERFETCH * top_k candidates by maximal
+# marginal relevance (MMR_DIVERSITY of 0 keeps the plain similarity order)
+RETRIEVAL_OVERFETCH = int(os.getenv('RETRIEVAL_OVERFETCH', '3'))
+MMR_DIVERSITY = float(os.getenv('MMR_DIVERSITY', '0.3'))
+
 def initialize_models():
     """Initialize AI models with enhanced RAG capabilities"""
     logger.info("🚀 AI Service initializing with RAG and Document Analysis...")
@@ -31,56 +60,104 @@ def initialize_models():
 class EnhancedRAGPipeline:
     """Advanced Retrieval-Augmented Generation pipeline for legal documents"""
 
-    def __init__(self):
+    def __init__(self, embedding_storage: str = None):
         self.documents = {}
         self.chunks = {}
-        self.embeddings = {}
+        # Unit-normalized chunk embeddings (float32, float16 or int8); chunk
+        # data records its row and chunk_ids maps rows back to chunks. Rows of
+        # chunks dropped by a new document version are deleted from the index
+        self.embedding_index = EmbeddingIndex(embedding_storage or os.getenv('EMBEDDING_STORAGE', 'float32'))
+        self.chunk_ids = []
         self.chunk_size = 500
         self.overlap = 50
 
     def add_document(self, doc_id: str, text: str, metadata: Dict = None):
         """Add document to RAG knowledge base with chunking and embeddings"""
+        return self.add_document_version(doc_id, text, metadata)['chunks']
+
+    def add_document_version(self, doc_id: str, text: str, metadata: Dict = None) -> Dict:
+        """Add a document or a new revision of it, embedding only changed chunks"""
         logger.info(f"📚 Adding document {doc_id} to RAG pipeline")
 
+        # Create chunks
+        with span('chunking'):
+            chunks = self._create_chunks(text, doc_id)
+
+        # Chunks with the same text as in the stored version keep their rows
+        previous = self.documents.get(doc_id)
+        previous_ids = previous['chunk_ids'] if previous else []
+        with span('diff'):
+            matches = match_unchanged(
+                ((chunk_id, self.get_chunk_text(self.chunks[chunk_id])) for chunk_id in previous_ids),
+                [text[chunk_data['start_offset']:chunk_data['end_offset']] for chunk_data in chunks.values()]
+            )
+        reused_rows = {}
+        for chunk_id, previous_id in zip(chunks, matches):
+            if previous_id is not None:
+                reused_rows[chunk_id] = self.chunks[previous_id]['row']
+
+        # Generate embeddings for new or changed chunks
+        changed = [chunk_id for chunk_id in chunks if chunk_id not in reused_rows]
+        with span('embedding', provider='tfidf'):
+            embeddings = [
+                self._normalize(self._generate_embedding(
+                    text[chunks[chunk_id]['start_offset']:chunks[chunk_id]['end_offset']]))
+                for chunk_id in changed
+            ]
+
+        kept_rows = set(reused_rows.values())
+        self.embedding_index.delete([self.chunks[chunk_id]['row'] for chunk_id in previous_ids
+                                     if self.chunks[chunk_id]['row'] not in kept_rows])
+        for chunk_id in previous_ids:
+            del self.chunks[chunk_id]
+
+        for chunk_id, row in reused_rows.items():
+            chunks[chunk_id]['row'] = row
+            self.chunk_ids[row] = chunk_id
+        if changed:
+            first_row = self.embedding_index.add(embeddings)
+            for offset, chunk_id in enumerate(changed):
+                chunks[chunk_id]['row'] = first_row + offset
+                self.chunk_ids.append(chunk_id)
+
         # Store original document
         self.documents[doc_id] = {
             'text': text,
             'metadata': metadata or {},
-            'added_at': datetime.now().isoformat()
+            'added_at': datetime.now().isoformat(),
+            'chunk_ids': list(chunks)
         }
-
-        # Create chunks
-        chunks = self._create_chunks(text, doc_id)
-
-        # Generate embeddings for each chunk
-        for chunk_id, chunk_data in chunks.items():
-            embedding = self._generate_embedding(chunk_data['text'])
-            self.embeddings[chunk_id] = embedding
-
         self.chunks.update(chunks)
 
-        logger.info(f"✅ Document {doc_id} processed: {len(chunks)} chunks created")
-        return len(chunks)
+        logger.info(f"✅ Document {doc_id} processed: {len(chunks)} chunks, {len(changed)} embedded")
+        return {
+            'chunks': len(chunks),
+            'chunks_embedded': len(changed),
+            'chunks_reused': len(reused_rows),
+            'chunks_removed': len(previous_ids) - len(reused_rows)
+        }
 
     def _create_chunks(self, text: str, doc_id: str) -> Dict:
-        """Split text into overlapping chunks"""
-        words = text.split()
+        """Split text into structure-aware chunks addressed by character offsets"""
         chunks = {}
 
-        for i in range(0, len(words), self.chunk_size - self.overlap):
-            chunk_text = ' '.join(words[i:i + self.chunk_size])
-            chunk_id = f"{doc_id}_chunk_{i // (self.chunk_size - self.overlap)}"
+        for chunk_span in iter_chunk_spans(text, max_words=self.chunk_size, overlap_words=self.overlap):
+            chunk_id = f"{doc_id}_chunk_{chunk_span.index}"
 
             chunks[chunk_id] = {
-                'text': chunk_text,
                 'doc_id': doc_id,
-                'chunk_index': i // (self.chunk_size - self.overlap),
-                'word_start': i,
-                'word_end': min(i + self.chunk_size, len(words))
+                'chunk_index': chunk_span.index,
+                'start_offset': chunk_span.start,
+                'end_offset': chunk_span.end
             }
 
         return chunks
 
+    def get_chunk_text(self, chunk_data: Dict) -> str:
+        """Materialize the text of a chunk from the stored document"""
+        text = self.documents[chunk_data['doc_id']]['text']
+        return text[chunk_data['start_offset']:chunk_data['end_offset']]
+
     def _generate_embedding(self, text: str) -> List[float]:
         """Generate embeddings using TF-IDF-like approach"""
         # Simple TF-IDF-like embedding for demo
@@ -110,30 +187,56 @@ class EnhancedRAGPipeline:
 
         return embedding[:384]
 
-    def semantic_search(self, query: str, top_k: int = 5, doc_id: str = None) -> List[Dict]:
-        """Perform semantic search across document chunks"""
-        query_embedding = self._generate_embedding(query)
-
-        # Calculate similarities
-        similarities = []
-        for chunk_id, chunk_data in self.chunks.items():
-            if doc_id and chunk_data['doc_id'] != doc_id:
-                continue
-
-            chunk_embedding = self.embeddings.get(chunk_id, [])
-            if chunk_embedding:
-                similarity = self._cosine_similarity(query_embedding, chunk_embedding)
-                similarities.append({
+    def semantic_search(self, query: str, top_k: int = 5, doc_id: str = None, diversity: float = None,
+                        merge_adjacent_hits: bool = True) -> List[Dict]:
+        """Perform semantic search across document chunks.
+
+        Over-fetched candidates are diversified with MMR and overlapping or
+        consecutive hits of one document are merged into a single span.
+        """
+        diversity = MMR_DIVERSITY if diversity is None else diversity
+        with span('embedding', provider='tfidf'):
+            query_embedding = self._normalize(self._generate_embedding(query))
+
+        # Restrict the search to the rows of the requested document
+        rows = None
+        if doc_id:
+            document = self.documents.get(doc_id)
+            rows = [self.chunks[chunk_id]['row'] for chunk_id in document['chunk_ids']] if document else []
+
+        # Cosine similarity as dot product of normalized vectors
+        with span('retrieval'):
+            fetch = top_k * RETRIEVAL_OVERFETCH if diversity > 0 else top_k
+            rows, scores = self.embedding_index.search(query_embedding, fetch, rows=rows)
+
+            candidates = []
+            for row, score in zip(rows, scores):
+                chunk_id = self.chunk_ids[row]
+                chunk_data = self.chunks[chunk_id]
+                candidates.append({
                     'chunk_id': chunk_id,
-                    'similarity': similarity,
-                    'text': chunk_data['text'],
+                    'similarity': float(score),
                     'doc_id': chunk_data['doc_id'],
-                    'chunk_index': chunk_data['chunk_index']
+                    'chunk_index': chunk_data['chunk_index'],
+                    'start_offset': chunk_data['start_offset'],
+                    'end_offset': chunk_data['end_offset'],
+                    'text': self.get_chunk_text(chunk_data)
                 })
 
-        # Sort by similarity and return top-k
-        similarities.sort(key=lambda x: x['similarity'], reverse=True)
-        return similarities[:top_k]
+        with span('reranking'):
+            picked = mmr(self.embedding_index.vectors(rows) if diversity > 0 else None,
+                         scores, top_k, diversity)
+            results = [candidates[i] for i in picked]
+            if merge_adjacent_hits:
+                results = merge_adjacent(results, document_key='doc_id',
+                                         source_text=lambda hit: self.documents[hit['doc_id']]['text'])
+        return results
+
+    def _normalize(self, embedding: List[float]) -> np.ndarray:
+        """Scale an embedding to unit length (zero vectors stay zero)"""
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
 
     def _generate_answer(self, question: str, context: str, chunks: List[Dict]) -> Dict:
         """Generate answer based on question and context"""
@@ -287,20 +390,6 @@ class EnhancedRAGPipeline:
 
         return {'text': answer, 'confidence': confidence}
 
-    def _cosine_similarity(self, vec1: List[float], vec2: List[float]) -> float:
-        """Calculate cosine similarity between two vectors"""
-        if len(vec1) != len(vec2):
-            return 0.0
-
-        dot_product = sum(a * b for a, b in zip(vec1, vec2))
-        norm1 = math.sqrt(sum(a * a for a in vec1))
-        norm2 = math.sqrt(sum(a * a for a in vec2))
-
-        if norm1 == 0 or norm2 == 0:
-            return 0.0
-
-        return dot_product / (norm1 * norm2)
-
     def answer_question(self, question: str, doc_id: str = None) -> Dict:
         """Answer question using RAG pipeline"""
         # Retrieve relevant chunks
@@ -315,23 +404,77 @@ class EnhancedRAGPipeline:
             }
 
         # Construct context from relevant chunks
-        context = '\n\n'.join([chunk['text'] for chunk in relevant_chunks])
+        with span('prompt_build'):
+            context = '\n\n'.join([chunk['text'] for chunk in relevant_chunks])
 
         # Generate answer using context
-        answer = self._generate_answer(question, context, relevant_chunks)
+        with span('llm', provider='rule-based'):
+            answer = self._generate_answer(question, context, relevant_chunks)
 
         return {
             'answer': answer['text'],
             'confidence': answer['confidence'],
-            'sources': [chunk['chunk_id'] for chunk in relevant_chunks],
+            'sources': [chunk_id for chunk in relevant_chunks for chunk_id in chunk.get('chunk_ids', [chunk['chunk_id']])],
             'method': 'RAG',
             'context_used': len(relevant_chunks)
         }
 
+class ParagraphFacts:
+    """Counts and matches of one paragraph that document-level analysis aggregates"""
+
+    __slots__ = ('blank', 'words', 'tokens', 'sentences', 'starts_open', 'ends_open',
+                 'term_counts', 'phrases', 'numbered_lines')
+
+
 class LegalClauseExtractor:
     """Enhanced legal clause extraction with AI analysis"""
 
-    def __init__(self):
+    RISK_INDICATORS = {
+        'high_risk': [
+            'unlimited liability', 'no limitation', 'personal guarantee',
+            'indemnify', 'hold harmless', 'liquidated damages'
+        ],
+        'medium_risk': [
+            'material breach', 'immediate termination', 'sole discretion',
+            'as is', 'no warranty', 'force majeure'
+        ],
+        'compliance_risk': [
+            'gdpr', 'privacy', 'data protection', 'regulatory',
+            'compliance', 'audit', 'inspection'
+        ]
+    }
+
+    LEGAL_TERMS = {
+        'contract_terms': ['agreement', 'contract', 'party', 'parties', 'obligation', 'right'],
+        'liability_terms': ['liability', 'damages', 'loss', 'harm', 'injury', 'claim'],
+        'time_terms': ['term', 'duration', 'period', 'expiry', 'renewal', 'notice'],
+        'payment_terms': ['payment', 'fee', 'cost', 'invoice', 'billing', 'charge'],
+        'legal_terms': ['law', 'jurisdiction', 'court', 'dispute', 'arbitration', 'mediation']
+    }
+
+    COMPLIANCE_AREAS = {
+        'data_protection': ['gdpr', 'data protection', 'privacy policy', 'personal data'],
+        'financial': ['sox', 'sarbanes', 'financial reporting', 'audit'],
+        'employment': ['equal opportunity', 'discrimination', 'harassment', 'workplace'],
+        'environmental': ['environmental', 'sustainability', 'carbon', 'emissions'],
+        'security': ['security', 'cybersecurity', 'data breach', 'encryption']
+    }
+
+    SECTION_INDICATORS = ['section', 'article', 'clause', 'paragraph']
+    SIGNATURE_INDICATORS = ['signature', 'signed', 'witness', 'date', 'executed']
+    DOCUMENT_TYPES = ['agreement', 'contract', 'policy']
+    NUMBERED_LINE_PATTERN = re.compile(r'^\s*\d+\.?\s+[A-Z]')
+
+    # Every phrase looked up by substring; none contains a newline, so a
+    # phrase occurs in the document exactly when it occurs in some paragraph
+    PHRASES = frozenset(
+        [ind for inds in RISK_INDICATORS.values() for ind in inds]
+        + [ind for inds in COMPLIANCE_AREAS.values() for ind in inds]
+        + SECTION_INDICATORS + SIGNATURE_INDICATORS + DOCUMENT_TYPES
+    )
+    LEGAL_TERM_SET = frozenset(term for terms in LEGAL_TERMS.values() for term in terms)
+
+    def __init__(self, max_cached_documents: int = 100):
         self.clause_patterns = {
             'liability': [
                 r'liability.*?(?:limited|excluded|disclaimed)',
@@ -363,87 +506,162 @@ class LegalClauseExtractor:
                 r'trademark.*?usage'
             ]
         }
+        self._compiled_patterns = compile_clause_patterns(self.clause_patterns)
+        # doc_id -> {paragraph content key: ParagraphFacts} of the latest analyzed version
+        self._paragraph_cache: 'OrderedDict[str, Dict[bytes, ParagraphFacts]]' = OrderedDict()
+        self.max_cached_documents = max_cached_documents
+        self._cache_lock = threading.Lock()
     
-    def extract_clauses(self, text: str) -> List[Dict[str, Any]]:
+    def extract_clauses(self, text: str) -> List[ClauseRecord]:
         """Extract clauses from legal document text"""
-        clauses = []
-        sentences = self._split_into_sentences(text)
-        
-        for clause_type, patterns in self.clause_patterns.items():
-            for pattern in patterns:
-                matches = re.finditer(pattern, text, re.IGNORECASE | re.DOTALL)
-                for match in matches:
-                    # Extract surrounding context
-                    start_pos = max(0, match.start() - 200)
-                    end_pos = min(len(text), match.end() + 200)
-                    context = text[start_pos:end_pos].strip()
-                    
-                    clause = {
-                        'type': clause_type,
-                        'title': f"{clause_type.replace('_', ' ').title()} Clause",
-                        'content': context,
-                        'confidence': 0.8,  # Pattern-based confidence
-                        'start_position': match.start(),
-                        'end_position': match.end()
-                    }
-                    clauses.append(clause)
-        
-        return clauses
-    
+        with span('clause_extraction'):
+            return find_clauses(text, self._compiled_patterns)
+
     def _split_into_sentences(self, text: str) -> List[str]:
         """Split text into sentences"""
         sentences = re.split(r'[.!?]+', text)
         return [s.strip() for s in sentences if s.strip()]
 
     def analyze_document_comprehensive(self, text: str, doc_id: str = None) -> Dict:
-        """Comprehensive document analysis with AI insights"""
+        """Comprehensive document analysis with AI insights.
+
+        Counts, key terms, risks, structure and compliance are aggregated from
+        per-paragraph facts. When doc_id is given they are cached, so
+        re-analyzing a revised version of the same document only processes
+        the paragraphs that changed. Clauses are matched on the whole text
+        once per analysis, so clauses and their context can span paragraphs.
+        """
         analysis = {
             'document_id': doc_id,
-            'analysis_timestamp': datetime.now().isoformat(),
-            'document_stats': self._get_document_stats(text),
-            'clause_analysis': self._analyze_clauses_advanced(text),
-            'risk_assessment': self._assess_document_risks(text),
-            'key_terms': self._extract_key_terms(text),
-            'document_structure': self._analyze_structure(text),
-            'compliance_indicators': self._check_compliance_indicators(text),
-            'summary': self._generate_document_summary(text)
+            'analysis_timestamp': datetime.now().isoformat()
         }
+        with span('analysis.paragraphs'):
+            facts, reanalyzed = self._paragraph_facts(text, doc_id)
+        clauses = self.extract_clauses(text)
+
+        sections = [
+            ('document_stats', self._get_document_stats),
+            ('clause_analysis', partial(self._analyze_clauses_advanced, clauses=clauses)),
+            ('risk_assessment', self._assess_document_risks),
+            ('key_terms', self._extract_key_terms),
+            ('document_structure', self._analyze_structure),
+            ('compliance_indicators', self._check_compliance_indicators),
+            ('summary', partial(self._generate_document_summary, clauses=clauses))
+        ]
+        for name, analyze in sections:
+            with span(f'analysis.{name}'):
+                analysis[name] = analyze(text, facts)
 
+        analysis['incremental_analysis'] = {
+            'paragraphs': len(facts),
+            'paragraphs_reanalyzed': reanalyzed
+        }
         return analysis
 
-    def _get_document_stats(self, text: str) -> Dict:
+    def _paragraph_facts(self, text: str, doc_id: str = None) -> Tuple[List[Tuple[int, ParagraphFacts]], int]:
+        """(offset, facts) of every paragraph, reusing facts of unchanged paragraphs"""
+        with self._cache_lock:
+            cached = self._paragraph_cache.get(doc_id, {}) if doc_id else {}
+        current = {}
+        facts = []
+        reanalyzed = 0
+
+        for start, end in paragraph_spans(text):
+            paragraph = text[start:end]
+            key = content_key(paragraph)
+            paragraph_facts = current.get(key) or cached.get(key)
+            if paragraph_facts is None:
+                paragraph_facts = self._analyze_paragraph(paragraph)
+                reanalyzed += 1
+            current[key] = paragraph_facts
+            facts.append((start, paragraph_facts))
+
+        if doc_id:
+            with self._cache_lock:
+                self._paragraph_cache[doc_id] = current
+                self._paragraph_cache.move_to_end(doc_id)
+                while len(self._paragraph_cache) > self.max_cached_documents:
+                    self._paragraph_cache.popitem(last=False)
+
+        return facts, reanalyzed
+
+    def _analyze_paragraph(self, paragraph: str) -> ParagraphFacts:
+        """Collect everything document-level analysis needs from one paragraph"""
+        lower = paragraph.lower()
+        pieces = re.split(r'[.!?]+', paragraph)
+
+        facts = ParagraphFacts()
+        facts.blank = not paragraph.strip()
+        facts.words = len(re.findall(r'\w+', paragraph))
+        facts.tokens = len(paragraph.split())
+        facts.sentences = sum(1 for piece in pieces if piece.strip())
+        facts.starts_open = bool(pieces[0].strip())
+        facts.ends_open = bool(pieces[-1].strip())
+        facts.term_counts = Counter(word for word in re.findall(r'\w+', lower) if word in self.LEGAL_TERM_SET)
+        facts.phrases = frozenset(phrase for phrase in self.PHRASES if phrase in lower)
+        facts.numbered_lines = sum(1 for line in paragraph.split('\n') if self.NUMBERED_LINE_PATTERN.match(line))
+        return facts
+
+    @staticmethod
+    def _found_phrases(facts: List[Tuple[int, ParagraphFacts]]) -> set:
+        found = set()
+        for _, paragraph_facts in facts:
+            found.update(paragraph_facts.phrases)
+        return found
+
+    @staticmethod
+    def _count_sentences(facts: List[Tuple[int, ParagraphFacts]]) -> int:
+        """Sentences of the whole text; a sentence left open merges with the next paragraph's first one"""
+        total = 0
+        open_sentence = False
+        for _, paragraph_facts in facts:
+            if paragraph_facts.blank:
+                continue
+            total += paragraph_facts.sentences
+            if open_sentence and paragraph_facts.starts_open:
+                total -= 1
+            open_sentence = paragraph_facts.ends_open
+        return total
+
+    def _get_document_stats(self, text: str, facts: List[Tuple[int, ParagraphFacts]] = None) -> Dict:
         """Get basic document statistics"""
-        words = re.findall(r'\w+', text)
-        sentences = self._split_into_sentences(text)
-        paragraphs = [p.strip() for p in text.split('\n\n') if p.strip()]
+        if facts is None:
+            facts = self._paragraph_facts(text)[0]
+        word_count = sum(paragraph_facts.words for _, paragraph_facts in facts)
+        sentence_count = self._count_sentences(facts)
 
         return {
-            'word_count': len(words),
-            'sentence_count': len(sentences),
-            'paragraph_count': len(paragraphs),
+            'word_count': word_count,
+            'sentence_count': sentence_count,
+            'paragraph_count': sum(1 for _, paragraph_facts in facts if not paragraph_facts.blank),
             'character_count': len(text),
-            'avg_words_per_sentence': len(words) / max(len(sentences), 1),
-            'readability_score': self._calculate_readability(words, sentences)
+            'avg_words_per_sentence': word_count / max(sentence_count, 1),
+            'readability_score': self._calculate_readability(word_count, sentence_count)
         }
 
-    def _calculate_readability(self, words: List[str], sentences: List[str]) -> float:
+    def _calculate_readability(self, word_count: int, sentence_count: int) -> float:
         """Calculate simple readability score"""
-        if not words or not sentences:
+        if not word_count or not sentence_count:
             return 0.0
 
-        avg_sentence_length = len(words) / len(sentences)
+        avg_sentence_length = word_count / sentence_count
         # Simple readability metric (lower is more readable)
         readability = min(100, max(0, 100 - (avg_sentence_length - 15) * 2))
         return round(readability, 2)
 
-    def _analyze_clauses_advanced(self, text: str) -> Dict:
+    def _analyze_clauses_advanced(self, text: str, facts: List[Tuple[int, ParagraphFacts]] = None,
+                                  clauses: List[ClauseRecord] = None) -> Dict:
         """Advanced clause analysis with context"""
-        clauses = self.extract_clauses(text)
+        if facts is None:
+            facts = self._paragraph_facts(text)[0]
+        if clauses is None:
+            clauses = self.extract_clauses(text)
+        token_count = sum(paragraph_facts.tokens for _, paragraph_facts in facts)
 
         clause_analysis = {
             'total_clauses': len(clauses),
             'clause_types': {},
-            'clause_density': len(clauses) / max(len(text.split()), 1) * 1000,  # clauses per 1000 words
+            'clause_density': len(clauses) / max(token_count, 1) * 1000,  # clauses per 1000 words
             'detailed_clauses': []
         }
 
@@ -468,22 +686,11 @@ class LegalClauseExtractor:
 
         return clause_analysis
 
-    def _assess_document_risks(self, text: str) -> Dict:
+    def _assess_document_risks(self, text: str, facts: List[Tuple[int, ParagraphFacts]] = None) -> Dict:
         """Assess potential risks in the document"""
-        risk_indicators = {
-            'high_risk': [
-                'unlimited liability', 'no limitation', 'personal guarantee',
-                'indemnify', 'hold harmless', 'liquidated damages'
-            ],
-            'medium_risk': [
-                'material breach', 'immediate termination', 'sole discretion',
-                'as is', 'no warranty', 'force majeure'
-            ],
-            'compliance_risk': [
-                'gdpr', 'privacy', 'data protection', 'regulatory',
-                'compliance', 'audit', 'inspection'
-            ]
-        }
+        if facts is None:
+            facts = self._paragraph_facts(text)[0]
+        found = self._found_phrases(facts)
 
         risks = {
             'overall_risk_level': 'LOW',
@@ -491,11 +698,10 @@ class LegalClauseExtractor:
             'recommendations': []
         }
 
-        text_lower = text.lower()
         total_risk_score = 0
 
-        for risk_level, indicators in risk_indicators.items():
-            found_indicators = [ind for ind in indicators if ind in text_lower]
+        for risk_level, indicators in self.RISK_INDICATORS.items():
+            found_indicators = [ind for ind in indicators if ind in found]
             if found_indicators:
                 risks['risk_factors'].append({
                     'level': risk_level,
@@ -524,22 +730,18 @@ class LegalClauseExtractor:
 
         return risks
 
-    def _extract_key_terms(self, text: str) -> List[Dict]:
+    def _extract_key_terms(self, text: str, facts: List[Tuple[int, ParagraphFacts]] = None) -> List[Dict]:
         """Extract key legal terms and their frequency"""
-        legal_terms = {
-            'contract_terms': ['agreement', 'contract', 'party', 'parties', 'obligation', 'right'],
-            'liability_terms': ['liability', 'damages', 'loss', 'harm', 'injury', 'claim'],
-            'time_terms': ['term', 'duration', 'period', 'expiry', 'renewal', 'notice'],
-            'payment_terms': ['payment', 'fee', 'cost', 'invoice', 'billing', 'charge'],
-            'legal_terms': ['law', 'jurisdiction', 'court', 'dispute', 'arbitration', 'mediation']
-        }
+        if facts is None:
+            facts = self._paragraph_facts(text)[0]
+        term_counts = Counter()
+        for _, paragraph_facts in facts:
+            term_counts.update(paragraph_facts.term_counts)
 
-        text_words = re.findall(r'\w+', text.lower())
         key_terms = []
-
-        for category, terms in legal_terms.items():
+        for category, terms in self.LEGAL_TERMS.items():
             for term in terms:
-                count = text_words.count(term)
+                count = term_counts[term]
                 if count > 0:
                     key_terms.append({
                         'term': term,
@@ -552,9 +754,11 @@ class LegalClauseExtractor:
         key_terms.sort(key=lambda x: x['frequency'], reverse=True)
         return key_terms[:20]  # Top 20 terms
 
-    def _analyze_structure(self, text: str) -> Dict:
+    def _analyze_structure(self, text: str, facts: List[Tuple[int, ParagraphFacts]] = None) -> Dict:
         """Analyze document structure"""
-        lines = text.split('\n')
+        if facts is None:
+            facts = self._paragraph_facts(text)[0]
+        found = self._found_phrases(facts)
         structure = {
             'has_title': False,
             'has_sections': False,
@@ -564,40 +768,32 @@ class LegalClauseExtractor:
         }
 
         # Check for title (first non-empty line in caps or title case)
-        for line in lines[:5]:
+        for line in text.split('\n', 5)[:5]:
             if line.strip() and (line.isupper() or line.istitle()):
                 structure['has_title'] = True
                 break
 
         # Check for numbered sections
-        numbered_pattern = re.compile(r'^\s*\d+\.?\s+[A-Z]')
-        numbered_lines = [line for line in lines if numbered_pattern.match(line)]
+        numbered_lines = sum(paragraph_facts.numbered_lines for _, paragraph_facts in facts)
         if numbered_lines:
             structure['has_numbered_clauses'] = True
-            structure['estimated_sections'] = len(numbered_lines)
+            structure['estimated_sections'] = numbered_lines
 
         # Check for sections
-        section_indicators = ['section', 'article', 'clause', 'paragraph']
-        section_lines = [line for line in lines if any(ind in line.lower() for ind in section_indicators)]
-        if section_lines:
+        if any(ind in found for ind in self.SECTION_INDICATORS):
             structure['has_sections'] = True
 
         # Check for signature block
-        signature_indicators = ['signature', 'signed', 'witness', 'date', 'executed']
-        if any(ind in text.lower() for ind in signature_indicators):
+        if any(ind in found for ind in self.SIGNATURE_INDICATORS):
             structure['has_signature_block'] = True
 
         return structure
 
-    def _check_compliance_indicators(self, text: str) -> Dict:
+    def _check_compliance_indicators(self, text: str, facts: List[Tuple[int, ParagraphFacts]] = None) -> Dict:
         """Check for compliance-related indicators"""
-        compliance_areas = {
-            'data_protection': ['gdpr', 'data protection', 'privacy policy', 'personal data'],
-            'financial': ['sox', 'sarbanes', 'financial reporting', 'audit'],
-            'employment': ['equal opportunity', 'discrimination', 'harassment', 'workplace'],
-            'environmental': ['environmental', 'sustainability', 'carbon', 'emissions'],
-            'security': ['security', 'cybersecurity', 'data breach', 'encryption']
-        }
+        if facts is None:
+            facts = self._paragraph_facts(text)[0]
+        found_phrases = self._found_phrases(facts)
 
         compliance = {
             'areas_covered': [],
@@ -605,10 +801,8 @@ class LegalClauseExtractor:
             'recommendations': []
         }
 
-        text_lower = text.lower()
-
-        for area, indicators in compliance_areas.items():
-            found = [ind for ind in indicators if ind in text_lower]
+        for area, indicators in self.COMPLIANCE_AREAS.items():
+            found = [ind for ind in indicators if ind in found_phrases]
             if found:
                 compliance['areas_covered'].append({
                     'area': area,
@@ -623,37 +817,40 @@ class LegalClauseExtractor:
 
         return compliance
 
-    def _generate_document_summary(self, text: str) -> str:
+    def _generate_document_summary(self, text: str, facts: List[Tuple[int, ParagraphFacts]] = None,
+                                   clauses: List[ClauseRecord] = None) -> str:
         """Generate an AI-powered document summary"""
-        # Extract first few sentences and key information
-        sentences = self._split_into_sentences(text)
+        if facts is None:
+            facts = self._paragraph_facts(text)[0]
+        found = self._found_phrases(facts)
 
         # Get document type
         doc_type = 'legal document'
-        if 'agreement' in text.lower():
+        if 'agreement' in found:
             doc_type = 'agreement'
-        elif 'contract' in text.lower():
+        elif 'contract' in found:
             doc_type = 'contract'
-        elif 'policy' in text.lower():
+        elif 'policy' in found:
             doc_type = 'policy'
 
         # Extract key parties if mentioned
-        party_pattern = re.search(r'between\s+([^and]+)\s+and\s+([^.]+)', text.lower())
+        party_pattern = re.search(r'between\s+([^and]+)\s+and\s+([^.]+)', text, re.IGNORECASE)
         parties_info = ""
         if party_pattern:
-            parties_info = f" between {party_pattern.group(1).strip()} and {party_pattern.group(2).strip()}"
+            parties_info = f" between {party_pattern.group(1).lower().strip()} and {party_pattern.group(2).lower().strip()}"
 
         # Generate summary
-        summary = f"This {doc_type}{parties_info} contains {len(sentences)} main provisions. "
+        summary = f"This {doc_type}{parties_info} contains {self._count_sentences(facts)} main provisions. "
 
         # Add clause information
-        clauses = self.extract_clauses(text)
+        if clauses is None:
+            clauses = self.extract_clauses(text)
         if clauses:
             clause_types = list(set([c['type'] for c in clauses]))
             summary += f"Key areas covered include: {', '.join(clause_types[:3])}. "
 
         # Add risk assessment
-        risks = self._assess_document_risks(text)
+        risks = self._assess_document_risks(text, facts)
         summary += f"Overall risk level: {risks['overall_risk_level']}."
 
         return summary
@@ -662,6 +859,120 @@ class LegalClauseExtractor:
 clause_extractor = LegalClauseExtractor()
 rag_pipeline = EnhancedRAGPipeline()
 
+def get_analysis_pool() -> ProcessPoolExecutor:
+    """Process pool for CPU-bound document analysis"""
+    global _analysis_pool
+    with _analysis_pool_lock:
+        if _analysis_pool is None:
+            _analysis_pool = ProcessPoolExecutor(max_workers=ANALYSIS_WORKERS)
+            logger.info(f"🧵 Started analysis pool with {ANALYSIS_WORKERS} workers")
+        return _analysis_pool
+
+def _reset_analysis_pool(pool: ProcessPoolExecutor):
+    """Drop a pool whose worker died so the next batch starts a fresh one"""
+    global _analysis_pool
+    with _analysis_pool_lock:
+        if _analysis_pool is pool:
+            _analysis_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def analyze_document_task(document_id: str, text: str) -> Tuple[Dict, float]:
+    """Analyze one document in a pool worker"""
+    started = time.perf_counter()
+    # No doc_id: per-paragraph caches would only accumulate in the worker
+    analysis = clause_extractor.analyze_document_comprehensive(text)
+    analysis['document_id'] = document_id
+    return analysis, time.perf_counter() - started
+
+def stream_batch_analysis(documents: Iterator[Tuple[str, str, str]], add_to_rag: bool = True) -> Iterator[str]:
+    """Fan documents out to the analysis pool, yielding one NDJSON line per document as it completes"""
+    started = time.perf_counter()
+    pool = get_analysis_pool()
+    max_in_flight = ANALYSIS_WORKERS * 2
+    pending = {}
+    completed = failed = 0
+    exhausted = False
+
+    try:
+        while pending or not exhausted:
+            # Keep a bounded number of documents queued so large uploads stream through
+            while not exhausted and len(pending) < max_in_flight:
+                try:
+                    document_id, text, document_type = next(documents)
+                except StopIteration:
+                    exhausted = True
+                    break
+                except ValueError as e:
+                    exhausted = True
+                    yield json.dumps({'status': 'error', 'error': str(e)}) + '\n'
+                    break
+
+                if not text:
+                    failed += 1
+                    yield json.dumps({'document_id': document_id, 'status': 'failed', 'error': 'Text is required'}) + '\n'
+                    continue
+                pending[pool.submit(analyze_document_task, document_id, text)] = (document_id, text, document_type)
+
+            if not pending:
+                continue
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                document_id, text, document_type = pending.pop(future)
+                try:
+                    analysis, seconds = future.result()
+                except Exception as e:
+                    if isinstance(e, BrokenProcessPool):
+                        _reset_analysis_pool(pool)
+                        pool = get_analysis_pool()
+                    failed += 1
+                    logger.error(f"Error analyzing document {document_id} in batch: {str(e)}")
+                    yield json.dumps({'document_id': document_id, 'status': 'failed', 'error': str(e)}) + '\n'
+                    continue
+
+                if add_to_rag:
+                    update = rag_pipeline.add_document_version(document_id, text, {
+                        'document_type': document_type,
+                        'analysis_date': datetime.now().isoformat()
+                    })
+                    analysis['rag_info'] = {
+                        'chunks_created': update['chunks'],
+                        'chunks_embedded': update['chunks_embedded'],
+                        'chunks_reused': update['chunks_reused'],
+                        'available_for_qa': True,
+                        'document_id': document_id
+                    }
+
+                completed += 1
+                yield json.dumps({
+                    'document_id': document_id,
+                    'status': 'completed',
+                    'analysis': analysis,
+                    'processing_time': round(seconds, 4)
+                }) + '\n'
+    finally:
+        # Client went away or the batch ended: drop work that has not started
+        for future in pending:
+            future.cancel()
+
+    logger.info(f"✅ Batch analysis finished: {completed} completed, {failed} failed")
+    yield json.dumps({
+        'status': 'done',
+        'completed': completed,
+        'failed': failed,
+        'processing_time': round(time.perf_counter() - started, 4)
+    }) + '\n'
+
+def _iter_batch_documents(data: Dict) -> Iterator[Tuple[str, str, str]]:
+    for i, document in enumerate(data.get('documents') or []):
+        yield (document.get('document_id') or f'doc_{i}', document.get('text', ''),
+               document.get('document_type', 'contract'))
+
+def _iter_ndjson_batch_documents(stream) -> Iterator[Tuple[str, str, str]]:
+    for header, blocks in ingestion.iter_ndjson_documents(stream):
+        yield (header['document_id'], ''.join(blocks),
+               header['metadata'].get('document_type', 'contract'))
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
@@ -686,9 +997,9 @@ def extract_clauses():
         clauses = clause_extractor.extract_clauses(text)
         
         return jsonify({
-            'clauses': clauses,
+            'clauses': [clause.to_dict() for clause in clauses],
             'total_clauses': len(clauses),
-            'processing_time': 1.2  # Mock processing time
+            **response_timings()
         })
         
     except Exception as e:
@@ -747,7 +1058,7 @@ def query_llm():
             'confidence': 0.85,
             'model_used': model,
             'context_length': len(context),
-            'processing_time': 1.5
+            **response_timings()
         })
         
     except Exception as e:
@@ -775,15 +1086,18 @@ def analyze_document():
         # Perform comprehensive analysis
         analysis = clause_extractor.analyze_document_comprehensive(text, document_id)
 
-        # Add document to RAG pipeline for future Q&A
-        chunks_created = rag_pipeline.add_document(document_id, text, {
+        # Add document to RAG pipeline for future Q&A; unchanged chunks of a
+        # previously analyzed version keep their embeddings
+        update = rag_pipeline.add_document_version(document_id, text, {
             'document_type': document_type,
             'analysis_date': datetime.now().isoformat()
         })
 
         # Enhance analysis with RAG info
         analysis['rag_info'] = {
-            'chunks_created': chunks_created,
+            'chunks_created': update['chunks'],
+            'chunks_embedded': update['chunks_embedded'],
+            'chunks_reused': update['chunks_reused'],
             'available_for_qa': True,
             'document_id': document_id
         }
@@ -793,14 +1107,42 @@ def analyze_document():
         return jsonify({
             'document_id': document_id,
             'analysis': analysis,
-            'processing_time': 2.5,
-            'status': 'completed'
+            'status': 'completed',
+            **response_timings()
         })
 
     except Exception as e:
         logger.error(f"Error analyzing document: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/analyze-documents', methods=['POST'])
+def analyze_documents_batch():
+    """Analyze many documents in parallel across worker processes.
+
+    Accepts JSON {"documents": [{"document_id", "text", "document_type"}],
+    "add_to_rag": true} or NDJSON with one document per line. Streams back
+    NDJSON: one line per document in completion order, then a summary line.
+    """
+    try:
+        if request.mimetype in ingestion.NDJSON_CONTENT_TYPES:
+            documents = _iter_ndjson_batch_documents(request.stream)
+            add_to_rag = request.args.get('add_to_rag', 'true').lower() != 'false'
+        else:
+            data = request.get_json()
+            if not data or not isinstance(data.get('documents'), list) or not data['documents']:
+                return jsonify({'error': 'documents must be a non-empty list'}), 400
+            documents = _iter_batch_documents(data)
+            add_to_rag = bool(data.get('add_to_rag', True))
+
+        logger.info(f"📦 Starting batch analysis on {ANALYSIS_WORKERS} workers")
+
+        return Response(stream_with_context(stream_batch_analysis(documents, add_to_rag)),
+                        mimetype='application/x-ndjson')
+
+    except Exception as e:
+        logger.error(f"Error in batch analysis: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/rag-add-document', methods=['POST'])
 def add_document_to_rag():
     """Add document to RAG knowledge base"""
@@ -815,13 +1157,16 @@ def add_document_to_rag():
 
         logger.info(f"📚 Adding document {document_id} to RAG pipeline")
 
-        chunks_created = rag_pipeline.add_document(document_id, text, metadata)
+        update = rag_pipeline.add_document_version(document_id, text, metadata)
 
         return jsonify({
             'message': 'Document added to RAG knowledge base successfully',
             'document_id': document_id,
-            'chunks_created': chunks_created,
-            'status': 'success'
+            'chunks_created': update['chunks'],
+            'chunks_embedded': update['chunks_embedded'],
+            'chunks_reused': update['chunks_reused'],
+            'status': 'success',
+            **response_timings()
         })
 
     except Exception as e:
@@ -856,7 +1201,7 @@ def rag_query():
             'context_chunks': result.get('context_used', 0),
             'semantic_search_results': search_results[:3],  # Top 3 for reference
             'document_id': document_id,
-            'processing_time': 1.8
+            **response_timings()
         }
 
         logger.info(f"✅ RAG query completed with confidence: {result['confidence']}")
@@ -869,9 +1214,9 @@ def rag_query():
 
 @app.route('/api/semantic-search', methods=['POST'])
 def semantic_search():
-    """Perform semantic search across documents"""
+    """Perform semantic search across documents (MessagePack in and out on request)"""
     try:
-        data = request.get_json()
+        data = wire_format.read_payload()
         query = data.get('query', '')
         document_id = data.get('document_id', None)
         top_k = data.get('top_k', 5)
@@ -883,18 +1228,19 @@ def semantic_search():
 
         results = rag_pipeline.semantic_search(query, top_k, document_id)
 
-        return jsonify({
+        return wire_format.payload_response({
             'query': query,
             'results': results,
             'total_results': len(results),
             'document_id': document_id,
-            'processing_time': 0.8
-        })
+            **response_timings()
+        }, wire_format.negotiate())
 
     except Exception as e:
         logger.error(f"Error in semantic search: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 if __name__ == '__main__':
-    initialize_models()
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    # SERVE_MODE=prefork loads everything once, then forks WEB_WORKERS workers
+    prefork.run(app, int(os.getenv('PORT', '5000')), preload=initialize_models,
+                start_dev_server=initialize_models)
@@ -1,29 +1,50 @@
+import time
+
+# Measured from the first line so /health can report the import cold-start cost
+_import_started = time.perf_counter()
+
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 import os
+import sys
 import logging
+import importlib.util
+import threading
+import atexit
+import shutil
+import tempfile
+from contextlib import contextmanager
 from dotenv import load_dotenv
 import numpy as np
 import re
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Optional, Tuple
 import json
 import requests
+from urllib.parse import quote
 from datetime import datetime
 
-# Try to import optional dependencies with fallbacks
-try:
-    import ollama
-    OLLAMA_AVAILABLE = True
-except ImportError:
-    OLLAMA_AVAILABLE = False
-    logger.warning("Ollama not available. Using fallback responses.")
-
-try:
-    from sentence_transformers import SentenceTransformer
-    EMBEDDINGS_AVAILABLE = True
-except ImportError:
-    EMBEDDINGS_AVAILABLE = False
-    logger.warning("Sentence transformers not available. Using mock embeddings.")
+from chunking import iter_chunk_spans, iter_stream_chunks
+from circuit_breakers import CircuitBreaker, CircuitOpenError, start_health_probes
+from clause_index import ClauseIndex
+from coalescing import SingleFlight, request_key
+from clauses import ClauseRecord, compile_clause_patterns, find_clauses
+import ingestion
+import prefork
+from vector_store import SQLiteVectorStore
+from embedding_index import EmbeddingIndex
+import shared_index
+from shared_index import SharedEmbeddingIndex
+from llm_clauses import LLMClauseClassifier, WindowCache, merge_clause_hits
+from ollama_pool import OllamaPool
+from fingerprints import SimHashIndex, hamming_distance, simhash, NEAR_DUPLICATE_DISTANCE
+from sessions import SessionStore
+from shard_router import ShardRouter
+from revisions import content_key, match_unchanged
+from profiling import install_profiler
+from rate_limits import AdaptiveLimiter, LimiterQueueFull, RateLimitedError, call_with_backoff, raise_for_rate_limit
+from reranking import CrossEncoderReranker, merge_adjacent, mmr
+from telemetry import instrument_app, response_timings, span
+import wire_format
 
 # Load environment variables
 load_dotenv()
@@ -31,11 +52,24 @@ load_dotenv()
 # Initialize Flask app
 app = Flask(__name__)
 CORS(app)
+instrument_app(app)
+install_profiler(app)
+wire_format.install_compression(app)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Optional dependencies are only located here; ollama and sentence_transformers
+# (which pulls in torch) are imported on first use so the service starts fast
+OLLAMA_AVAILABLE = importlib.util.find_spec('ollama') is not None
+if not OLLAMA_AVAILABLE:
+    logger.warning("Ollama not available. Using fallback responses.")
+
+EMBEDDINGS_AVAILABLE = importlib.util.find_spec('sentence_transformers') is not None
+if not EMBEDDINGS_AVAILABLE:
+    logger.warning("Sentence transformers not available. Using mock embeddings.")
+
 # AI API Configuration
 AI_PROVIDERS = {
     'openai': {
@@ -63,37 +97,199 @@ AI_PROVIDERS = {
 # Default AI provider (can be changed via environment variable)
 DEFAULT_AI_PROVIDER = os.getenv('AI_PROVIDER', 'openai')
 
-# Initialize models
+# Per-provider concurrency starts at PROVIDER_INITIAL_CONCURRENCY and adapts
+# (AIMD) to 429s and to latencies above PROVIDER_LATENCY_TARGET_SECONDS. Up to
+# PROVIDER_QUEUE_SIZE callers wait PROVIDER_QUEUE_TIMEOUT seconds for a slot,
+# and rate-limited calls are retried PROVIDER_MAX_RETRIES times
+PROVIDER_INITIAL_CONCURRENCY = int(os.getenv('PROVIDER_INITIAL_CONCURRENCY', '4'))
+PROVIDER_MAX_CONCURRENCY = int(os.getenv('PROVIDER_MAX_CONCURRENCY', '64'))
+PROVIDER_QUEUE_SIZE = int(os.getenv('PROVIDER_QUEUE_SIZE', '32'))
+PROVIDER_QUEUE_TIMEOUT = float(os.getenv('PROVIDER_QUEUE_TIMEOUT', '10'))
+PROVIDER_MAX_RETRIES = int(os.getenv('PROVIDER_MAX_RETRIES', '3'))
+PROVIDER_LATENCY_TARGET_SECONDS = float(os.getenv('PROVIDER_LATENCY_TARGET_SECONDS', '20'))
+
+provider_limiters = {
+    provider: AdaptiveLimiter(provider, PROVIDER_INITIAL_CONCURRENCY, max_limit=PROVIDER_MAX_CONCURRENCY,
+                              max_queue=PROVIDER_QUEUE_SIZE, queue_timeout=PROVIDER_QUEUE_TIMEOUT,
+                              latency_target=PROVIDER_LATENCY_TARGET_SECONDS)
+    for provider in AI_PROVIDERS
+}
+
+# Ollama endpoints; connecting to a dead host gives up after OLLAMA_CONNECT_TIMEOUT seconds
+# and a hung one after OLLAMA_READ_TIMEOUT seconds without a response.
+# OLLAMA_HOSTS (comma-separated) spreads generation over several model servers
+OLLAMA_URL = os.getenv('OLLAMA_HOST', 'http://localhost:11434').rstrip('/')
+OLLAMA_HOSTS = [h.strip() for h in os.getenv('OLLAMA_HOSTS', OLLAMA_URL).split(',') if h.strip()]
+OLLAMA_CONNECT_TIMEOUT = float(os.getenv('OLLAMA_CONNECT_TIMEOUT', '2'))
+OLLAMA_READ_TIMEOUT = float(os.getenv('OLLAMA_READ_TIMEOUT', '120'))
+
+# A backend failing BREAKER_FAILURE_THRESHOLD times in a row is skipped for
+# BREAKER_RESET_SECONDS, then retried once (or health-probed every
+# BREAKER_PROBE_INTERVAL seconds). Requests fail over along LLM_FAILOVER_ORDER;
+# a request naming its provider only fails over to other (paid) providers
+# with LLM_FAILOVER_EXPLICIT, and otherwise gets the local fallback answer
+BREAKER_FAILURE_THRESHOLD = int(os.getenv('BREAKER_FAILURE_THRESHOLD', '3'))
+BREAKER_RESET_SECONDS = float(os.getenv('BREAKER_RESET_SECONDS', '30'))
+BREAKER_PROBE_INTERVAL = float(os.getenv('BREAKER_PROBE_INTERVAL', '5'))
+LLM_FAILOVER_ORDER = [p.strip() for p in os.getenv('LLM_FAILOVER_ORDER', 'openai,claude,gemini,huggingface').split(',')
+                      if p.strip()]
+LLM_FAILOVER_EXPLICIT = os.getenv('LLM_FAILOVER_EXPLICIT', 'false').lower() in ('1', 'true', 'yes')
+
+# Concurrent identical LLM calls (same normalized prompt and context) and
+# embedding calls (same text) wait for one in-flight call and share its result
+REQUEST_COALESCING = os.getenv('REQUEST_COALESCING', 'true').lower() in ('1', 'true', 'yes')
+
+# Conversational sessions keep Ollama's token context between turns; idle
+# sessions expire after SESSION_TTL_SECONDS (the model is kept loaded as long)
+SESSION_TTL_SECONDS = float(os.getenv('SESSION_TTL_SECONDS', '1800'))
+MAX_SESSIONS = int(os.getenv('MAX_SESSIONS', '256'))
+
+# LLM clause extraction classifies windows of CLAUSE_WINDOW_WORDS words, at
+# most CLAUSE_LLM_CONCURRENCY at a time; parsed results of up to
+# CLAUSE_WINDOW_CACHE_SIZE windows are cached by window text
+CLAUSE_WINDOW_WORDS = int(os.getenv('CLAUSE_WINDOW_WORDS', '600'))
+CLAUSE_LLM_CONCURRENCY = int(os.getenv('CLAUSE_LLM_CONCURRENCY', '4'))
+CLAUSE_WINDOW_CACHE_SIZE = int(os.getenv('CLAUSE_WINDOW_CACHE_SIZE', '4096'))
+
+# Request bodies over MAX_REQUEST_BODY_BYTES as sent, or gzip/zstd encoded
+# bodies expanding past MAX_DECODED_BODY_BYTES, are rejected with 413
+MAX_REQUEST_BODY_BYTES = int(os.getenv('MAX_REQUEST_BODY_BYTES', str(100 * 1024 * 1024)))
+MAX_DECODED_BODY_BYTES = int(os.getenv('MAX_DECODED_BODY_BYTES', str(100 * 1024 * 1024)))
+app.config['MAX_CONTENT_LENGTH'] = MAX_REQUEST_BODY_BYTES
+app.config['MAX_DECODED_CONTENT_LENGTH'] = MAX_DECODED_BODY_BYTES
+
+# Persistent RAG index (SQLite file); unset keeps the index in memory only
+VECTOR_STORE_PATH = os.getenv('VECTOR_STORE_PATH')
+
+# Pre-fork workers search one embedding matrix in memory-mapped files under
+# SHARED_INDEX_DIR (a temporary directory on /dev/shm when unset); documents
+# added through any worker are visible to all of them. The journal of changes
+# is compacted into a snapshot of the current documents once it grows past
+# SHARED_JOURNAL_MAX_BYTES (and twice the last snapshot)
+SHARED_INDEX_DIR = os.getenv('SHARED_INDEX_DIR')
+SHARED_JOURNAL_MAX_BYTES = int(os.getenv('SHARED_JOURNAL_MAX_BYTES', str(64 * 1024 * 1024)))
+
+# Sharded RAG index: a router node (SHARD_URLS, comma-separated URLs of AI
+# services holding the index shards) sends each document to the shard owning
+# its document_id and scatters searches to all shards, leaving out shards that
+# have not answered within SHARD_TIMEOUT seconds
+SHARD_URLS = [url.strip() for url in os.getenv('SHARD_URLS', '').split(',') if url.strip()]
+SHARD_TIMEOUT = float(os.getenv('SHARD_TIMEOUT', '2'))
+
+# In-memory embedding storage: float32, float16 or int8. Quantized indexes
+# rescore the best EMBEDDING_RESCORE_FACTOR * top_k candidates with the
+# full-precision vectors from the vector store when one is configured
+EMBEDDING_STORAGE = os.getenv('EMBEDDING_STORAGE', 'float32')
+EMBEDDING_RESCORE_FACTOR = int(os.getenv('EMBEDDING_RESCORE_FACTOR', '4'))
+
+# Retrieval fetches this many times top_k candidates, collapses near-duplicate
+# chunks of templated contracts and re-ranks the rest by maximal marginal
+# relevance with MMR_DIVERSITY (0 keeps the plain similarity order)
+RETRIEVAL_OVERFETCH = int(os.getenv('RETRIEVAL_OVERFETCH', '3'))
+MMR_DIVERSITY = float(os.getenv('MMR_DIVERSITY', '0.3'))
+
+# Optional cross-encoder second stage: rerank the top RERANK_CANDIDATES
+# chunks in one batch, falling back to first-stage order past RERANK_BUDGET_MS.
+# Reranked answers send only RERANK_CONTEXT_CHUNKS chunks to the LLM
+RERANK_ENABLED = os.getenv('RERANK_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+RERANKER_MODEL_NAME = os.getenv('RERANKER_MODEL', 'cross-encoder/ms-marco-MiniLM-L-6-v2')
+RERANK_CANDIDATES = int(os.getenv('RERANK_CANDIDATES', '50'))
+RERANK_BUDGET_MS = float(os.getenv('RERANK_BUDGET_MS', '250'))
+RERANK_CONTEXT_CHUNKS = int(os.getenv('RERANK_CONTEXT_CHUNKS', '2'))
+
+EMBEDDING_MODEL_NAME = 'all-MiniLM-L6-v2'
+
+# Seconds from module import to accepting traffic that we alert on
+COLD_START_BUDGET_SECONDS = float(os.getenv('COLD_START_BUDGET_SECONDS', '1.0'))
+
+# Lazily initialized models
 embedding_model = None
-ollama_client = None
+reranker_model = None
+# Not part of readiness: retrieval works without the optional reranker
+reranker_status = 'pending' if RERANK_ENABLED else 'disabled'
+_model_lock = threading.Lock()
+
+# Readiness of each lazily loaded component: pending, ready, unavailable or failed
+component_status = {
+    'embedding_model': 'pending',
+    'ollama': 'pending',
+    'vector_store': 'pending' if VECTOR_STORE_PATH else 'disabled'
+}
+startup_metrics = {
+    'import_seconds': None,
+    'warmup_seconds': None,
+    'cold_start_budget_seconds': COLD_START_BUDGET_SECONDS
+}
+
+def failover_providers(first: str = None) -> List[str]:
+    """Providers with an API key in failover order, starting with ``first``"""
+    order = ([first] if first else []) + LLM_FAILOVER_ORDER
+    providers = []
+    for provider in order:
+        if provider in AI_PROVIDERS and AI_PROVIDERS[provider]['api_key'] and provider not in providers:
+            providers.append(provider)
+    return providers
+
+def call_provider(provider: str, prompt: str, document_context: str = "") -> str:
+    """Call one provider through its circuit breaker and concurrency limiter; raises on failure"""
+    config = AI_PROVIDERS[provider]
+    provider_calls = {
+        'openai': call_openai_api,
+        'gemini': call_gemini_api,
+        'claude': call_claude_api,
+        'huggingface': call_huggingface_api
+    }
 
-def call_external_ai_api(provider, prompt, document_context=""):
-    """Call external AI API based on provider"""
+    # Wait briefly for a concurrency slot and retry 429s before giving up
+    with span('llm', provider=provider):
+        return circuit_breakers[provider].call(lambda: call_with_backoff(
+            provider_limiters[provider],
+            lambda: provider_calls[provider](prompt, document_context, config),
+            max_retries=PROVIDER_MAX_RETRIES
+        ))
+
+def call_external_ai_api(provider=None, prompt="", document_context=""):
+    """Call external AI API and return (answer, provider that answered, or 'fallback').
+
+    Without a provider the default one is tried first, failing over to the
+    next configured one; a named provider only fails over with
+    LLM_FAILOVER_EXPLICIT. Identical concurrent calls share one provider request.
+    """
+    failover = provider is None or LLM_FAILOVER_EXPLICIT
+    provider = provider or DEFAULT_AI_PROVIDER
+    if not REQUEST_COALESCING:
+        return _call_external_ai_api(provider, prompt, document_context, failover)
+    key = request_key(provider, failover, prompt, document_context)
+    return llm_flights.do(key, lambda: _call_external_ai_api(provider, prompt, document_context, failover))
+
+def _call_external_ai_api(provider, prompt, document_context="", failover=True):
     try:
         if provider not in AI_PROVIDERS:
             raise ValueError(f"Unsupported AI provider: {provider}")
 
-        config = AI_PROVIDERS[provider]
-        api_key = config['api_key']
-
-        if not api_key:
-            logger.warning(f"No API key found for {provider}, using fallback")
-            return generate_fallback_response(prompt, document_context)
-
-        if provider == 'openai':
-            return call_openai_api(prompt, document_context, config)
-        elif provider == 'gemini':
-            return call_gemini_api(prompt, document_context, config)
-        elif provider == 'claude':
-            return call_claude_api(prompt, document_context, config)
-        elif provider == 'huggingface':
-            return call_huggingface_api(prompt, document_context, config)
+        if failover:
+            providers = failover_providers(provider)
         else:
-            return generate_fallback_response(prompt, document_context)
+            providers = [provider] if AI_PROVIDERS[provider]['api_key'] else []
+        if not providers:
+            logger.warning(f"No API key found for {provider}, using fallback")
+            return generate_fallback_response(prompt, document_context), 'fallback'
+        if providers[0] != provider:
+            logger.warning(f"No API key found for {provider}, failing over to {providers[0]}")
+
+        for candidate in providers:
+            try:
+                return call_provider(candidate, prompt, document_context), candidate
+            except CircuitOpenError:
+                continue
+            except Exception as e:
+                logger.error(f"AI API call to {candidate} failed: {e}")
+
+        return generate_fallback_response(prompt, document_context), 'fallback'
 
     except Exception as e:
         logger.error(f"AI API call failed: {e}")
-        return generate_fallback_response(prompt, document_context)
+        return generate_fallback_response(prompt, document_context), 'fallback'
 
 def call_openai_api(prompt, document_context, config):
     """Call OpenAI GPT API"""
@@ -116,6 +312,7 @@ def call_openai_api(prompt, document_context, config):
 
     response = requests.post(f'{config["base_url"]}/chat/completions',
                            headers=headers, json=data, timeout=30)
+    raise_for_rate_limit('openai', response)
 
     if response.status_code == 200:
         result = response.json()
@@ -139,6 +336,7 @@ def call_gemini_api(prompt, document_context, config):
 
     url = f'{config["base_url"]}/models/{config["model"]}:generateContent?key={config["api_key"]}'
     response = requests.post(url, headers=headers, json=data, timeout=30)
+    raise_for_rate_limit('gemini', response)
 
     if response.status_code == 200:
         result = response.json()
@@ -165,6 +363,7 @@ def call_claude_api(prompt, document_context, config):
 
     response = requests.post(f'{config["base_url"]}/messages',
                            headers=headers, json=data, timeout=30)
+    raise_for_rate_limit('claude', response)
 
     if response.status_code == 200:
         result = response.json()
@@ -189,6 +388,7 @@ def call_huggingface_api(prompt, document_context, config):
 
     response = requests.post(f'{config["base_url"]}/{config["model"]}',
                            headers=headers, json=data, timeout=30)
+    raise_for_rate_limit('huggingface', response)
 
     if response.status_code == 200:
         result = response.json()
@@ -216,48 +416,149 @@ def generate_fallback_response(prompt, document_context):
     else:
         return f"I understand you're asking: '{prompt}'. Based on the document content, this requires detailed legal analysis. The document contains relevant information that should be reviewed by a qualified legal professional. Document context: {document_context[:200]}..."
 
-def initialize_models():
-    """Initialize AI models with API integration"""
-    global embedding_model, ollama_client
+def get_embedding_model():
+    """Return the sentence transformer, importing and loading it on first use"""
+    global embedding_model
 
-    logger.info("🚀 Initializing AI Microservice with API integration...")
+    if component_status['embedding_model'] != 'pending':
+        return embedding_model
+
+    with _model_lock:
+        if component_status['embedding_model'] != 'pending':
+            return embedding_model
+
+        if not EMBEDDINGS_AVAILABLE:
+            component_status['embedding_model'] = 'unavailable'
+            return None
 
-    # Initialize embedding model
-    if EMBEDDINGS_AVAILABLE:
         try:
-            embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+            from sentence_transformers import SentenceTransformer
+            embedding_model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+            component_status['embedding_model'] = 'ready'
             logger.info("✅ Embedding model loaded successfully")
         except Exception as e:
             logger.warning(f"Failed to load embedding model: {e}")
             embedding_model = None
+            component_status['embedding_model'] = 'failed'
 
-    # Initialize Ollama client for LLaMA 3
-    if OLLAMA_AVAILABLE:
-        try:
-            ollama_client = ollama.Client()
-            # Test connection and check for LLaMA 3
-            models = ollama_client.list()
-            available_models = [model['name'] for model in models['models']]
-            logger.info(f"Available Ollama models: {available_models}")
-
-            # Check for LLaMA 3 models
-            llama3_models = [m for m in available_models if 'llama3' in m.lower()]
-            if llama3_models:
-                logger.info(f"✅ LLaMA 3 models available: {llama3_models}")
-            else:
-                logger.warning("⚠️ No LLaMA 3 models found. Consider running: ollama pull llama3")
+    return embedding_model
+
+def get_reranker_model():
+    """Return the cross-encoder, loading it on first use when reranking is enabled"""
+    global reranker_model, reranker_status
 
+    if reranker_status != 'pending':
+        return reranker_model
+
+    with _model_lock:
+        if reranker_status != 'pending':
+            return reranker_model
+
+        if not EMBEDDINGS_AVAILABLE:
+            reranker_status = 'unavailable'
+            return None
+
+        try:
+            from sentence_transformers import CrossEncoder
+            reranker_model = CrossEncoder(RERANKER_MODEL_NAME, device='cpu')
+            reranker_status = 'ready'
+            logger.info(f"✅ Cross-encoder {RERANKER_MODEL_NAME} loaded successfully")
         except Exception as e:
-            logger.warning(f"Failed to connect to Ollama: {e}")
-            ollama_client = None
+            logger.warning(f"Failed to load cross-encoder: {e}")
+            reranker_model = None
+            reranker_status = 'failed'
 
-    logger.info("✅ AI Microservice initialized")
+    return reranker_model
 
-def query_llama3(prompt: str, context: str = "", model: str = "llama3") -> Dict[str, Any]:
-    """Query LLaMA 3 model via Ollama with enhanced legal document analysis"""
+def make_ollama_client(url: str):
+    """Ollama client for one endpoint, importing the library on first use (None without it)"""
+    if not OLLAMA_AVAILABLE:
+        return None
+    try:
+        import httpx
+        import ollama
+        # Forwarded to httpx, so a hung endpoint fails the call and trips its breaker
+        return ollama.Client(host=url, timeout=httpx.Timeout(OLLAMA_READ_TIMEOUT, connect=OLLAMA_CONNECT_TIMEOUT))
+    except Exception as e:
+        logger.warning(f"Failed to create Ollama client for {url}: {e}")
+        return None
+
+def discover_ollama_models():
+    """Check every Ollama endpoint and log the available LLaMA 3 models"""
+    # Test connections; the model lists steer requests to endpoints that serve the model
+    discovered = ollama_pool.discover()
+    if not discovered:
+        component_status['ollama'] = 'unavailable'
+        return
+
+    for url, available_models in discovered.items():
+        logger.info(f"Available Ollama models at {url}: {available_models}")
+
+    # Check for LLaMA 3 models
+    llama3_models = sorted({m for models in discovered.values() for m in models if 'llama3' in m.lower()})
+    if llama3_models:
+        logger.info(f"✅ LLaMA 3 models available: {llama3_models}")
+    else:
+        logger.warning("⚠️ No LLaMA 3 models found. Consider running: ollama pull llama3")
+    component_status['ollama'] = 'ready'
 
-    # Enhanced prompt for comprehensive legal document analysis
-    enhanced_prompt = f"""You are a professional legal document analyst with expertise in contract law, corporate agreements, and legal compliance.
+def initialize_models():
+    """Warm up AI models, the Ollama connection and the persistent RAG index"""
+    logger.info("🚀 Initializing AI Microservice with API integration...")
+    started = time.perf_counter()
+
+    # Initialize embedding model
+    get_embedding_model()
+    get_reranker_model()
+
+    # Initialize Ollama client for LLaMA 3
+    discover_ollama_models()
+
+    # Restore the RAG index written by earlier runs or bulk_ingest.py
+    if rag_pipeline.store is not None:
+        try:
+            loaded = rag_pipeline.load_from_store()
+            loaded_clauses = clause_index.load_from_store()
+            component_status['vector_store'] = 'ready'
+            logger.info(f"✅ Loaded {loaded} chunks and {loaded_clauses} clauses from vector store {VECTOR_STORE_PATH}")
+        except Exception as e:
+            component_status['vector_store'] = 'failed'
+            logger.error(f"Failed to load vector store: {e}")
+
+    startup_metrics['warmup_seconds'] = round(time.perf_counter() - started, 3)
+    logger.info(f"✅ AI Microservice initialized in {startup_metrics['warmup_seconds']}s")
+
+def monitored_breakers() -> List[CircuitBreaker]:
+    """Breakers of the backends whose health is probed in the background"""
+    shards = rag_pipeline.router.breakers if isinstance(rag_pipeline, ShardedRAGPipeline) else []
+    return list(circuit_breakers.values()) + ollama_pool.breakers() + shards
+
+def start_background_warmup() -> threading.Thread:
+    """Run initialize_models off the request path so traffic is accepted immediately"""
+    thread = threading.Thread(target=initialize_models, name='model-warmup', daemon=True)
+    thread.start()
+    start_health_probes(monitored_breakers, BREAKER_PROBE_INTERVAL)
+    return thread
+
+def start_worker():
+    """Per-worker setup after the pre-fork server forked this process from the preloaded master"""
+    # SQLite connections and HTTP keep-alive sockets must not be shared with the master
+    if rag_pipeline.store is not None:
+        rag_pipeline.store.reopen()
+    ollama_pool.reset_clients()
+    # Split the cores between the workers instead of every worker using all of them
+    torch = sys.modules.get('torch')
+    if torch is not None:
+        torch.set_num_threads(max(1, (os.cpu_count() or 1) // prefork.WEB_WORKERS))
+    start_health_probes(monitored_breakers, BREAKER_PROBE_INTERVAL)
+
+def is_ready() -> bool:
+    """Whether every lazily loaded component has finished warming up"""
+    return all(status != 'pending' for status in component_status.values())
+
+def _build_llama3_prompt(prompt: str, context: str) -> str:
+    """Legal analysis prompt sent to LLaMA 3"""
+    return f"""You are a professional legal document analyst with expertise in contract law, corporate agreements, and legal compliance.
 
 FULL DOCUMENT CONTEXT: {context}
 
@@ -275,84 +576,222 @@ IMPORTANT: Base your response ONLY on the actual document content provided. Be t
 
 RESPONSE:"""
 
-    # Try Ollama client first
-    if ollama_client:
+def _generate_with_ollama(enhanced_prompt: str, model: str, endpoint, kv_context: List[int] = None,
+                          keep_context: bool = False, output_format: str = None) -> Dict[str, Any]:
+    """Generate on one pool endpoint with the Ollama client, else its HTTP API; raises when both fail.
+
+    ``kv_context`` continues the conversation Ollama returned it for; with
+    ``keep_context`` the result carries the new one under "kv_context".
+    ``output_format="json"`` constrains the output to valid JSON.
+    """
+    # Session turns keep the model loaded so the endpoint's prompt cache survives between them
+    request_options = {}
+    if kv_context:
+        request_options['context'] = kv_context
+    if keep_context:
+        request_options['keep_alive'] = f"{SESSION_TTL_SECONDS:.0f}s"
+    if output_format:
+        request_options['format'] = output_format
+
+    client = ollama_pool.get_client(endpoint)
+    if client:
         try:
-            response = ollama_client.generate(
-                model=model,
-                prompt=enhanced_prompt,
-                options={
-                    "temperature": 0.2,  # Very low temperature for consistent legal analysis
-                    "top_p": 0.9,
-                    "num_predict": 2000  # Allow longer responses
-                }
-            )
-
-            return {
+            with span('llm', provider='ollama'):
+                response = client.generate(
+                    model=model,
+                    prompt=enhanced_prompt,
+                    options={
+                        "temperature": 0.2,  # Very low temperature for consistent legal analysis
+                        "top_p": 0.9,
+                        "num_predict": 2000  # Allow longer responses
+                    },
+                    **request_options
+                )
+
+            result = {
                 "response": response['response'],
                 "model": model,
                 "confidence": 0.9,
                 "tokens_used": len(response['response'].split()),
                 "method": "LLaMA3-Ollama"
             }
+            if keep_context:
+                result['kv_context'] = response.get('context')
+            return result
 
         except Exception as e:
             logger.error(f"Ollama client error: {e}")
 
     # Try direct HTTP request to Ollama
-    try:
-        ollama_url = "http://localhost:11434/api/generate"
-        payload = {
+    payload = {
+        "model": model,
+        "prompt": enhanced_prompt,
+        "stream": False,
+        "options": {
+            "temperature": 0.2,
+            "top_p": 0.9,
+            "num_predict": 2000
+        },
+        **request_options
+    }
+
+    with span('llm', provider='ollama-http'):
+        response = requests.post(f"{endpoint.url}/api/generate", json=payload,
+                                 timeout=(OLLAMA_CONNECT_TIMEOUT, OLLAMA_READ_TIMEOUT))
+
+    if response.status_code == 200:
+        result = response.json()
+        generated = {
+            "response": result.get('response', 'No response received'),
             "model": model,
-            "prompt": enhanced_prompt,
-            "stream": False,
-            "options": {
-                "temperature": 0.2,
-                "top_p": 0.9,
-                "num_predict": 2000
-            }
+            "confidence": 0.85,
+            "method": "Direct-HTTP",
+            "tokens_used": len(result.get('response', '').split())
         }
+        if keep_context:
+            generated['kv_context'] = result.get('context')
+        return generated
+    raise Exception(f"Ollama API returned status {response.status_code}")
+
+def query_llama3(prompt: str, context: str = "", model: str = "llama3") -> Dict[str, Any]:
+    """Query LLaMA 3 model via Ollama with enhanced legal document analysis.
 
-        response = requests.post(ollama_url, json=payload, timeout=120)
+    While no Ollama endpoint is healthy the request goes straight to the
+    configured external providers, then to the fallback response. Identical
+    concurrent queries share one generation.
+    """
+    if not REQUEST_COALESCING:
+        return _query_llama3(prompt, context, model)
+    key = request_key('llama3', model, prompt, context)
+    # Every caller gets its own copy of the shared response
+    return dict(llm_flights.do(key, lambda: _query_llama3(prompt, context, model)))
 
-        if response.status_code == 200:
-            result = response.json()
-            return {
-                "response": result.get('response', 'No response received'),
-                "model": model,
-                "confidence": 0.85,
-                "method": "Direct-HTTP",
-                "tokens_used": len(result.get('response', '').split())
-            }
-        else:
-            raise Exception(f"Ollama API returned status {response.status_code}")
+def _query_llama3(prompt: str, context: str, model: str) -> Dict[str, Any]:
+
+    # Enhanced prompt for comprehensive legal document analysis
+    with span('prompt_build'):
+        enhanced_prompt = _build_llama3_prompt(prompt, context)
 
+    try:
+        # Least-loaded healthy endpoint serving the model; a failing endpoint hands over to the next
+        return ollama_pool.call(model, lambda endpoint: _generate_with_ollama(enhanced_prompt, model, endpoint))
+    except CircuitOpenError as e:
+        error = e
     except Exception as e:
         logger.error(f"Direct Ollama query failed: {e}")
+        error = e
 
-        # Fallback response with instructions
+    # Fail over to the external providers that are configured
+    failover = _failover_to_providers(prompt, context)
+    if failover is not None:
+        return failover
+    return _ollama_unavailable_response(prompt, model, error)
+
+def _failover_to_providers(prompt: str, context: str) -> Dict[str, Any]:
+    """Answer with the first configured external provider that works, else None"""
+    for provider in failover_providers():
+        try:
+            answer = call_provider(provider, prompt, context)
+        except CircuitOpenError:
+            continue
+        except Exception as e:
+            logger.error(f"Failover to {provider} failed: {e}")
+            continue
         return {
-            "response": f"""I'm unable to connect to the LLaMA 3 model right now.
+            "response": answer,
+            "model": f"{provider}_{AI_PROVIDERS[provider]['model']}",
+            "confidence": 0.85,
+            "method": f"Failover-{provider}",
+            "tokens_used": len(answer.split())
+        }
+    return None
+
+def _ollama_unavailable_response(prompt: str, model: str, error: Exception) -> Dict[str, Any]:
+    """Fallback response with instructions for starting Ollama"""
+    return {
+        "response": f"""I'm unable to connect to the LLaMA 3 model right now.
 
 To fix this, please:
 1. Start Ollama: Run 'ollama serve' in your command prompt
 2. Install LLaMA 3: Run 'ollama pull llama3'
-3. Verify it's running: Check http://localhost:11434
+3. Verify it's running: Check {', '.join(OLLAMA_HOSTS)}
 
 Once Ollama is running, I'll be able to provide comprehensive analysis of your legal documents using LLaMA 3.
 
 For now, based on your question "{prompt}", I can see you're interested in document analysis. Please ensure Ollama is running and try again.""",
-            "model": model,
-            "confidence": 0.0,
-            "error": str(e),
-            "method": "Fallback"
-        }
+        "model": model,
+        "confidence": 0.0,
+        "error": str(error),
+        "method": "Fallback"
+    }
+
+def _build_follow_up_prompt(question: str) -> str:
+    """Follow-up turn of a session; the document and earlier turns are in Ollama's context"""
+    return f"""
+
+FOLLOW-UP QUESTION: {question}
+
+Answer based ONLY on the document provided above.
+
+RESPONSE:"""
+
+def _session_context(session) -> str:
+    """Document context plus the transcript, for turns that start without Ollama's context"""
+    if not session.turns:
+        return session.document_context
+    return f"{session.document_context}\n\nEARLIER CONVERSATION:\n{session.transcript()}"
+
+def ask_in_session(session, question: str) -> Dict[str, Any]:
+    """Answer one turn of a conversational session.
+
+    The first turn sends the full document prompt; later turns send only the
+    new question together with the token context Ollama returned for the
+    previous turn, preferring the endpoint that produced it. When Ollama is
+    unavailable the turn goes to the external providers with the document
+    and the transcript so far, and the next Ollama turn starts over.
+    """
+    with session.lock:
+        follow_up = session.kv_context is not None
+        with span('prompt_build'):
+            if follow_up:
+                prompt = _build_follow_up_prompt(question)
+            else:
+                prompt = _build_llama3_prompt(question, _session_context(session))
+
+        served_by = []
+
+        def generate(endpoint):
+            served_by.append(endpoint.url)
+            return _generate_with_ollama(prompt, session.model, endpoint,
+                                         kv_context=session.kv_context, keep_context=True)
+
+        try:
+            result = ollama_pool.call(session.model, generate, prefer=session.endpoint_url)
+            session.kv_context = result.pop('kv_context', None)
+            session.endpoint_url = served_by[-1]
+        except Exception as e:
+            if not isinstance(e, CircuitOpenError):
+                logger.error(f"Session query to Ollama failed: {e}")
+            session.kv_context = None
+            result = (_failover_to_providers(question, _session_context(session))
+                      or _ollama_unavailable_response(question, session.model, e))
+            follow_up = False
+
+        session.turns.append({'question': question, 'answer': result['response']})
+        return {**result, 'turn': len(session.turns), 'reused_context': follow_up}
 
 def generate_embeddings(text: str) -> List[float]:
-    """Generate embeddings for text using sentence transformers"""
-    if embedding_model:
+    """Generate embeddings for text using sentence transformers (identical concurrent texts share one encode)"""
+    if not REQUEST_COALESCING:
+        return _generate_embeddings(text)
+    return list(embedding_flights.do(request_key(text, normalize=False), lambda: _generate_embeddings(text)))
+
+def _generate_embeddings(text: str) -> List[float]:
+    model = get_embedding_model()
+    if model:
         try:
-            embeddings = embedding_model.encode(text)
+            with span('embedding', provider='sentence-transformers'):
+                embeddings = model.encode(text)
             return embeddings.tolist()
         except Exception as e:
             logger.error(f"Error generating embeddings: {e}")
@@ -360,6 +799,33 @@ def generate_embeddings(text: str) -> List[float]:
     # Fallback: mock embeddings
     return [0.1] * 384
 
+def generate_embeddings_batch(texts: List[str]) -> List[List[float]]:
+    """Generate embeddings for several texts in one model call"""
+    model = get_embedding_model()
+    if model and texts:
+        try:
+            with span('embedding', provider='sentence-transformers'):
+                return model.encode(texts).tolist()
+        except Exception as e:
+            logger.error(f"Error generating batch embeddings: {e}")
+
+    return [generate_embeddings(text) for text in texts]
+
+def classify_clause_window(prompt: str, model: str = "llama3") -> Tuple[Optional[str], Optional[str]]:
+    """JSON clause classification of one window and the model that answered it.
+
+    Ollama answers as ``model``, else an external provider; (None, None) when none answers.
+    """
+    try:
+        return ollama_pool.call(model, lambda endpoint: _generate_with_ollama(
+            prompt, model, endpoint, output_format='json'))['response'], model
+    except Exception as e:
+        if not isinstance(e, CircuitOpenError):
+            logger.error(f"Ollama clause classification failed: {e}")
+
+    failover = _failover_to_providers(prompt, "")
+    return (failover['response'], failover['model']) if failover else (None, None)
+
 class LegalClauseExtractor:
     """Extract and classify legal clauses from text using AI"""
 
@@ -396,114 +862,554 @@ class LegalClauseExtractor:
                 r'trademark.*?license'
             ]
         }
+        self._compiled_patterns = compile_clause_patterns(self.clause_patterns)
+        self.llm_classifier = LLMClauseClassifier(
+            lambda prompt: classify_clause_window(prompt), self.clause_patterns.keys(), model_key='llama3',
+            window_words=CLAUSE_WINDOW_WORDS, overlap_words=CLAUSE_WINDOW_WORDS // 10,
+            max_workers=CLAUSE_LLM_CONCURRENCY, cache=WindowCache(CLAUSE_WINDOW_CACHE_SIZE)
+        )
     
-    def extract_clauses(self, text: str) -> List[Dict[str, Any]]:
+    def extract_clauses(self, text: str) -> List[ClauseRecord]:
         """Extract clauses from legal document text"""
-        clauses = []
-        sentences = self._split_into_sentences(text)
-        
-        for clause_type, patterns in self.clause_patterns.items():
-            for pattern in patterns:
-                matches = re.finditer(pattern, text, re.IGNORECASE | re.DOTALL)
-                for match in matches:
-                    # Extract surrounding context
-                    start_pos = max(0, match.start() - 200)
-                    end_pos = min(len(text), match.end() + 200)
-                    context = text[start_pos:end_pos].strip()
-                    
-                    clause = {
-                        'type': clause_type,
-                        'title': f"{clause_type.replace('_', ' ').title()} Clause",
-                        'content': context,
-                        'confidence': 0.8,  # Pattern-based confidence
-                        'start_position': match.start(),
-                        'end_position': match.end()
-                    }
-                    clauses.append(clause)
-        
-        return self._deduplicate_clauses(clauses)
-    
+        with span('clause_extraction'):
+            clauses = find_clauses(text, self._compiled_patterns)
+
+        with span('post_processing'):
+            return self._deduplicate_clauses(clauses)
+
+    def _deduplicate_clauses(self, clauses: List[ClauseRecord]) -> List[ClauseRecord]:
+        """Remove duplicate clauses based on content similarity"""
+        unique_clauses = []
+        unique_words = []
+        for clause in clauses:
+            words = set(clause['content'].lower().split())
+            if not any(self._word_overlap(words, existing) > 0.8 for existing in unique_words):
+                unique_clauses.append(clause)
+                unique_words.append(words)
+        return unique_clauses
+
+    @staticmethod
+    def _word_overlap(words1: set, words2: set) -> float:
+        """Jaccard similarity of two word sets"""
+        union = words1 | words2
+        return len(words1 & words2) / len(union) if union else 0
+
     def _split_into_sentences(self, text: str) -> List[str]:
         """Split text into sentences"""
         sentences = re.split(r'[.!?]+', text)
         return [s.strip() for s in sentences if s.strip()]
 
-    def extract_with_llama3(self, text: str) -> List[Dict[str, Any]]:
-        """Extract clauses using LLaMA 3 for enhanced accuracy"""
-        prompt = """Analyze the following legal document text and extract key legal clauses.
-        For each clause found, provide:
-        1. Clause type (liability, confidentiality, termination, payment, etc.)
-        2. Brief summary
-        3. Key terms
-        4. Risk level (Low/Medium/High)
-
-        Text to analyze:
-        """ + text[:2000]  # Limit text length
+    def extract_with_llama3(self, text: str) -> List[ClauseRecord]:
+        """Extract clauses using LLaMA 3 for enhanced accuracy.
 
-        response = query_llama3(prompt, text)
-
-        # Parse LLaMA 3 response and combine with pattern-based extraction
+        Windows of the whole document are classified concurrently and the
+        LLM clauses are merged with the pattern matches; a regex hit inside
+        an LLM clause of the same type is folded into it.
+        """
         pattern_clauses = self.extract_clauses(text)
 
-        return pattern_clauses  # In production, would parse and merge LLaMA 3 results
+        with span('llm_clause_classification'):
+            llm_clauses = self.llm_classifier.extract(text)
+
+        with span('post_processing'):
+            return merge_clause_hits(llm_clauses, pattern_clauses)
 
 class RAGPipeline:
     """Retrieval-Augmented Generation pipeline for legal document Q&A"""
 
-    def __init__(self):
+    def __init__(self, store=None, in_memory: bool = True, embedding_storage: str = None):
+        self.documents = {}
         self.document_chunks = []
-        self.chunk_embeddings = []
-
-    def add_document(self, document_id: str, text: str):
+        # Row i of the embedding index belongs to document_chunks[i]
+        self.embedding_index = EmbeddingIndex(embedding_storage or EMBEDDING_STORAGE, EMBEDDING_RESCORE_FACTOR)
+        # Live index rows of each document; rows of replaced chunks are deleted from the index
+        self.document_rows: Dict[str, List[int]] = {}
+        # Chunks with identical text share one row: document_chunks[row] is the
+        # row's primary chunk, further chunks of other documents are aliases
+        self.row_aliases: Dict[int, List[Dict[str, Any]]] = {}
+        self.row_by_key: Dict[bytes, int] = {}
+        self.row_keys: Dict[int, bytes] = {}
+        # SimHash of every document for near-duplicate detection, and of every
+        # row's chunk text for collapsing near-duplicate hits
+        self.fingerprints = SimHashIndex()
+        self.row_fingerprints: Dict[int, int] = {}
+        self._write_lock = threading.Lock()
+        # Documents and rows changed by the current write, journaled for the
+        # other workers when the index is shared (see share_index)
+        self._changed_documents, self._changed_texts, self._changed_rows = set(), set(), set()
+        # Optional persistent store (vector_store.SQLiteVectorStore); bulk loaders
+        # that only write to the store can skip the in-memory index
+        self.store = store
+        self.in_memory = in_memory
+
+    @property
+    def shared(self) -> bool:
+        return isinstance(self.embedding_index, SharedEmbeddingIndex)
+
+    def share_index(self, directory: str):
+        """Move the embedding matrix into a shared index that worker processes forked later all search.
+
+        Chunk metadata loaded so far stays in this process and is inherited by
+        the forked workers; changes made after the fork reach the other
+        workers through the shared index's journal.
+        """
+        shared_index.reset(directory)
+        index = SharedEmbeddingIndex(directory, self.embedding_index.storage, self.embedding_index.rescore_factor)
+        with self._write_lock, index.writing():
+            index.copy_from(self.embedding_index)
+            index.publish()
+            self.embedding_index = index
+
+    def sync(self):
+        """Apply the changes other worker processes made to the shared index"""
+        if self.shared and self.embedding_index.changed():
+            with self._write_lock:
+                self._replay(self.embedding_index.refresh())
+
+    @contextmanager
+    def _writing(self) -> Iterator[None]:
+        """Serialize a change to the in-memory index, across processes when it is shared"""
+        with self._write_lock:
+            if not self.shared:
+                try:
+                    yield
+                finally:
+                    self._changed_documents, self._changed_texts, self._changed_rows = set(), set(), set()
+                return
+            with self.embedding_index.writing() as records:
+                self._replay(records)
+                try:
+                    yield
+                finally:
+                    self.embedding_index.publish(self._journal_changes())
+                    if self.embedding_index.should_compact(SHARED_JOURNAL_MAX_BYTES):
+                        # Workers forked later replay the current state instead of every past version
+                        self.embedding_index.compact([self._snapshot()])
+
+    def _journal_changes(self) -> List[Dict[str, Any]]:
+        """Journal records of the documents and rows changed by the current write"""
+        records = []
+        for document_id in self._changed_documents:
+            if document_id not in self.document_rows:
+                records.append({'document': document_id, 'removed': True})
+                continue
+            record = {'document': document_id, 'rows': self.document_rows[document_id]}
+            if document_id in self._changed_texts:
+                record['text'] = self.documents.get(document_id)
+                record['fingerprint'] = self.fingerprints.fingerprints.get(document_id)
+            records.append(record)
+        # Rows after documents, so replaying a row finds the text of its chunk
+        for row in sorted(self._changed_rows):
+            records.append({'row': row, 'chunk': self.document_chunks[row],
+                            'aliases': self.row_aliases.get(row, [])})
+        self._changed_documents, self._changed_texts, self._changed_rows = set(), set(), set()
+        return records
+
+    def _snapshot(self) -> Dict[str, Any]:
+        """Journal record of the whole in-memory state, which replaces the records before it"""
+        return {'snapshot': {
+            'documents': self.documents,
+            'document_rows': self.document_rows,
+            'fingerprints': self.fingerprints.fingerprints,
+            'chunks': self.document_chunks,
+            'aliases': list(self.row_aliases.items()),
+            'row_fingerprints': list(self.row_fingerprints.items())
+        }}
+
+    def _restore(self, state: Dict[str, Any]):
+        """Replace the in-memory state with a snapshot written by another process"""
+        self.documents = state['documents']
+        self.document_rows = state['document_rows']
+        self.document_chunks = state['chunks']
+        self.row_aliases = {row: aliases for row, aliases in state['aliases']}
+        self.row_fingerprints = {row: fingerprint for row, fingerprint in state['row_fingerprints']}
+        self.row_by_key, self.row_keys = {}, {}
+        for row, chunk_data in enumerate(self.document_chunks):
+            if chunk_data is not None:
+                key = self.row_keys[row] = content_key(self.get_chunk_text(chunk_data))
+                self.row_by_key[key] = row
+        self.fingerprints = SimHashIndex()
+        for document_id, fingerprint in state['fingerprints'].items():
+            self.fingerprints.add(document_id, fingerprint)
+
+    def _replay(self, records: List[Dict[str, Any]]):
+        """Apply journal records written by other processes (under the write lock)"""
+        for record in records:
+            if 'snapshot' in record:
+                self._restore(record['snapshot'])
+            elif 'row' in record:
+                row, chunk_data = record['row'], record['chunk']
+                if row >= len(self.document_chunks):
+                    self.document_chunks.extend([None] * (row + 1 - len(self.document_chunks)))
+                self.document_chunks[row] = chunk_data
+                if record['aliases']:
+                    self.row_aliases[row] = record['aliases']
+                else:
+                    self.row_aliases.pop(row, None)
+                if chunk_data is None:
+                    key = self.row_keys.pop(row, None)
+                    if key is not None and self.row_by_key.get(key) == row:
+                        del self.row_by_key[key]
+                    self.row_fingerprints.pop(row, None)
+                elif row not in self.row_keys:
+                    text = self.get_chunk_text(chunk_data)
+                    key = self.row_keys[row] = content_key(text)
+                    self.row_by_key[key] = row
+                    self.row_fingerprints[row] = simhash(text)
+            elif record.get('removed'):
+                self.document_rows.pop(record['document'], None)
+                self.documents.pop(record['document'], None)
+                self.fingerprints.remove(record['document'])
+            else:
+                document_id = record['document']
+                self.document_rows[document_id] = record['rows']
+                if record.get('text') is not None:
+                    self.documents[document_id] = record['text']
+                if record.get('fingerprint') is not None:
+                    self.fingerprints.add(document_id, record['fingerprint'])
+
+    def add_document(self, document_id: str, text: str) -> int:
         """Add document to RAG knowledge base"""
-        # Split document into chunks
-        chunks = self._chunk_text(text)
-
-        for i, chunk in enumerate(chunks):
-            chunk_data = {
-                'document_id': document_id,
-                'chunk_id': f"{document_id}_{i}",
-                'text': chunk,
-                'embedding': generate_embeddings(chunk)
-            }
-            self.document_chunks.append(chunk_data)
-            self.chunk_embeddings.append(chunk_data['embedding'])
-
-    def _chunk_text(self, text: str, chunk_size: int = 500) -> List[str]:
-        """Split text into overlapping chunks"""
-        words = text.split()
+        return self.add_document_version(document_id, text)['chunks']
+
+    def add_document_version(self, document_id: str, text: str) -> Dict[str, Any]:
+        """Add a document or a new revision of it, re-embedding only changed chunks.
+
+        Chunks whose text is identical to a chunk of the stored version keep
+        their embedding row (with updated offsets), and chunks identical to a
+        chunk of another document share that document's row; rows of chunks
+        that no longer exist are deleted from the index. Other documents whose
+        SimHash is within a few bits of this one are reported as near-duplicates.
+        """
+        # Chunks reference the stored document text by character offsets
         chunks = []
+        texts = []
+        with span('chunking'):
+            for i, (start, end) in enumerate(self._chunk_text(text)):
+                chunks.append({
+                    'document_id': document_id,
+                    'chunk_id': f"{document_id}_{i}",
+                    'chunk_index': i,
+                    'start_offset': start,
+                    'end_offset': end
+                })
+                texts.append(text[start:end])
+
+        self.sync()
+        previous_rows = self.document_rows.get(document_id, []) if self.in_memory else []
+        with span('diff'):
+            matches = match_unchanged(
+                ((row, self.get_chunk_text(self.document_chunks[row])) for row in previous_rows), texts
+            )
+            unchanged = sum(row is not None for row in matches)
+            fingerprint = simhash(text)
+            near_duplicates = [doc_id for doc_id, _ in self.fingerprints.query(fingerprint, exclude=document_id)]
+            keys = [content_key(chunk_text) for chunk_text in texts]
+            if self.in_memory:
+                # Chunks already indexed for another document reuse that embedding
+                matches = [row if row is not None else self.row_by_key.get(key)
+                           for row, key in zip(matches, keys)]
+
+        changed = [i for i, row in enumerate(matches) if row is None]
+        # Identical chunks within the document are embedded once
+        unique = {}
+        for i in changed:
+            unique.setdefault(keys[i], i)
+        unique_embeddings = np.asarray(generate_embeddings_batch([texts[i] for i in unique.values()]),
+                                       dtype=np.float32)
+        by_key = dict(zip(unique, unique_embeddings))
+        embeddings = [by_key[keys[i]] for i in changed]
+
+        if self.store is not None:
+            # Reused chunks are rewritten with their stored full-precision vectors
+            vectors = dict(zip(changed, embeddings))
+            reused = [i for i, row in enumerate(matches) if row is not None]
+            if reused:
+                vectors.update(zip(reused, self.store.get_embeddings(
+                    [self.document_chunks[matches[i]]['chunk_id'] for i in reused])))
+            self.store.replace_document(document_id, [
+                dict(chunk_data, text=texts[i], embedding=vectors[i]) for i, chunk_data in enumerate(chunks)
+            ])
+
+        # Reused chunks whose row a concurrent update dropped, embedded again
+        dropped = []
+        if self.in_memory:
+            with self._writing():
+                # Rows of the version current now, which another worker may have replaced meanwhile
+                orphaned = self._detach(document_id, self.document_rows.get(document_id, []))
+                self.documents[document_id] = text
+                self._changed_documents.add(document_id)
+                self._changed_texts.add(document_id)
+                rows = []
+                for chunk_data, row in zip(chunks, matches):
+                    if row is None:
+                        continue
+                    if self.document_chunks[row] is None and row not in orphaned:
+                        # The shared row was dropped by a concurrent update of its owner
+                        dropped.append(chunk_data['chunk_index'])
+                        continue
+                    self._attach(row, chunk_data)
+                    orphaned.discard(row)
+                    rows.append(row)
+                self._drop_rows(orphaned)
+                self.document_rows[document_id] = rows
+                self.fingerprints.add(document_id, fingerprint)
+            if dropped:
+                # Outside the write lock, like the other changed chunks
+                changed.extend(dropped)
+                embeddings.extend(np.asarray(generate_embeddings_batch([texts[i] for i in dropped]),
+                                             dtype=np.float32))
+            if changed:
+                self._append([chunks[i] for i in changed], np.asarray(embeddings, dtype=np.float32))
+
+        chunks_embedded = len(unique) + len(dropped)
+        return {
+            'chunks': len(chunks),
+            'chunks_embedded': chunks_embedded,
+            'chunks_reused': len(chunks) - chunks_embedded,
+            'chunks_removed': len(previous_rows) - unchanged,
+            'near_duplicates': near_duplicates
+        }
 
-        for i in range(0, len(words), chunk_size - 50):  # 50 word overlap
-            chunk = ' '.join(words[i:i + chunk_size])
-            chunks.append(chunk)
-
-        return chunks
-
-    def retrieve_relevant_chunks(self, query: str, top_k: int = 3) -> List[Dict[str, Any]]:
-        """Retrieve most relevant document chunks for query"""
+    def _detach(self, document_id: str, rows: List[int]) -> set:
+        """Drop a document's chunks from rows and return rows left without chunks"""
+        orphaned = set()
+        self._changed_rows.update(rows)
+        for row in set(rows):
+            primary = self.document_chunks[row]
+            if primary is not None and primary['document_id'] == document_id:
+                primary = None
+            aliases = [chunk for chunk in self.row_aliases.pop(row, []) if chunk['document_id'] != document_id]
+            if primary is None and aliases:
+                primary = aliases.pop(0)
+            self.document_chunks[row] = primary
+            if aliases:
+                self.row_aliases[row] = aliases
+            if primary is None:
+                orphaned.add(row)
+        return orphaned
+
+    def _attach(self, row: int, chunk_data: Dict[str, Any]):
+        self._changed_rows.add(row)
+        if self.document_chunks[row] is None:
+            self.document_chunks[row] = chunk_data
+        else:
+            self.row_aliases.setdefault(row, []).append(chunk_data)
+
+    def _drop_rows(self, rows):
+        """Delete rows no chunk refers to any more"""
+        self.embedding_index.delete(list(rows))
+        for row in rows:
+            key = self.row_keys.pop(row, None)
+            if key is not None and self.row_by_key.get(key) == row:
+                del self.row_by_key[key]
+            self.row_fingerprints.pop(row, None)
+
+    def get_document(self, document_id: str) -> Optional[str]:
+        """Full text of an added document (None when unknown or added as a stream)"""
+        self.sync()
+        return self.documents.get(document_id)
+
+    def remove_document(self, document_id: str):
+        """Drop a document's chunks from the index and the store"""
+        with self._writing():
+            self._drop_rows(self._detach(document_id, self.document_rows.pop(document_id, [])))
+            self.documents.pop(document_id, None)
+            self._changed_documents.add(document_id)
+            self.fingerprints.remove(document_id)
+        if self.store is not None:
+            self.store.delete_document(document_id)
+
+    def add_document_stream(self, document_id: str, blocks: Iterator[str], batch_size: int = 32) -> int:
+        """Add a document arriving as text blocks, embedding chunks in batches.
+
+        The full text is never assembled, so streamed chunks keep their own
+        text alongside the character offsets, and a previously stored version
+        is replaced as a whole.
+        """
+        self.sync()
+        if document_id in self.document_rows or (self.store is not None and self.store.has_document(document_id)):
+            self.remove_document(document_id)
+
+        chunks_created = 0
+        batch = []
+
+        for span, chunk in iter_stream_chunks(blocks):
+            batch.append({
+                'document_id': document_id,
+                'chunk_id': f"{document_id}_{span.index}",
+                'chunk_index': span.index,
+                'start_offset': span.start,
+                'end_offset': span.end,
+                'text': chunk
+            })
+            chunks_created += 1
+            if len(batch) >= batch_size:
+                self.index_chunks(batch, [c['text'] for c in batch])
+                batch = []
+        if batch:
+            self.index_chunks(batch, [c['text'] for c in batch])
+
+        return chunks_created
+
+    def index_chunks(self, chunks: List[Dict[str, Any]], texts: List[str]):
+        """Embed a batch of chunks and add them to the store and in-memory index"""
+        embeddings = np.asarray(generate_embeddings_batch(texts), dtype=np.float32)
+
+        if self.store is not None:
+            self.store.add_chunks([
+                dict(chunk_data, text=text, embedding=embedding)
+                for chunk_data, text, embedding in zip(chunks, texts, embeddings)
+            ])
+
+        if self.in_memory:
+            self._append(chunks, embeddings)
+
+    def _append(self, chunks: List[Dict[str, Any]], embeddings: np.ndarray):
+        """Add chunk metadata and embeddings to the in-memory index in row order.
+
+        A chunk whose text is already indexed becomes an alias of that row
+        instead of storing its embedding again.
+        """
+        with self._writing():
+            first_row = len(self.document_chunks)
+            fresh_chunks, fresh_embeddings = [], []
+            for chunk_data, embedding in zip(chunks, embeddings):
+                text = self.get_chunk_text(chunk_data)
+                key = content_key(text)
+                row = self.row_by_key.get(key)
+                if row is None:
+                    row = self.row_by_key[key] = first_row + len(fresh_chunks)
+                    self.row_keys[row] = key
+                    self.row_fingerprints[row] = simhash(text)
+                    fresh_chunks.append(chunk_data)
+                    fresh_embeddings.append(embedding)
+                else:
+                    self.row_aliases.setdefault(row, []).append(chunk_data)
+                self.document_rows.setdefault(chunk_data['document_id'], []).append(row)
+                self._changed_documents.add(chunk_data['document_id'])
+                self._changed_rows.add(row)
+
+            if fresh_chunks:
+                self.document_chunks.extend(fresh_chunks)
+                self.embedding_index.add(np.asarray(fresh_embeddings, dtype=np.float32))
+
+    def load_from_store(self, batch_size: int = 1000) -> int:
+        """Populate the in-memory index from the persistent store"""
+        if self.store is None:
+            return 0
+
+        loaded = 0
+        chunks, embeddings = [], []
+        for chunk_data in self.store.iter_chunks():
+            embeddings.append(chunk_data.pop('embedding'))
+            chunks.append(chunk_data)
+            if len(chunks) >= batch_size:
+                self._append(chunks, np.stack(embeddings))
+                loaded += len(chunks)
+                chunks, embeddings = [], []
+        if chunks:
+            self._append(chunks, np.stack(embeddings))
+            loaded += len(chunks)
+        return loaded
+
+    def _full_precision_embeddings(self, rows: np.ndarray) -> np.ndarray:
+        """Fetch float32 embeddings of index rows from the persistent store for rescoring"""
+        return self.store.get_embeddings([self.document_chunks[row]['chunk_id'] for row in rows])
+
+    def _chunk_text(self, text: str, chunk_size: int = 500) -> Iterator[tuple]:
+        """Yield (start, end) spans of structure-aware chunks"""
+        for span in iter_chunk_spans(text, max_words=chunk_size, overlap_words=50):
+            yield span.start, span.end
+
+    def get_chunk_text(self, chunk: Dict[str, Any]) -> str:
+        """Materialize the text of a stored chunk from its offsets"""
+        if 'text' in chunk:
+            return chunk['text']
+        return self.documents[chunk['document_id']][chunk['start_offset']:chunk['end_offset']]
+
+    def retrieve_relevant_chunks(self, query: str, top_k: int = 3, collapse_duplicates: bool = True,
+                                 diversity: float = None, merge_adjacent_hits: bool = True,
+                                 rerank: bool = None, query_embedding=None,
+                                 document_id: str = None) -> List[Dict[str, Any]]:
+        """Retrieve most relevant document chunks for query, only of document_id when given.
+
+        Chunks shared by several documents and near-duplicate chunks of other
+        documents are collapsed into the best-scoring hit, whose
+        ``duplicates`` lists the chunk ids folded into it. With reranking,
+        the candidates are re-ordered by cross-encoder score (``rerank_score``).
+        The remaining candidates are diversified with MMR and overlapping or
+        consecutive hits of one document are merged into a single span.
+        A ``query_embedding`` computed by the caller saves embedding the query.
+        """
+        self.sync()
         if not self.document_chunks:
             return []
+        document_rows = sorted(set(self.document_rows.get(document_id, []))) if document_id else None
+        if document_id and not document_rows:
+            return []
 
-        query_embedding = generate_embeddings(query)
-
-        # Calculate similarity scores (simplified cosine similarity)
-        similarities = []
-        for chunk_embedding in self.chunk_embeddings:
-            # Simple dot product similarity (normalized embeddings assumed)
-            similarity = sum(a * b for a, b in zip(query_embedding, chunk_embedding))
-            similarities.append(similarity)
-
-        # Get top-k most similar chunks
-        top_indices = sorted(range(len(similarities)),
-                           key=lambda i: similarities[i], reverse=True)[:top_k]
-
-        return [self.document_chunks[i] for i in top_indices]
+        if query_embedding is None:
+            query_embedding = generate_embeddings(query)
+        diversity = MMR_DIVERSITY if diversity is None else diversity
+        rerank = RERANK_ENABLED if rerank is None else rerank
+
+        # Dot product similarity (normalized embeddings assumed)
+        with span('retrieval'):
+            rescore = self._full_precision_embeddings if self.store is not None else None
+            fetch = top_k * RETRIEVAL_OVERFETCH if collapse_duplicates or diversity > 0 else top_k
+            if rerank:
+                fetch = max(fetch, RERANK_CANDIDATES)
+            rows, scores = self.embedding_index.search(query_embedding, fetch, rows=document_rows, rescore=rescore)
+
+            candidates, candidate_rows, fingerprints = [], [], []
+            for row, score in zip(rows, scores):
+                chunk_data = self.document_chunks[row]
+                duplicates = [alias['chunk_id'] for alias in self.row_aliases.get(row, [])]
+                if document_id and chunk_data['document_id'] != document_id:
+                    # The row's primary chunk belongs to another document with the same text
+                    alias = next(alias for alias in self.row_aliases[row] if alias['document_id'] == document_id)
+                    duplicates = [chunk_data['chunk_id']] + [d for d in duplicates if d != alias['chunk_id']]
+                    chunk_data = alias
+                text = self.get_chunk_text(chunk_data)
+                if collapse_duplicates:
+                    fingerprint = self.row_fingerprints[row]
+                    kept = next((candidate for candidate, kept_fingerprint in zip(candidates, fingerprints)
+                                 if candidate['document_id'] != chunk_data['document_id']
+                                 and hamming_distance(fingerprint, kept_fingerprint) <= NEAR_DUPLICATE_DISTANCE), None)
+                    if kept is not None:
+                        kept['duplicates'].extend([chunk_data['chunk_id']] + duplicates)
+                        continue
+                    fingerprints.append(fingerprint)
+                candidates.append(dict(chunk_data, text=text, similarity=float(score), duplicates=duplicates))
+                candidate_rows.append(row)
+
+        relevance = [candidate['similarity'] for candidate in candidates]
+        if rerank and candidates:
+            with span('rerank', provider='cross-encoder'):
+                rerank_scores = reranker.rerank(query, [candidate['text'] for candidate in candidates])
+            if rerank_scores is not None:
+                order = np.argsort(-rerank_scores, kind='stable')
+                candidates = [dict(candidates[i], rerank_score=float(rerank_scores[i])) for i in order]
+                candidate_rows = [candidate_rows[i] for i in order]
+                # Cross-encoder logits squashed to (0, 1) so MMR can weigh them against cosine redundancy
+                relevance = 1.0 / (1.0 + np.exp(-rerank_scores[order]))
+
+        with span('reranking'):
+            picked = mmr(self.embedding_index.vectors(candidate_rows) if diversity > 0 else None,
+                         relevance, top_k, diversity)
+            results = [candidates[i] for i in picked]
+            if merge_adjacent_hits:
+                results = merge_adjacent(results, source_text=lambda hit: self.documents.get(hit['document_id']))
+            return results
 
     def answer_question(self, question: str, document_id: str = None) -> Dict[str, Any]:
-        """Answer question using RAG pipeline"""
+        """Answer question using RAG pipeline, from the chunks of document_id when given"""
         # Retrieve relevant chunks
-        relevant_chunks = self.retrieve_relevant_chunks(question)
+        relevant_chunks = self.retrieve_relevant_chunks(question, document_id=document_id or None)
+        # Reranked chunks are precise enough that fewer of them answer the question
+        if relevant_chunks and 'rerank_score' in relevant_chunks[0]:
+            relevant_chunks = relevant_chunks[:RERANK_CONTEXT_CHUNKS]
 
         if not relevant_chunks:
             return {
@@ -513,7 +1419,8 @@ class RAGPipeline:
             }
 
         # Construct context from relevant chunks
-        context = "\n\n".join([chunk['text'] for chunk in relevant_chunks])
+        with span('prompt_build'):
+            context = "\n\n".join([chunk['text'] for chunk in relevant_chunks])
 
         # Query LLaMA 3 with context
         response = query_llama3(question, context)
@@ -521,65 +1428,164 @@ class RAGPipeline:
         return {
             "answer": response['response'],
             "confidence": response['confidence'],
-            "sources": [chunk['chunk_id'] for chunk in relevant_chunks],
+            "sources": [chunk_id for chunk in relevant_chunks for chunk_id in chunk.get('chunk_ids', [chunk['chunk_id']])],
             "model": response['model']
         }
-    
-    def _deduplicate_clauses(self, clauses: List[Dict]) -> List[Dict]:
-        """Remove duplicate clauses based on content similarity"""
-        unique_clauses = []
-        for clause in clauses:
-            is_duplicate = False
-            for existing in unique_clauses:
-                if self._calculate_similarity(clause['content'], existing['content']) > 0.8:
-                    is_duplicate = True
-                    break
-            if not is_duplicate:
-                unique_clauses.append(clause)
-        return unique_clauses
-    
-    def _calculate_similarity(self, text1: str, text2: str) -> float:
-        """Calculate text similarity using simple word overlap"""
-        words1 = set(text1.lower().split())
-        words2 = set(text2.lower().split())
-        intersection = words1.intersection(words2)
-        union = words1.union(words2)
-        return len(intersection) / len(union) if union else 0
+
+
+class ShardedRAGPipeline(RAGPipeline):
+    """RAG pipeline of a router node whose index is partitioned over shard services (see shard_router)"""
+
+    def __init__(self, router: ShardRouter):
+        super().__init__(in_memory=False)
+        self.router = router
+
+    def add_document_version(self, document_id: str, text: str) -> Dict[str, Any]:
+        """Add the document on the shard owning it (near-duplicates are only found within that shard)"""
+        response = self.router.forward(document_id, '/api/add-document',
+                                       json={'document_id': document_id, 'text': text})
+        return {
+            'chunks': response['chunks_created'],
+            'chunks_embedded': response['chunks_embedded'],
+            'chunks_reused': response['chunks_reused'],
+            'near_duplicates': response['near_duplicates'],
+            'shard': response['shard']
+        }
+
+    def add_document_stream(self, document_id: str, blocks: Iterator[str], batch_size: int = 32) -> int:
+        """Stream the document's blocks to the shard owning it as NDJSON parts"""
+        lines = (json.dumps({'document_id': document_id, 'text': block}).encode('utf-8') + b'\n'
+                 for block in blocks)
+        response = self.router.forward(document_id, '/api/ingest-stream', data=lines,
+                                       headers={'Content-Type': 'application/x-ndjson'})
+        return response['total_chunks']
+
+    def search(self, query: str, top_k: int = 3, **options) -> Dict[str, Any]:
+        """Scatter a search to every shard and merge their hits, with the status of each shard.
+
+        The query is embedded once here instead of on every shard. Duplicate
+        collapsing, MMR and merging of adjacent hits run within each shard.
+        """
+        payload = {'query': query, 'top_k': top_k,
+                   'embedding': wire_format.encode_base64(generate_embeddings(query)), **options}
+        with span('retrieval', provider='shards'):
+            return self.router.search('/api/semantic-search', payload, top_k)
+
+    def retrieve_relevant_chunks(self, query: str, top_k: int = 3, **options) -> List[Dict[str, Any]]:
+        return self.search(query, top_k, **options)['results']
+
+    def get_document(self, document_id: str) -> Optional[str]:
+        """Full text of the document, fetched from the shard owning it"""
+        response = self.router.request(self.router.owner(document_id), 'GET',
+                                       f"/api/documents/{quote(document_id, safe='')}")
+        return response['text'] if response is not None else None
+
+    def remove_document(self, document_id: str):
+        """Remove the document from the shard owning it"""
+        self.router.forward(document_id, f"/api/documents/{quote(document_id, safe='')}", method='DELETE')
+
+    def answer_question(self, question: str, document_id: str = None) -> Dict[str, Any]:
+        """Answer a question about one document on the shard owning it, otherwise from the hits of all shards"""
+        if not document_id:
+            return super().answer_question(question)
+        response = self.router.forward(document_id, '/api/rag-query',
+                                       json={'question': question, 'document_id': document_id})
+        return {key: response[key] for key in ('answer', 'confidence', 'sources', 'model', 'shard')
+                if key in response}
+
 
 # Initialize AI components
+llm_flights = SingleFlight('llm')
+embedding_flights = SingleFlight('embeddings')
+# Every Ollama endpoint has its own breaker inside the pool
+ollama_pool = OllamaPool(OLLAMA_HOSTS, make_client=make_ollama_client, connect_timeout=OLLAMA_CONNECT_TIMEOUT,
+                         failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_timeout=BREAKER_RESET_SECONDS)
+# Rate limiting and a full wait queue are not backend failures
+circuit_breakers = {
+    provider: CircuitBreaker(provider, BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_SECONDS,
+                             excluded_exceptions=(RateLimitedError, LimiterQueueFull))
+    for provider in AI_PROVIDERS
+}
 clause_extractor = LegalClauseExtractor()
-rag_pipeline = RAGPipeline()
+sessions = SessionStore(SESSION_TTL_SECONDS, MAX_SESSIONS)
+if SHARD_URLS:
+    rag_pipeline = ShardedRAGPipeline(ShardRouter(SHARD_URLS, SHARD_TIMEOUT, failure_threshold=BREAKER_FAILURE_THRESHOLD,
+                                                  reset_timeout=BREAKER_RESET_SECONDS))
+else:
+    rag_pipeline = RAGPipeline(store=SQLiteVectorStore(VECTOR_STORE_PATH) if VECTOR_STORE_PATH else None)
+# Loaded by the warm-up thread; requests keep the first-stage order until then
+reranker = CrossEncoderReranker(get_reranker_model, RERANK_BUDGET_MS / 1000,
+                                ready=lambda: reranker_status == 'ready')
+# Clause embeddings share the RAG pipeline's persistent store
+clause_index = ClauseIndex(lambda texts: generate_embeddings_batch(texts), store=rag_pipeline.store)
 
 @app.route('/health', methods=['GET'])
 def health_check():
-    """Health check endpoint"""
+    """Health check endpoint (liveness plus warm-up details)"""
     return jsonify({
         'status': 'healthy',
+        'ready': is_ready(),
         'models_loaded': embedding_model is not None,
-        'ollama_available': ollama_client is not None
+        'ollama_available': component_status['ollama'] == 'ready' and ollama_pool.healthy(),
+        'components': dict(component_status),
+        'reranker': {'status': reranker_status, **reranker.stats},
+        'providers': {name: limiter.snapshot() for name, limiter in provider_limiters.items()},
+        'circuit_breakers': {name: breaker.snapshot() for name, breaker in circuit_breakers.items()},
+        'ollama_endpoints': ollama_pool.snapshot(),
+        'sessions': len(sessions),
+        'shards': rag_pipeline.router.snapshot() if isinstance(rag_pipeline, ShardedRAGPipeline) else None,
+        'clause_window_cache': {'entries': len(clause_extractor.llm_classifier.cache),
+                                **clause_extractor.llm_classifier.cache.stats},
+        'coalescing': {flights.name: flights.snapshot() for flights in (llm_flights, embedding_flights)},
+        'startup': startup_metrics,
+        'pid': os.getpid()
     })
 
+@app.route('/health/live', methods=['GET'])
+def liveness_check():
+    """Liveness probe: the process is up and serving requests"""
+    return jsonify({'status': 'alive'})
+
+@app.route('/health/ready', methods=['GET'])
+def readiness_check():
+    """Readiness probe: 503 until background warm-up has finished"""
+    ready = is_ready()
+    return jsonify({
+        'status': 'ready' if ready else 'warming_up',
+        'components': dict(component_status)
+    }), 200 if ready else 503
+
 @app.route('/api/embed', methods=['POST'])
 def generate_embedding():
-    """Generate embeddings for text"""
+    """Generate embeddings for text, or for a batch of texts in one model call.
+
+    Vectors are JSON floats by default; "encoding": "base64" (or
+    ?encoding=base64) sends float32 bytes as base64, and clients accepting
+    application/octet-stream or application/msgpack get binary float32.
+    """
     try:
-        data = request.get_json()
-        text = data.get('text', '')
-        
-        if not text:
+        data = wire_format.read_payload()
+        texts = data.get('texts')
+        single = texts is None
+        if single:
+            texts = [data.get('text', '')]
+
+        if not isinstance(texts, list) or not texts or not all(isinstance(t, str) and t for t in texts):
             return jsonify({'error': 'Text is required'}), 400
         
-        if embedding_model is None:
+        model = get_embedding_model()
+        if model is None:
             return jsonify({'error': 'Embedding model not loaded'}), 500
         
-        # Generate embedding
-        embedding = embedding_model.encode(text)
+        # Generate embeddings
+        with span('embedding', provider='sentence-transformers'):
+            embeddings = np.asarray(model.encode(texts), dtype=np.float32)
         
-        return jsonify({
-            'embedding': embedding.tolist(),
-            'dimension': len(embedding),
-            'model': 'all-MiniLM-L6-v2'
-        })
+        return wire_format.vectors_response(
+            embeddings, wire_format.negotiate(raw_vectors=True),
+            encoding=data.get('encoding') or request.args.get('encoding'),
+            single=single, model=EMBEDDING_MODEL_NAME
+        )
         
     except Exception as e:
         logger.error(f"Error generating embedding: {str(e)}")
@@ -596,21 +1602,80 @@ def extract_clauses():
         if not text:
             return jsonify({'error': 'Text is required'}), 400
         
-        # Extract clauses
-        clauses = clause_extractor.extract_clauses(text)
+        # Extract clauses; use_llm adds LLaMA 3 classification of the whole document
+        if data.get('use_llm', False):
+            clauses = clause_extractor.extract_with_llama3(text)
+        else:
+            clauses = clause_extractor.extract_clauses(text)
         
         logger.info(f"Extracted {len(clauses)} clauses from document {document_id}")
+
+        serialized = [clause.to_dict() for clause in clauses]
+        # Opt-in: embedding every clause would make extraction wait for the embedding model
+        if document_id and data.get('index_clauses', False):
+            with span('clause_indexing'):
+                clause_ids = clause_index.index_document(document_id, serialized)
+            for clause, clause_id in zip(serialized, clause_ids):
+                clause['clause_id'] = clause_id
         
         return jsonify({
-            'clauses': clauses,
+            'clauses': serialized,
             'document_id': document_id,
-            'total_clauses': len(clauses)
+            'total_clauses': len(clauses),
+            **response_timings()
         })
         
     except Exception as e:
         logger.error(f"Error extracting clauses: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/similar-clauses', methods=['POST'])
+def find_similar_clauses():
+    """Find clauses across the corpus similar to an indexed clause or a text.
+
+    Clauses are indexed by /api/extract-clauses with a document_id and
+    "index_clauses": true.
+
+    Accepts {"clause_id"} or {"text"}, plus optional "clause_type" (defaults
+    to the type of the given clause), "top_k", "min_similarity" and
+    "include_same_document".
+    """
+    try:
+        data = request.get_json()
+        clause_id = data.get('clause_id', '')
+        text = data.get('text', '')
+        top_k = int(data.get('top_k', 10))
+        min_similarity = data.get('min_similarity')
+        if min_similarity is not None:
+            min_similarity = float(min_similarity)
+
+        if not clause_id and not text:
+            return jsonify({'error': 'clause_id or text is required'}), 400
+
+        with span('retrieval'):
+            if clause_id:
+                source = clause_index.get(clause_id)
+                if source is None:
+                    return jsonify({'error': f'Unknown clause: {clause_id}'}), 404
+                clause_type = data.get('clause_type') or source['type']
+                matches = clause_index.similar_to(clause_id, top_k, clause_type,
+                                                  bool(data.get('include_same_document')), min_similarity)
+            else:
+                clause_type = data.get('clause_type')
+                matches = clause_index.search(generate_embeddings(text), top_k, clause_type,
+                                              min_similarity=min_similarity)
+
+        return jsonify({
+            'clauses': matches,
+            'clause_type': clause_type,
+            'total': len(matches),
+            **response_timings()
+        })
+
+    except Exception as e:
+        logger.error(f"Error finding similar clauses: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/query', methods=['POST'])
 def query_llm():
     """Query AI model with context using external APIs"""
@@ -618,12 +1683,12 @@ def query_llm():
         data = request.get_json()
         question = data.get('question', '')
         context = data.get('context', '')
-        provider = data.get('provider', DEFAULT_AI_PROVIDER)
+        provider = data.get('provider')
 
         if not question:
             return jsonify({'error': 'Question is required'}), 400
 
-        logger.info(f"Processing query with {provider} AI provider")
+        logger.info(f"Processing query with {provider or DEFAULT_AI_PROVIDER} AI provider")
 
         # Prepare prompt for legal document analysis
         prompt = f"""You are a legal document analysis assistant. Based on the provided context from legal documents, answer the user's question accurately and concisely.
@@ -633,7 +1698,7 @@ Question: {question}
 Please provide a clear, professional answer. If you need more context to provide a complete answer, please state that clearly."""
 
         # Call external AI API
-        answer = call_external_ai_api(provider, prompt, context)
+        answer, provider = call_external_ai_api(provider, prompt, context)
 
         # Calculate confidence based on response characteristics
         confidence = min(0.9, len(answer) / 200 * 0.3 + 0.6)
@@ -641,9 +1706,11 @@ Please provide a clear, professional answer. If you need more context to provide
         return jsonify({
             'answer': answer,
             'confidence': confidence,
-            'model_used': f"{provider}_{AI_PROVIDERS.get(provider, {}).get('model', 'unknown')}",
+            'model_used': (f"{provider}_{AI_PROVIDERS[provider]['model']}" if provider in AI_PROVIDERS
+                           else provider),
             'context_length': len(context),
-            'provider': provider
+            'provider': provider,
+            **response_timings()
         })
 
     except Exception as e:
@@ -669,19 +1736,113 @@ def add_document_to_rag():
         if not document_id or not text:
             return jsonify({'error': 'document_id and text are required'}), 400
 
-        # Add to RAG pipeline
-        rag_pipeline.add_document(document_id, text)
+        # Add to RAG pipeline; unchanged chunks of a stored version are not re-embedded
+        update = rag_pipeline.add_document_version(document_id, text)
 
         return jsonify({
             'message': 'Document added to RAG knowledge base',
             'document_id': document_id,
-            'chunks_created': len([c for c in rag_pipeline.document_chunks if c['document_id'] == document_id])
+            'chunks_created': update['chunks'],
+            'chunks_embedded': update['chunks_embedded'],
+            'chunks_reused': update['chunks_reused'],
+            'near_duplicates': update['near_duplicates'],
+            **response_timings()
         })
 
     except Exception as e:
         logger.error(f"Error adding document to RAG: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/documents/<path:document_id>', methods=['GET'])
+def get_document_from_rag(document_id):
+    """Full text of a document in the RAG knowledge base (router nodes fetch it from its shard)"""
+    try:
+        text = rag_pipeline.get_document(document_id)
+        if text is None:
+            return jsonify({'error': f'Document {document_id} not found'}), 404
+        return jsonify({'document_id': document_id, 'text': text})
+
+    except Exception as e:
+        logger.error(f"Error fetching document: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/documents/<path:document_id>', methods=['DELETE'])
+def remove_document_from_rag(document_id):
+    """Remove a document from the RAG knowledge base and its clauses from the clause index"""
+    try:
+        rag_pipeline.remove_document(document_id)
+        clause_index.remove_document(document_id)
+        return jsonify({'message': 'Document removed from RAG knowledge base', 'document_id': document_id})
+
+    except Exception as e:
+        logger.error(f"Error removing document from RAG: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/ingest-stream', methods=['POST'])
+def ingest_document_stream():
+    """Stream documents into the RAG knowledge base without buffering the body.
+
+    Accepts NDJSON (one {"document_id", "text"} object per line, consecutive
+    lines with the same document_id are parts of one document), or a raw
+    text/plain, PDF or DOCX body with the document_id as a query parameter.
+    An invalid NDJSON line fails the request with the documents ingested
+    before it listed in the error response.
+    """
+    try:
+        content_type = request.mimetype
+        stream = request.stream
+        ingested = []
+
+        if content_type in ingestion.NDJSON_CONTENT_TYPES:
+            try:
+                for header, blocks in ingestion.iter_ndjson_documents(stream):
+                    if not header['document_id']:
+                        raise ValueError('document_id is required on every line')
+                    if header['metadata']:
+                        raise ValueError(f"metadata is not stored by the RAG knowledge base "
+                                         f"(document {header['document_id']})")
+                    chunks_created = rag_pipeline.add_document_stream(header['document_id'], blocks)
+                    ingested.append({'document_id': header['document_id'], 'chunks_created': chunks_created})
+            except ValueError as e:
+                # The body is not buffered, so documents before the bad line are already ingested
+                return jsonify({
+                    'error': str(e),
+                    'documents': ingested,
+                    'total_documents': len(ingested)
+                }), 400
+        else:
+            document_id = request.args.get('document_id', '')
+            if not document_id:
+                return jsonify({'error': 'document_id query parameter is required'}), 400
+
+            if content_type in ingestion.PDF_CONTENT_TYPES:
+                blocks = ingestion.iter_pdf_pages(stream)
+            elif content_type in ingestion.DOCX_CONTENT_TYPES:
+                blocks = ingestion.iter_docx_paragraphs(stream)
+            elif content_type in ingestion.TEXT_CONTENT_TYPES:
+                blocks = ingestion.iter_text_blocks(stream, request.mimetype_params.get('charset', 'utf-8'))
+            else:
+                return jsonify({'error': f'Unsupported content type: {content_type}'}), 415
+
+            chunks_created = rag_pipeline.add_document_stream(document_id, blocks)
+            ingested.append({'document_id': document_id, 'chunks_created': chunks_created})
+
+        logger.info(f"Streamed {len(ingested)} documents into RAG knowledge base")
+
+        return jsonify({
+            'message': 'Documents added to RAG knowledge base',
+            'documents': ingested,
+            'total_documents': len(ingested),
+            'total_chunks': sum(d['chunks_created'] for d in ingested),
+            **response_timings()
+        })
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error in streaming ingestion: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/rag-query', methods=['POST'])
 def rag_query():
     """Query using RAG pipeline"""
@@ -695,12 +1856,102 @@ def rag_query():
 
         result = rag_pipeline.answer_question(question, document_id)
 
-        return jsonify(result)
+        return jsonify({**result, **response_timings()})
 
     except Exception as e:
         logger.error(f"Error in RAG query: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/semantic-search', methods=['POST'])
+def semantic_search():
+    """Search the RAG index; a router node scatters the search to all shards and merges their hits"""
+    try:
+        data = wire_format.read_payload()
+        query = data.get('query', '')
+        top_k = int(data.get('top_k', 5))
+
+        if not query:
+            return jsonify({'error': 'Query is required'}), 400
+
+        options = {key: data[key] for key in ('collapse_duplicates', 'diversity', 'merge_adjacent_hits', 'rerank',
+                                              'document_id')
+                   if data.get(key) is not None}
+        if isinstance(rag_pipeline, ShardedRAGPipeline):
+            result = rag_pipeline.search(query, top_k, **options)
+        else:
+            # Routers send the query embedding along with the query
+            embedding = data.get('embedding')
+            result = {'results': rag_pipeline.retrieve_relevant_chunks(
+                query, top_k, query_embedding=wire_format.decode_float32(embedding) if embedding else None, **options)}
+
+        return wire_format.payload_response({
+            'query': query,
+            **result,
+            'total_results': len(result['results']),
+            **response_timings()
+        }, wire_format.negotiate())
+
+    except Exception as e:
+        logger.error(f"Error in semantic search: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/sessions', methods=['POST'])
+def create_session():
+    """Start a conversation about a document stored in the RAG pipeline or passed as text"""
+    try:
+        data = request.get_json()
+        document_id = data.get('document_id')
+        text = data.get('text') or (rag_pipeline.get_document(document_id) if document_id else None)
+        model = data.get('model', 'llama3')
+
+        if not text:
+            return jsonify({'error': 'text or the document_id of an added document is required'}), 400
+
+        session = sessions.create(text, model, document_id)
+        return jsonify({**session.to_dict(), 'expires_after_idle_seconds': SESSION_TTL_SECONDS}), 201
+
+    except Exception as e:
+        logger.error(f"Error creating session: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/sessions/<session_id>/query', methods=['POST'])
+def session_query(session_id):
+    """Ask a question in a conversation; follow-ups reuse Ollama's context instead of resending the document"""
+    try:
+        data = request.get_json()
+        question = data.get('question', '')
+
+        if not question:
+            return jsonify({'error': 'Question is required'}), 400
+
+        session = sessions.get(session_id)
+        if session is None:
+            return jsonify({'error': f'Session {session_id} not found or expired'}), 404
+
+        result = ask_in_session(session, question)
+
+        return jsonify({
+            'session_id': session_id,
+            'answer': result['response'],
+            'confidence': result['confidence'],
+            'model': result['model'],
+            'method': result['method'],
+            'turn': result['turn'],
+            'reused_context': result['reused_context'],
+            **response_timings()
+        })
+
+    except Exception as e:
+        logger.error(f"Error in session query: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/sessions/<session_id>', methods=['DELETE'])
+def delete_session(session_id):
+    """End a conversation and release its state"""
+    if not sessions.delete(session_id):
+        return jsonify({'error': f'Session {session_id} not found or expired'}), 404
+    return jsonify({'message': 'Session deleted', 'session_id': session_id})
+
 @app.route('/api/generate-summary', methods=['POST'])
 def generate_document_summary():
     """Generate comprehensive document summary for download"""
@@ -757,18 +2008,18 @@ Please provide a detailed analysis in the following format:
 Please be thorough, accurate, and professional. Base your analysis ONLY on the actual document content."""
 
         # Get AI analysis using external API
-        provider = data.get('provider', DEFAULT_AI_PROVIDER)
-        logger.info(f"Generating summary with {provider} AI provider")
+        provider = data.get('provider')
+        logger.info(f"Generating summary with {provider or DEFAULT_AI_PROVIDER} AI provider")
 
         try:
-            ai_response = call_external_ai_api(provider, summary_prompt, document_text)
-            confidence = 0.85
-            method = f"{provider}_api"
+            ai_response, provider = call_external_ai_api(provider, summary_prompt, document_text)
+            confidence = 0.85 if provider != 'fallback' else 0.7
+            method = f"{provider}_api" if provider != 'fallback' else "fallback"
         except Exception as e:
             logger.warning(f"AI API failed, using fallback: {e}")
             ai_response = generate_fallback_response("generate comprehensive summary", document_text)
             confidence = 0.7
-            method = "fallback"
+            method = provider = "fallback"
 
         # Format the summary for download
         formatted_summary = f"""
@@ -806,6 +2057,25 @@ Report generated by Legal Document Analyzer AI System
         logger.error(f"Error generating document summary: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
-if __name__ == '__main__':
+startup_metrics['import_seconds'] = round(time.perf_counter() - _import_started, 3)
+if startup_metrics['import_seconds'] > COLD_START_BUDGET_SECONDS:
+    logger.warning(f"⚠️ Import took {startup_metrics['import_seconds']}s, "
+                   f"over the {COLD_START_BUDGET_SECONDS}s cold-start budget")
+
+def preload_workers():
+    """Load everything in the pre-fork master and move the RAG index into shared memory"""
     initialize_models()
-    app.run(host='0.0.0.0', port=5002, debug=True)
+    directory = SHARED_INDEX_DIR
+    if not directory:
+        directory = tempfile.mkdtemp(prefix='legal-ai-index-', dir='/dev/shm' if os.path.isdir('/dev/shm') else None)
+        # Workers leave with os._exit, so only the master removes it
+        atexit.register(shutil.rmtree, directory, ignore_errors=True)
+    rag_pipeline.share_index(directory)
+    logger.info(f"✅ Workers share the RAG index in {directory}")
+
+if __name__ == '__main__':
+    # SERVE_MODE=prefork loads everything once, then forks WEB_WORKERS workers
+    # The master catches up with the shared index before forking, so new workers do not replay it all.
+    # Sessions, the clause index and the provider limiters live in the worker, so only one is allowed
+    prefork.run(app, int(os.getenv('PORT', '5002')), preload=preload_workers, post_fork=start_worker,
+                start_dev_server=start_background_warmup, pre_fork=rag_pipeline.sync, max_workers=1)
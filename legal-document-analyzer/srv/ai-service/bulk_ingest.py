@@ -0,0 +1,183 @@
+"""Bulk-load a directory of contracts into the persistent RAG vector store.
+
+Text extraction and chunking run in a process pool; embedding and writes to
+the SQLite store happen in the main process in batches through
+RAGPipeline.index_chunks. Usage:
+
+    python bulk_ingest.py /data/contracts --store vector_store.db --workers 8
+"""
+import argparse
+import json
+import logging
+import os
+import resource
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, Dict, Iterator, List, Tuple
+
+from chunking import iter_stream_chunks
+from ingestion import iter_file_blocks
+
+logger = logging.getLogger('bulk_ingest')
+
+SUPPORTED_EXTENSIONS = ('.txt', '.md', '.pdf', '.docx')
+
+
+def iter_document_paths(root: str, extensions: Tuple[str, ...] = SUPPORTED_EXTENSIONS) -> Iterator[str]:
+    """Walk a directory tree for supported document files"""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if filename.lower().endswith(extensions):
+                yield os.path.join(dirpath, filename)
+
+
+def extract_document_chunks(path: str, root: str, max_words: int = 500,
+                            overlap_words: int = 50) -> Dict[str, Any]:
+    """Extract and chunk one document (runs in a worker process)"""
+    document_id = os.path.relpath(path, root).replace(os.sep, '/')
+    try:
+        chunks = [
+            (span.index, span.start, span.end, text)
+            for span, text in iter_stream_chunks(iter_file_blocks(path), max_words, overlap_words)
+        ]
+        return {'document_id': document_id, 'chunks': chunks, 'error': None}
+    except Exception as e:
+        return {'document_id': document_id, 'chunks': [], 'error': str(e)}
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process and its finished children"""
+    self_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # ru_maxrss is reported in kilobytes on Linux and bytes on macOS
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return max(self_rss, children_rss) / scale
+
+
+class IngestStats:
+    """Throughput counters for a bulk load"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.documents = 0
+        self.chunks = 0
+        self.skipped = 0
+        self.failed = 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        return {
+            'documents': self.documents,
+            'chunks': self.chunks,
+            'skipped': self.skipped,
+            'failed': self.failed,
+            'elapsed_seconds': round(elapsed, 3),
+            'docs_per_second': round(self.documents / elapsed, 2),
+            'chunks_per_second': round(self.chunks / elapsed, 2),
+            'peak_rss_mb': round(peak_rss_mb(), 1)
+        }
+
+
+def bulk_ingest(pipeline, root: str, workers: int = None, batch_size: int = 64,
+                skip_existing: bool = False, progress_every: int = 100,
+                max_words: int = 500, overlap_words: int = 50) -> Dict[str, Any]:
+    """Load every supported document under root into the pipeline's store"""
+    workers = workers or os.cpu_count() or 1
+    stats = IngestStats()
+    batch: List[Dict[str, Any]] = []
+    batch_texts: List[str] = []
+
+    def flush():
+        nonlocal batch, batch_texts
+        if batch:
+            pipeline.index_chunks(batch, batch_texts)
+            batch, batch_texts = [], []
+
+    def handle(result: Dict[str, Any]):
+        if result['error']:
+            stats.failed += 1
+            logger.warning(f"Failed to extract {result['document_id']}: {result['error']}")
+            return
+
+        for chunk_index, start, end, text in result['chunks']:
+            batch.append({
+                'document_id': result['document_id'],
+                'chunk_id': f"{result['document_id']}_{chunk_index}",
+                'chunk_index': chunk_index,
+                'start_offset': start,
+                'end_offset': end
+            })
+            batch_texts.append(text)
+            if len(batch) >= batch_size:
+                flush()
+
+        stats.documents += 1
+        stats.chunks += len(result['chunks'])
+        if progress_every and stats.documents % progress_every == 0:
+            logger.info(f"Progress: {json.dumps(stats.snapshot())}")
+
+    paths = iter_document_paths(root)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Keep a bounded number of documents in flight so extraction cannot
+        # run arbitrarily far ahead of embedding
+        pending = set()
+        max_pending = workers * 4
+
+        for path in paths:
+            document_id = os.path.relpath(path, root).replace(os.sep, '/')
+            if skip_existing and pipeline.store is not None and pipeline.store.has_document(document_id):
+                stats.skipped += 1
+                continue
+
+            pending.add(executor.submit(extract_document_chunks, path, root, max_words, overlap_words))
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    handle(future.result())
+
+        for future in wait(pending).done:
+            handle(future.result())
+
+    flush()
+    return stats.snapshot()
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description='Bulk-load legal documents into the RAG vector store')
+    parser.add_argument('directory', help='Directory to scan for .txt, .md, .pdf and .docx files')
+    parser.add_argument('--store', default=os.getenv('VECTOR_STORE_PATH', 'vector_store.db'),
+                        help='SQLite vector store path (default: $VECTOR_STORE_PATH or vector_store.db)')
+    parser.add_argument('--workers', type=int, default=None, help='Extraction processes (default: CPU count)')
+    parser.add_argument('--batch-size', type=int, default=64, help='Chunks per embedding batch')
+    parser.add_argument('--skip-existing', action='store_true', help='Skip documents already in the store')
+    parser.add_argument('--progress-every', type=int, default=100, help='Log progress every N documents')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+
+    if not os.path.isdir(args.directory):
+        parser.error(f"Not a directory: {args.directory}")
+
+    # Imported here so extraction workers do not load the Flask app or models
+    from app import RAGPipeline, get_embedding_model
+    from vector_store import SQLiteVectorStore
+
+    get_embedding_model()
+    store = SQLiteVectorStore(args.store)
+    pipeline = RAGPipeline(store=store, in_memory=False)
+
+    try:
+        summary = bulk_ingest(pipeline, args.directory, workers=args.workers,
+                              batch_size=args.batch_size, skip_existing=args.skip_existing,
+                              progress_every=args.progress_every)
+    finally:
+        store.close()
+
+    print(json.dumps(summary, indent=2))
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
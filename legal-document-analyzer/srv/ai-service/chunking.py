@@ -0,0 +1,119 @@
+"""Structure-aware chunking of legal documents into character spans.
+
+Chunks are yielded as ``(start, end)`` offsets into the original text instead
+of re-joined word lists, so callers only materialize ``text[start:end]`` when
+they actually need the chunk text and every retrieval hit maps back to an
+exact character range of the source document.
+"""
+import re
+from typing import Iterable, Iterator, List, NamedTuple, Tuple
+
+# Same heading rule as LegalClauseExtractor._analyze_structure
+SECTION_PATTERN = re.compile(r'^\s*\d+\.?\s+[A-Z]', re.MULTILINE)
+WORD_PATTERN = re.compile(r'\S+')
+SENTENCE_END_PATTERN = re.compile(r'[.!?]+["\')\]]*$')
+
+# Boundary strengths, recorded for the gap before each word
+NONE, SENTENCE, PARAGRAPH, SECTION = range(4)
+
+
+class ChunkSpan(NamedTuple):
+    """A chunk of a document expressed as character offsets"""
+    index: int
+    start: int
+    end: int
+
+
+def iter_chunk_spans(text: str, max_words: int = 500, overlap_words: int = 50,
+                     min_words: int = None) -> Iterator[ChunkSpan]:
+    """Yield chunk spans that end on section, paragraph or sentence boundaries.
+
+    Words are packed into a chunk until it holds ``max_words``; the chunk is
+    then cut at the strongest boundary past ``min_words`` (a numbered section
+    heading, then a paragraph break, then a sentence end), preferring the
+    latest one of that strength. Only when no boundary exists is a chunk cut
+    mid-sentence, and only then do the last ``overlap_words`` words carry over
+    into the next chunk.
+    """
+    if min_words is None:
+        min_words = max_words // 2
+    min_words = max(1, min(min_words, max_words))
+    overlap_words = max(0, min(overlap_words, max_words - 1))
+
+    sections = (m.start() for m in SECTION_PATTERN.finditer(text))
+    next_section = next(sections, None)
+
+    # Words of the current chunk as (start, end, boundary strength before the word)
+    words: List[tuple] = []
+    fresh = 0  # words not already emitted as part of an overlap
+    index = 0
+    prev_end = 0
+    prev_sentence_end = False
+
+    def best_cut() -> int:
+        cut, strength = 0, 0
+        for i in range(min_words, len(words)):
+            if words[i][2] and words[i][2] >= strength:
+                cut, strength = i, words[i][2]
+        return cut
+
+    for match in WORD_PATTERN.finditer(text):
+        start, end = match.span()
+
+        boundary = SENTENCE if prev_sentence_end else NONE
+        if text.count('\n', prev_end, start) >= 2:
+            boundary = PARAGRAPH
+        while next_section is not None and next_section <= start:
+            boundary = SECTION
+            next_section = next(sections, None)
+        prev_end = end
+        prev_sentence_end = SENTENCE_END_PATTERN.search(match.group()) is not None
+
+        words.append((start, end, boundary))
+        fresh += 1
+
+        if len(words) > max_words:
+            # The newest word is only kept to know the boundary after the last full word
+            cut = best_cut() or max_words
+            yield ChunkSpan(index, words[0][0], words[cut - 1][1])
+            index += 1
+            if words[cut][2]:
+                words = words[cut:]
+                fresh = len(words)
+            else:
+                words = words[max_words - overlap_words:]
+                fresh = 1
+
+    if words and fresh:
+        yield ChunkSpan(index, words[0][0], words[-1][1])
+
+
+def iter_stream_chunks(blocks: Iterable[str], max_words: int = 500, overlap_words: int = 50,
+                       min_words: int = None, buffer_chars: int = 65536) -> Iterator[Tuple[ChunkSpan, str]]:
+    """Chunk a document that arrives as a stream of text blocks.
+
+    Only about ``buffer_chars`` characters plus the still-open chunk are held
+    at once. Spans carry offsets into the full (never materialized) document,
+    so each one is yielded together with its text.
+    """
+    buffer = ''
+    base = 0  # document offset of buffer[0]
+    index = 0
+
+    for block in blocks:
+        buffer += block
+        if len(buffer) < buffer_chars:
+            continue
+
+        spans = list(iter_chunk_spans(buffer, max_words, overlap_words, min_words))
+        # The last span may still grow with the next block, so it stays buffered
+        for span in spans[:-1]:
+            yield ChunkSpan(index, base + span.start, base + span.end), buffer[span.start:span.end]
+            index += 1
+        keep_from = spans[-1].start if spans else len(buffer)
+        buffer = buffer[keep_from:]
+        base += keep_from
+
+    for span in iter_chunk_spans(buffer, max_words, overlap_words, min_words):
+        yield ChunkSpan(index, base + span.start, base + span.end), buffer[span.start:span.end]
+        index += 1
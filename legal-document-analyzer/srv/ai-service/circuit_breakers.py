@@ -0,0 +1,156 @@
+"""Per-backend circuit breakers so dead model backends fail fast.
+
+A breaker is ``closed`` while its backend works. After ``failure_threshold``
+consecutive failures it ``open``s: calls are refused immediately with
+``CircuitOpenError`` and callers move on to the next backend instead of
+waiting for a connect or read timeout. Once ``reset_timeout`` seconds have
+passed the breaker is ``half_open`` and lets a single trial call through,
+whose outcome closes or re-opens it. Backends with a cheap health check can
+also be probed in the background (``probe_open_breakers``), so they close
+again without a user request paying for the trial.
+"""
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple, Type
+
+logger = logging.getLogger(__name__)
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """The backend's breaker is open, so the call was not attempted"""
+
+
+class CircuitBreaker:
+    """Closed / open / half-open breaker guarding one backend"""
+
+    def __init__(self, name: str, failure_threshold: int = 3, reset_timeout: float = 30.0,
+                 probe: Optional[Callable[[], bool]] = None,
+                 excluded_exceptions: Tuple[Type[BaseException], ...] = (),
+                 clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.probe = probe
+        # Errors that say nothing about the backend's health (e.g. rate limiting)
+        self.excluded_exceptions = excluded_exceptions
+        self.clock = clock
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.last_error = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Whether a call may be attempted now (claims the trial when half-open)"""
+        with self._lock:
+            if self.state == OPEN and self.clock() - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != CLOSED:
+                logger.info(f"🟢 Circuit for {self.name} closed")
+            self.state = CLOSED
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self, error: BaseException = None):
+        with self._lock:
+            self.failures += 1
+            self.last_error = str(error) if error is not None else None
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    logger.warning(f"🔴 Circuit for {self.name} opened after {self.failures} failures: {error}")
+                self.state = OPEN
+                self.opened_at = self.clock()
+                self._trial_in_flight = False
+
+    def trip(self, error: BaseException = None):
+        """Open the breaker right away, e.g. when a backend cannot be reached at all"""
+        with self._lock:
+            self.failures = max(self.failures + 1, self.failure_threshold)
+            self.last_error = str(error) if error is not None else None
+            if self.state != OPEN:
+                logger.warning(f"🔴 Circuit for {self.name} opened: {error}")
+            self.state = OPEN
+            self.opened_at = self.clock()
+            self._trial_in_flight = False
+
+    def call(self, fn: Callable[[], Any]) -> Any:
+        """Run fn through the breaker; raises CircuitOpenError without calling it when open"""
+        if not self.allow():
+            raise CircuitOpenError(f"Circuit for {self.name} is open")
+        try:
+            result = fn()
+        except self.excluded_exceptions:
+            self._release_trial()
+            raise
+        except Exception as e:
+            self.record_failure(e)
+            raise
+        self.record_success()
+        return result
+
+    def _release_trial(self):
+        with self._lock:
+            self._trial_in_flight = False
+
+    def run_probe(self) -> bool:
+        """Health-check an open breaker whose reset timeout has passed"""
+        if self.probe is None or not self.allow():
+            return False
+        try:
+            healthy = bool(self.probe())
+        except Exception as e:
+            healthy = False
+            error = e
+        else:
+            error = None if healthy else RuntimeError('health probe failed')
+        if healthy:
+            self.record_success()
+        else:
+            self.record_failure(error)
+        return healthy
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            snapshot = {'state': self.state, 'consecutive_failures': self.failures}
+            if self.state == OPEN:
+                snapshot['retry_in_seconds'] = round(max(0.0, self.opened_at + self.reset_timeout - self.clock()), 3)
+            if self.last_error and self.state != CLOSED:
+                snapshot['last_error'] = self.last_error
+            return snapshot
+
+
+def probe_open_breakers(breakers: Iterable[CircuitBreaker]):
+    """Run the health probe of every breaker that is open and due for a trial"""
+    for breaker in breakers:
+        if breaker.state != CLOSED and breaker.probe is not None:
+            breaker.run_probe()
+
+
+def start_health_probes(breakers: Callable[[], Iterable[CircuitBreaker]], interval: float = 5.0) -> threading.Thread:
+    """Probe open breakers every ``interval`` seconds on a daemon thread"""
+    def loop():
+        while True:
+            time.sleep(interval)
+            try:
+                probe_open_breakers(breakers())
+            except Exception as e:
+                logger.error(f"Circuit breaker probing failed: {e}")
+
+    thread = threading.Thread(target=loop, name='breaker-probes', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,161 @@
+"""Clause-level vector index for cross-document clause similarity search.
+
+Clauses found by the extractors are embedded once at extraction time (when
+``/api/extract-clauses`` is called with ``index_clauses``) and kept in an ``EmbeddingIndex`` alongside per-``clause_type`` row lists, so a
+"find similar clauses" query only scores clauses of the requested type
+(filtered k-NN) instead of the whole corpus. An optional persistent store
+(``vector_store.SQLiteVectorStore``) plays the role of the HANA table
+LEGAL_DOCUMENT_ANALYZER_CLAUSE_EMBEDDINGS.
+"""
+import threading
+from collections.abc import Mapping
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from embedding_index import EmbeddingIndex
+
+
+class ClauseIndex:
+    """Embedded clauses of all documents, searchable by clause type"""
+
+    def __init__(self, embed: Callable[[List[str]], Any], store=None, storage: str = 'float32'):
+        # embed maps a list of clause texts to one embedding per text
+        self.embed = embed
+        self.store = store
+        self.index = EmbeddingIndex(storage)
+        # Row i of the index belongs to clauses[i]
+        self.clauses: List[Dict[str, Any]] = []
+        self.type_rows: Dict[str, List[int]] = {}
+        self.document_rows: Dict[str, List[int]] = {}
+        self.clause_rows: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.clause_rows)
+
+    def index_document(self, document_id: str, clauses: List[Mapping]) -> List[str]:
+        """Embed a document's clauses, replacing any indexed earlier, and return their ids"""
+        records = [{
+            'clause_id': f"{document_id}_clause_{i}",
+            'document_id': document_id,
+            'type': clause['type'],
+            'content': clause['content'],
+            'confidence': clause['confidence'],
+            'start_position': clause['start_position'],
+            'end_position': clause['end_position']
+        } for i, clause in enumerate(clauses)]
+
+        embeddings = np.asarray(self.embed([record['content'] for record in records]), dtype=np.float32)
+        if records:
+            # Unit vectors so dot-product scores are cosine similarities
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            embeddings /= np.where(norms > 0, norms, 1.0)
+
+        if self.store is not None:
+            self.store.replace_document_clauses(document_id, [
+                dict(record, embedding=embedding) for record, embedding in zip(records, embeddings)
+            ])
+
+        self._remove(document_id)
+        if records:
+            self._append(records, embeddings)
+        return [record['clause_id'] for record in records]
+
+    def remove_document(self, document_id: str):
+        """Drop a document's clauses from the index and the store"""
+        self._remove(document_id)
+        if self.store is not None:
+            self.store.delete_document_clauses(document_id)
+
+    def _remove(self, document_id: str):
+        with self._lock:
+            rows = self.document_rows.pop(document_id, [])
+            if not rows:
+                return
+            removed = set(rows)
+            for clause_type in {self.clauses[row]['type'] for row in rows}:
+                self.type_rows[clause_type] = [r for r in self.type_rows[clause_type] if r not in removed]
+            for row in rows:
+                self.clause_rows.pop(self.clauses[row]['clause_id'], None)
+            self.index.delete(rows)
+
+    def _append(self, records: List[Dict[str, Any]], embeddings: np.ndarray):
+        with self._lock:
+            first_row = self.index.add(embeddings)
+            self.clauses.extend(records)
+            for row, record in enumerate(records, start=first_row):
+                self.type_rows.setdefault(record['type'], []).append(row)
+                self.document_rows.setdefault(record['document_id'], []).append(row)
+                self.clause_rows[record['clause_id']] = row
+
+    def load_from_store(self, batch_size: int = 1000) -> int:
+        """Populate the index from the persistent store"""
+        if self.store is None:
+            return 0
+
+        loaded = 0
+        records, embeddings = [], []
+        for record in self.store.iter_clauses(batch_size):
+            embeddings.append(record.pop('embedding'))
+            records.append(record)
+            if len(records) >= batch_size:
+                self._append(records, np.stack(embeddings))
+                loaded += len(records)
+                records, embeddings = [], []
+        if records:
+            self._append(records, np.stack(embeddings))
+            loaded += len(records)
+        return loaded
+
+    def get(self, clause_id: str) -> Optional[Dict[str, Any]]:
+        row = self.clause_rows.get(clause_id)
+        return self.clauses[row] if row is not None else None
+
+    def search(self, query_embedding, top_k: int = 10, clause_type: str = None,
+               exclude_document_id: str = None, min_similarity: float = None,
+               exclude_clause_id: str = None) -> List[Dict[str, Any]]:
+        """k nearest clauses by cosine similarity, optionally of one type only"""
+        with self._lock:
+            if clause_type is not None:
+                rows = np.asarray(self.type_rows.get(clause_type, []), dtype=np.int64)
+            else:
+                rows = None
+            excluded = list(self.document_rows.get(exclude_document_id, [])) if exclude_document_id else []
+            if exclude_clause_id in self.clause_rows:
+                excluded.append(self.clause_rows[exclude_clause_id])
+
+        if rows is not None and not len(rows):
+            return []
+        if excluded:
+            if rows is None:
+                rows = np.arange(len(self.clauses), dtype=np.int64)
+            rows = rows[~np.isin(rows, excluded)]
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm > 0:
+            query = query / norm
+
+        found_rows, scores = self.index.search(query, top_k, rows=rows)
+        results = []
+        for row, score in zip(found_rows, scores):
+            if min_similarity is not None and score < min_similarity:
+                break
+            results.append(dict(self.clauses[row], similarity=float(score)))
+        return results
+
+    def similar_to(self, clause_id: str, top_k: int = 10, clause_type: str = None,
+                   include_same_document: bool = False, min_similarity: float = None) -> List[Dict[str, Any]]:
+        """Clauses most similar to an indexed clause, of its own type unless clause_type is given"""
+        row = self.clause_rows.get(clause_id)
+        if row is None:
+            raise KeyError(clause_id)
+        clause = self.clauses[row]
+        return self.search(
+            self.index.vectors([row])[0], top_k,
+            clause_type=clause_type or clause['type'],
+            exclude_document_id=None if include_same_document else clause['document_id'],
+            min_similarity=min_similarity,
+            exclude_clause_id=clause_id
+        )
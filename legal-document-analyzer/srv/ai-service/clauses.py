@@ -0,0 +1,131 @@
+"""Compact clause match records for the pattern-based clause extractors.
+
+Regex hits are kept as offset records into the source text instead of
+eagerly sliced context strings. Overlapping context windows of the same
+clause type are merged first, and each record only materializes its
+``content`` when it is read or serialized, so documents with thousands of
+hits no longer allocate a 400-character copy per match.
+"""
+import re
+from collections.abc import Mapping
+from typing import Dict, List, Optional, Tuple
+
+# Characters of context kept on each side of a match
+CONTEXT_CHARS = 200
+
+# Longest gap allowed between the keywords of one pattern. Unbounded lazy
+# gaps (``.*?`` with DOTALL) rescan to the end of the document for every
+# keyword without a partner, which makes extraction quadratic
+MAX_KEYWORD_GAP = 300
+
+LEADING_LITERAL = re.compile(r'^[a-z][a-z -]*')
+LEADING_ALTERNATION = re.compile(r'^\(\?:([a-z |-]+)\)')
+
+ClausePatterns = Dict[str, List[Tuple[re.Pattern, Optional[Tuple[str, ...]]]]]
+
+
+def compile_clause_patterns(patterns: Dict[str, List[str]], max_gap: int = MAX_KEYWORD_GAP) -> ClausePatterns:
+    """Compile clause regexes with bounded gaps and their required leading keywords"""
+    compiled = {}
+    for clause_type, type_patterns in patterns.items():
+        compiled[clause_type] = [
+            (re.compile(pattern.replace('.*?', f'.{{0,{max_gap}}}?'), re.IGNORECASE | re.DOTALL),
+             _leading_keywords(pattern))
+            for pattern in type_patterns
+        ]
+    return compiled
+
+
+def _leading_keywords(pattern: str) -> Optional[Tuple[str, ...]]:
+    """Literal text every match must start with (any one of them), if known"""
+    alternation = LEADING_ALTERNATION.match(pattern)
+    if alternation:
+        return tuple(alternation.group(1).split('|'))
+    literal = LEADING_LITERAL.match(pattern)
+    return (literal.group(),) if literal else None
+
+
+class ClauseRecord(Mapping):
+    """Offset record of one clause; reads like the former clause dict"""
+
+    __slots__ = ('type', 'start', 'end', 'context_start', 'context_end', 'confidence', '_text')
+
+    KEYS = ('type', 'title', 'content', 'confidence', 'start_position', 'end_position')
+    TITLES: Dict[str, str] = {}
+
+    def __init__(self, clause_type: str, start: int, end: int, context_start: int, context_end: int,
+                 confidence: float, text: str):
+        self.type = clause_type
+        self.start = start
+        self.end = end
+        self.context_start = context_start
+        self.context_end = context_end
+        self.confidence = confidence
+        self._text = text
+
+    @property
+    def title(self) -> str:
+        title = self.TITLES.get(self.type)
+        if title is None:
+            title = self.TITLES[self.type] = f"{self.type.replace('_', ' ').title()} Clause"
+        return title
+
+    @property
+    def content(self) -> str:
+        return self._text[self.context_start:self.context_end].strip()
+
+    def __getitem__(self, key):
+        if key == 'type':
+            return self.type
+        if key == 'title':
+            return self.title
+        if key == 'content':
+            return self.content
+        if key == 'confidence':
+            return self.confidence
+        if key == 'start_position':
+            return self.start
+        if key == 'end_position':
+            return self.end
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self.KEYS)
+
+    def __len__(self) -> int:
+        return len(self.KEYS)
+
+    def to_dict(self) -> Dict:
+        return {key: self[key] for key in self.KEYS}
+
+    def __repr__(self) -> str:
+        return f"ClauseRecord({self.type!r}, {self.start}, {self.end})"
+
+
+def find_clauses(text: str, patterns: ClausePatterns, confidence: float = 0.8,
+                 context_chars: int = CONTEXT_CHARS) -> List[ClauseRecord]:
+    """Match every clause pattern and merge overlapping context windows per type"""
+    lowered = text.lower()
+    records = []
+
+    for clause_type, type_patterns in patterns.items():
+        windows = []
+        for regex, keywords in type_patterns:
+            # Skip the regex scan entirely when its leading keyword never occurs
+            if keywords and not any(keyword in lowered for keyword in keywords):
+                continue
+            for match in regex.finditer(text):
+                start, end = match.span()
+                windows.append((max(0, start - context_chars), min(len(text), end + context_chars), start, end))
+
+        windows.sort()
+        current = None
+        for context_start, context_end, start, end in windows:
+            if current is not None and context_start <= current.context_end:
+                current.context_end = max(current.context_end, context_end)
+                current.end = max(current.end, end)
+                continue
+            current = ClauseRecord(clause_type, start, end, context_start, context_end, confidence, text)
+            records.append(current)
+
+    return records
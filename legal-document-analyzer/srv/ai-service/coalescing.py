@@ -0,0 +1,81 @@
+"""Singleflight coalescing of identical in-flight calls.
+
+When a shared contract is opened by a team, the same question or summary
+request arrives many times within seconds. ``SingleFlight.do`` lets the
+first caller for a key (the leader) run the call while concurrent callers
+with the same key wait for it and share its result or exception. Nothing is
+cached: once the leader finishes, the next call with that key runs again.
+"""
+import hashlib
+import re
+import threading
+from typing import Any, Callable, Dict
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def request_key(*parts: Any, normalize: bool = True) -> str:
+    """Hash of the call's parts; whitespace runs are collapsed when normalizing"""
+    digest = hashlib.sha256()
+    for part in parts:
+        text = '' if part is None else str(part)
+        if normalize:
+            text = _WHITESPACE.sub(' ', text).strip()
+        digest.update(text.encode('utf-8', 'surrogatepass'))
+        digest.update(b'\x00')
+    return digest.hexdigest()
+
+
+class _Flight:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Runs one call per key at a time and hands its outcome to every concurrent caller"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.stats = {'calls': 0, 'coalesced': 0}
+        self._flights: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """Result of fn, or of the identical call already in flight.
+
+        Followers receive the very object the leader returned, so callers
+        that mutate results must copy them.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.stats['calls'] += 1
+            else:
+                self.stats['coalesced'] += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = fn()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'in_flight': len(self._flights), **self.stats}
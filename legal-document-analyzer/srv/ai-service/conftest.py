@@ -0,0 +1,19 @@
+import pytest
+
+from benchmark import HashingEmbedder
+
+
+@pytest.fixture
+def embedder():
+    return HashingEmbedder()
+
+
+@pytest.fixture
+def hashed_embeddings(monkeypatch, embedder):
+    """Replace app's embedding functions with the hashing embedder; returns the texts embedded in batches"""
+    import app
+
+    embedded = []
+    monkeypatch.setattr(app, 'generate_embeddings_batch', lambda texts: embedded.extend(texts) or embedder.encode(texts))
+    monkeypatch.setattr(app, 'generate_embeddings', embedder.encode)
+    return embedded
@@ -0,0 +1,190 @@
+"""Compact in-memory embedding matrix with optional quantized storage.
+
+Replaces per-chunk Python lists of floats (~12 KB per 384-dim vector) with one
+growable numpy matrix stored as float32 (1.5 KB/vector), float16 (768 B) or
+scalar-quantized int8 with a per-vector scale (388 B). Quantized indexes score
+candidates with a blockwise kernel over the compact codes and can rescore the
+best candidates with full-precision vectors supplied by the caller.
+"""
+import threading
+from typing import Callable, Optional, Tuple
+
+import numpy as np
+
+STORAGE_DTYPES = {
+    'float32': np.float32,
+    'float16': np.float16,
+    'int8': np.int8
+}
+
+# Rows scored per kernel step; bounds the temporary float32 copy of quantized codes
+SCORE_BLOCK_ROWS = 16384
+
+
+def quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-vector int8 quantization: vector ~= codes * scale"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    safe_scales = np.where(scales > 0, scales, 1.0)
+    codes = np.clip(np.rint(vectors / safe_scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+class EmbeddingIndex:
+    """Append-only embedding matrix searched by dot product"""
+
+    def __init__(self, storage: str = 'float32', rescore_factor: int = 4, initial_capacity: int = 1024):
+        if storage not in STORAGE_DTYPES:
+            raise ValueError(f"Unsupported embedding storage: {storage}")
+
+        self.storage = storage
+        self.rescore_factor = max(1, rescore_factor)
+        self.dim = None
+        self._initial_capacity = initial_capacity
+        self._data = None
+        self._scales = None
+        # Tombstones of rows removed by delete(); allocated on first use
+        self._deleted = None
+        self._deleted_count = 0
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def quantized(self) -> bool:
+        return self.storage != 'float32'
+
+    @property
+    def deleted_count(self) -> int:
+        return self._deleted_count
+
+    def add(self, vectors) -> int:
+        """Append vectors and return the row of the first one"""
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Expected {self.dim}-dim embeddings, got {vectors.shape[1]}")
+
+            start = self._size
+            self._reserve(start + len(vectors))
+
+            if self.storage == 'int8':
+                codes, scales = quantize_int8(vectors)
+                self._data[start:start + len(vectors)] = codes
+                self._scales[start:start + len(vectors)] = scales
+            else:
+                self._data[start:start + len(vectors)] = vectors
+            self._size = start + len(vectors)
+
+        return start
+
+    def _reserve(self, needed: int):
+        """Grow the backing arrays geometrically"""
+        capacity = 0 if self._data is None else len(self._data)
+        if needed <= capacity:
+            return
+
+        new_capacity = max(needed, capacity * 2, self._initial_capacity)
+        data = np.zeros((new_capacity, self.dim), dtype=STORAGE_DTYPES[self.storage])
+        scales = np.zeros(new_capacity, dtype=np.float32) if self.storage == 'int8' else None
+        deleted = np.zeros(new_capacity, dtype=bool) if self._deleted is not None else None
+        if capacity:
+            data[:self._size] = self._data[:self._size]
+            if scales is not None:
+                scales[:self._size] = self._scales[:self._size]
+            if deleted is not None:
+                deleted[:self._size] = self._deleted[:self._size]
+        self._data, self._scales, self._deleted = data, scales, deleted
+
+    def delete(self, rows):
+        """Exclude rows from all future searches (their storage is not reclaimed)"""
+        rows = np.asarray(rows, dtype=np.int64)
+        if not len(rows):
+            return
+        with self._lock:
+            if self._deleted is None:
+                self._deleted = np.zeros(len(self._data), dtype=bool)
+            self._deleted_count += int(np.count_nonzero(~self._deleted[rows]))
+            self._deleted[rows] = True
+
+    def vectors(self, rows) -> np.ndarray:
+        """Return (dequantized) float32 vectors for the given rows"""
+        rows = np.asarray(rows, dtype=np.int64)
+        vectors = self._data[rows].astype(np.float32)
+        if self.storage == 'int8':
+            vectors *= self._scales[rows][:, None]
+        return vectors
+
+    def scores(self, query, rows=None) -> np.ndarray:
+        """Dot-product scores of the query against all (or the given) rows"""
+        query = np.asarray(query, dtype=np.float32)
+        # Snapshot so concurrent appends (which may reallocate) don't affect this search
+        data, scales, deleted, size = self._data, self._scales, self._deleted, self._size
+
+        if rows is not None:
+            rows = np.asarray(rows, dtype=np.int64)
+            total = len(rows)
+        else:
+            total = size
+
+        out = np.empty(total, dtype=np.float32)
+        for start in range(0, total, SCORE_BLOCK_ROWS):
+            stop = min(start + SCORE_BLOCK_ROWS, total)
+            if rows is None:
+                block = data[start:stop]
+                block_scales = scales[start:stop] if scales is not None else None
+            else:
+                block = data[rows[start:stop]]
+                block_scales = scales[rows[start:stop]] if scales is not None else None
+
+            if block.dtype == np.float32:
+                out[start:stop] = block @ query
+            else:
+                out[start:stop] = block.astype(np.float32) @ query
+            if block_scales is not None:
+                out[start:stop] *= block_scales
+
+        if deleted is not None:
+            out[deleted[:size] if rows is None else deleted[rows]] = -np.inf
+        return out
+
+    def search(self, query, top_k: int, rows=None,
+               rescore: Optional[Callable[[np.ndarray], Optional[np.ndarray]]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (rows, scores) of the top_k rows by dot product, best first.
+
+        For quantized storage, ``rescore`` maps candidate rows to their
+        full-precision vectors; the best ``top_k * rescore_factor`` candidates
+        from the quantized kernel are then re-ranked with exact scores.
+        """
+        query = np.asarray(query, dtype=np.float32)
+        scores = self.scores(query, rows)
+        if not len(scores) or top_k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        use_rescore = rescore is not None and self.quantized
+        k = min(len(scores), top_k * self.rescore_factor if use_rescore else top_k)
+        candidates = np.argpartition(-scores, k - 1)[:k]
+        # Deleted rows score -inf and only surface when fewer than k rows are live
+        candidates = candidates[np.isfinite(scores[candidates])]
+        candidate_rows = np.asarray(rows, dtype=np.int64)[candidates] if rows is not None else candidates
+        candidate_scores = scores[candidates]
+
+        if use_rescore and len(candidate_rows):
+            full_precision = rescore(candidate_rows)
+            if full_precision is not None:
+                candidate_scores = np.asarray(full_precision, dtype=np.float32) @ query
+
+        order = np.argsort(-candidate_scores, kind='stable')[:top_k]
+        return candidate_rows[order], candidate_scores[order]
+
+    def memory_bytes(self) -> int:
+        """Bytes used by the stored rows (excluding spare capacity)"""
+        if self._data is None:
+            return 0
+        per_row = self._data.itemsize * self.dim + (4 if self._scales is not None else 0)
+        return per_row * self._size
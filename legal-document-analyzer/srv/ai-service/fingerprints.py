@@ -0,0 +1,117 @@
+"""SimHash fingerprints for near-duplicate detection of templated contracts.
+
+A 64-bit SimHash over word shingles changes in only a few bits when a
+document changes in a few places, so documents (and chunks) differing by a
+party name or a date are within a small Hamming distance of each other.
+``SimHashIndex`` finds such neighbours without a full scan: the fingerprint
+is split into bands and, by the pigeonhole principle, two fingerprints within
+``bands - 1`` bits share at least one band exactly.
+"""
+import hashlib
+import re
+from collections import defaultdict
+from typing import Dict, Hashable, List, Set, Tuple
+
+import numpy as np
+
+FINGERPRINT_BITS = 64
+SHINGLE_WORDS = 3
+# Fingerprints at most this many bits apart are treated as near-duplicates
+NEAR_DUPLICATE_DISTANCE = 3
+
+WORD_PATTERN = re.compile(r'\w+')
+
+# Odd 64-bit multipliers combining the word hashes of a shingle
+SHINGLE_MULTIPLIERS = (0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9)
+
+
+def _mix(values: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer, so every bit of a shingle hash is well mixed"""
+    values = values ^ (values >> np.uint64(30))
+    values = values * np.uint64(0xBF58476D1CE4E5B9)
+    values = values ^ (values >> np.uint64(27))
+    values = values * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+
+def _feature_hashes(text: str, shingle_words: int) -> np.ndarray:
+    """Stable 64-bit hash of every word shingle of the text"""
+    words = WORD_PATTERN.findall(text.lower())
+    if not words:
+        return np.empty(0, dtype=np.uint64)
+    # Hash each distinct word once, then combine word hashes per shingle with numpy
+    vocabulary, positions = np.unique(np.asarray(words), return_inverse=True)
+    word_hashes = np.frombuffer(b''.join(
+        hashlib.blake2b(word.encode('utf-8'), digest_size=8).digest() for word in vocabulary
+    ), dtype='<u8')[positions]
+
+    width = min(shingle_words, len(word_hashes))
+    count = len(word_hashes) - width + 1
+    combined = np.zeros(count, dtype=np.uint64)
+    for offset in range(width):
+        multiplier = np.uint64(SHINGLE_MULTIPLIERS[offset % len(SHINGLE_MULTIPLIERS)])
+        combined = combined * multiplier + word_hashes[offset:offset + count]
+    return _mix(combined)
+
+
+def simhash(text: str, shingle_words: int = SHINGLE_WORDS) -> int:
+    """64-bit SimHash of the text's word shingles (0 for text without words)"""
+    hashes = _feature_hashes(text, shingle_words)
+    if not len(hashes):
+        return 0
+    # One row of bits per feature, most significant bit first
+    bits = np.unpackbits(hashes.astype('>u8').view(np.uint8).reshape(-1, 8), axis=1)
+    weights = 2 * bits.sum(axis=0, dtype=np.int64) - len(hashes)
+    return int(''.join('1' if weight > 0 else '0' for weight in weights), 2)
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+
+class SimHashIndex:
+    """Banded lookup of fingerprints within a small Hamming distance"""
+
+    def __init__(self, max_distance: int = NEAR_DUPLICATE_DISTANCE):
+        self.max_distance = max_distance
+        self.bands = max_distance + 1
+        self.band_bits = FINGERPRINT_BITS // self.bands
+        self.fingerprints: Dict[Hashable, int] = {}
+        self._buckets: Dict[Tuple[int, int], Set[Hashable]] = defaultdict(set)
+
+    def __len__(self) -> int:
+        return len(self.fingerprints)
+
+    def _band_keys(self, fingerprint: int) -> List[Tuple[int, int]]:
+        mask = (1 << self.band_bits) - 1
+        return [(band, (fingerprint >> (band * self.band_bits)) & mask) for band in range(self.bands)]
+
+    def add(self, key: Hashable, fingerprint: int):
+        self.remove(key)
+        self.fingerprints[key] = fingerprint
+        for band_key in self._band_keys(fingerprint):
+            self._buckets[band_key].add(key)
+
+    def remove(self, key: Hashable):
+        fingerprint = self.fingerprints.pop(key, None)
+        if fingerprint is None:
+            return
+        for band_key in self._band_keys(fingerprint):
+            bucket = self._buckets[band_key]
+            bucket.discard(key)
+            if not bucket:
+                del self._buckets[band_key]
+
+    def query(self, fingerprint: int, exclude: Hashable = None) -> List[Tuple[Hashable, int]]:
+        """(key, distance) of indexed fingerprints within max_distance, closest first"""
+        candidates = set()
+        for band_key in self._band_keys(fingerprint):
+            candidates |= self._buckets.get(band_key, set())
+        candidates.discard(exclude)
+
+        matches = []
+        for key in candidates:
+            distance = hamming_distance(fingerprint, self.fingerprints[key])
+            if distance <= self.max_distance:
+                matches.append((key, distance))
+        return sorted(matches, key=lambda match: (match[1], str(match[0])))
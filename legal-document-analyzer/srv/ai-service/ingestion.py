@@ -0,0 +1,147 @@
+"""Incremental readers for streamed document uploads.
+
+Each reader turns an upload body (a binary file-like object such as Flask's
+``request.stream``) into a lazy sequence of text blocks, so documents can be
+chunked and embedded while they are still arriving instead of being held as
+one JSON string.
+"""
+import codecs
+import importlib.util
+import json
+import logging
+import shutil
+import tempfile
+from typing import IO, Dict, Iterator, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Optional document format dependencies, imported on first use
+PDF_AVAILABLE = importlib.util.find_spec('PyPDF2') is not None
+if not PDF_AVAILABLE:
+    logger.warning("PyPDF2 not available. PDF ingestion disabled.")
+
+DOCX_AVAILABLE = importlib.util.find_spec('docx') is not None
+if not DOCX_AVAILABLE:
+    logger.warning("python-docx not available. DOCX ingestion disabled.")
+
+READ_BLOCK_SIZE = 64 * 1024
+# Uploads larger than this are spooled to disk while the PDF/DOCX parser reads them
+SPOOL_MAX_MEMORY = 8 * 1024 * 1024
+
+NDJSON_CONTENT_TYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+TEXT_CONTENT_TYPES = ('text/plain',)
+PDF_CONTENT_TYPES = ('application/pdf',)
+DOCX_CONTENT_TYPES = ('application/vnd.openxmlformats-officedocument.wordprocessingml.document',)
+
+
+def iter_text_blocks(stream: IO[bytes], encoding: str = 'utf-8',
+                     block_size: int = READ_BLOCK_SIZE) -> Iterator[str]:
+    """Decode a raw text upload block by block"""
+    decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+    while True:
+        raw = stream.read(block_size)
+        if not raw:
+            break
+        text = decoder.decode(raw)
+        if text:
+            yield text
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+
+def iter_ndjson_documents(stream: IO[bytes]) -> Iterator[Tuple[Dict, Iterator[str]]]:
+    """Group an NDJSON upload into documents.
+
+    Every line is an object with ``document_id`` and ``text`` (and optionally
+    ``metadata``). Consecutive lines with the same ``document_id`` are parts of
+    one document, so a large document can be sent as many small lines. Yields
+    ``(header, text_blocks)`` pairs; each ``text_blocks`` iterator must be
+    consumed before advancing to the next document.
+    """
+    records = _iter_ndjson_records(stream)
+    pending = next(records, None)
+
+    while pending is not None:
+        header = {
+            'document_id': pending.get('document_id', ''),
+            'metadata': pending.get('metadata', {})
+        }
+        current = pending
+
+        def blocks():
+            nonlocal pending
+            record = current
+            while record is not None and record.get('document_id', '') == header['document_id']:
+                if record.get('text'):
+                    yield record['text']
+                record = next(records, None)
+            pending = record
+
+        document_blocks = blocks()
+        yield header, document_blocks
+        # Drain whatever the caller did not consume to reach the next document
+        for _ in document_blocks:
+            pass
+
+
+def _iter_ndjson_records(stream: IO[bytes]) -> Iterator[Dict]:
+    """Parse one JSON object per non-empty line"""
+    for line_number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            raise ValueError(f"Invalid JSON on line {line_number}: {e}")
+        if not isinstance(record, dict):
+            raise ValueError(f"Line {line_number} is not a JSON object")
+        yield record
+
+
+def iter_pdf_pages(stream: IO[bytes]) -> Iterator[str]:
+    """Extract PDF text page by page"""
+    if not PDF_AVAILABLE:
+        raise RuntimeError("PDF ingestion requires PyPDF2")
+    from PyPDF2 import PdfReader
+
+    with _spool(stream) as spooled:
+        reader = PdfReader(spooled)
+        for page in reader.pages:
+            text = page.extract_text() or ''
+            if text:
+                yield text + '\n\n'
+
+
+def iter_docx_paragraphs(stream: IO[bytes]) -> Iterator[str]:
+    """Extract DOCX text paragraph by paragraph"""
+    if not DOCX_AVAILABLE:
+        raise RuntimeError("DOCX ingestion requires python-docx")
+    import docx
+
+    with _spool(stream) as spooled:
+        document = docx.Document(spooled)
+        for paragraph in document.paragraphs:
+            if paragraph.text.strip():
+                yield paragraph.text + '\n\n'
+
+
+def iter_file_blocks(path: str) -> Iterator[str]:
+    """Read a document from disk as text blocks, picking the reader by extension"""
+    lower = path.lower()
+    with open(path, 'rb') as f:
+        if lower.endswith('.pdf'):
+            yield from iter_pdf_pages(f)
+        elif lower.endswith('.docx'):
+            yield from iter_docx_paragraphs(f)
+        else:
+            yield from iter_text_blocks(f)
+
+
+def _spool(stream: IO[bytes]):
+    """Copy a non-seekable upload into a seekable temporary file"""
+    spooled = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+    shutil.copyfileobj(stream, spooled, READ_BLOCK_SIZE)
+    spooled.seek(0)
+    return spooled
@@ -0,0 +1,238 @@
+"""LLM clause classification over document windows.
+
+The document is cut into structure-aware windows (``chunking.iter_chunk_spans``)
+that are classified concurrently, with bounded parallelism, by a model asked
+for JSON output. Every clause the model reports must quote the window
+verbatim; the quote is located in the window to give the clause exact
+offsets, and clauses whose quote cannot be found are dropped. Parsed window
+results are cached by window text, so re-running extraction on an unchanged
+document (or a revision sharing most sections) costs no model calls.
+"""
+import json
+import logging
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from chunking import iter_chunk_spans
+from clauses import ClauseRecord
+from coalescing import request_key
+
+logger = logging.getLogger(__name__)
+
+# Bump when the prompt changes so cached window results are not reused
+PROMPT_VERSION = 1
+RISK_LEVELS = ('Low', 'Medium', 'High')
+
+_JSON_BLOCK = re.compile(r'\{.*\}|\[.*\]', re.DOTALL)
+_WHITESPACE = re.compile(r'\s+')
+
+
+def build_window_prompt(window_text: str, clause_types: Iterable[str]) -> str:
+    """Classification prompt for one window, asking for JSON only"""
+    types = ', '.join(clause_types)
+    return f"""You are a legal clause classifier. Find the legal clauses in the contract excerpt below.
+
+Allowed clause types: {types}
+
+Respond with JSON only, in this form:
+{{"clauses": [{{"type": "<one allowed type>", "quote": "<exact sentence(s) copied from the excerpt>", "summary": "<one sentence>", "risk_level": "Low|Medium|High"}}]}}
+
+Copy each quote verbatim from the excerpt. Return {{"clauses": []}} when the excerpt contains no such clause.
+
+EXCERPT:
+{window_text}"""
+
+
+def parse_window_response(response: str, window_text: str,
+                          clause_types: Iterable[str]) -> Optional[List[Dict[str, Any]]]:
+    """Clauses of a model response with offsets into the window, or None when it holds no clause list.
+
+    Tolerates prose around the JSON, a bare list instead of ``{"clauses": [...]}``,
+    and type names with spaces or capitals. Clauses of unknown types and
+    quotes that do not occur in the window are dropped.
+    """
+    match = _JSON_BLOCK.search(response or '')
+    if not match:
+        return None
+    try:
+        data = json.loads(match.group())
+    except ValueError:
+        return None
+    items = data.get('clauses') if isinstance(data, dict) else data
+    if not isinstance(items, list):
+        return None
+
+    allowed = set(clause_types)
+    parsed = []
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        clause_type = str(item.get('type', '')).strip().lower().replace(' ', '_').replace('-', '_')
+        span = locate_quote(window_text, str(item.get('quote', '')))
+        if clause_type not in allowed or span is None:
+            continue
+        risk_level = str(item.get('risk_level', '')).strip().title()
+        parsed.append({
+            'type': clause_type,
+            'start': span[0],
+            'end': span[1],
+            'summary': str(item.get('summary', '')).strip(),
+            'risk_level': risk_level if risk_level in RISK_LEVELS else None
+        })
+    return parsed
+
+
+def locate_quote(text: str, quote: str) -> Optional[Tuple[int, int]]:
+    """Span of quote in text, ignoring case and differences in whitespace"""
+    words = quote.split()
+    if not words:
+        return None
+    pattern = r'\s+'.join(re.escape(word) for word in words)
+    match = re.search(pattern, text, re.IGNORECASE)
+    return match.span() if match else None
+
+
+class LLMClauseRecord(ClauseRecord):
+    """Clause found by the LLM, with its summary and risk level"""
+
+    __slots__ = ('summary', 'risk_level')
+
+    KEYS = ClauseRecord.KEYS + ('summary', 'risk_level', 'source')
+
+    def __init__(self, clause_type: str, start: int, end: int, confidence: float, text: str,
+                 summary: str = '', risk_level: str = None):
+        super().__init__(clause_type, start, end, start, end, confidence, text)
+        self.summary = summary
+        self.risk_level = risk_level
+
+    def __getitem__(self, key):
+        if key in ('summary', 'risk_level'):
+            return getattr(self, key)
+        if key == 'source':
+            return 'llm'
+        return super().__getitem__(key)
+
+
+def merge_clause_hits(llm_records: List[LLMClauseRecord], pattern_records: List[ClauseRecord],
+                      corroborated_confidence: float = 0.95) -> List[ClauseRecord]:
+    """Combine LLM and regex clauses, one record per clause.
+
+    LLM clauses of the same type that overlap (neighbouring windows quoting
+    the same clause) keep the longest quote. A regex hit overlapping an LLM
+    clause of its type is dropped in favour of the LLM record, which then
+    counts as corroborated and gets ``corroborated_confidence``. The result
+    is ordered by position.
+    """
+    kept: List[LLMClauseRecord] = []
+    for record in sorted(llm_records, key=lambda r: r.end - r.start, reverse=True):
+        if not any(other.type == record.type and _overlaps(other, record) for other in kept):
+            kept.append(record)
+
+    merged: List[ClauseRecord] = list(kept)
+    for record in pattern_records:
+        overlapping = [llm for llm in kept if llm.type == record.type and _overlaps(llm, record)]
+        if not overlapping:
+            merged.append(record)
+        for llm in overlapping:
+            llm.confidence = max(llm.confidence, corroborated_confidence)
+
+    return sorted(merged, key=lambda r: (r.start, r.type))
+
+
+def _overlaps(a: ClauseRecord, b: ClauseRecord) -> bool:
+    return a.start < b.end and b.start < a.end
+
+
+class WindowCache:
+    """Thread-safe LRU cache of parsed window results"""
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self.stats = {'hits': 0, 'misses': 0}
+        self._entries: 'OrderedDict[str, List[Dict[str, Any]]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return entry
+
+    def put(self, key: str, value: List[Dict[str, Any]]):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+class LLMClauseClassifier:
+    """Classifies the windows of a document concurrently and caches each window's clauses.
+
+    ``classify(prompt)`` returns the model's raw response and the model that
+    answered it, or (None, None) when no model answered. Only parsed answers
+    of the ``model_key`` model are cached: windows no model answered, whose
+    answer held no clause list or that a fallback model answered are asked
+    again by a later run.
+    """
+
+    def __init__(self, classify: Callable[[str], Tuple[Optional[str], Optional[str]]], clause_types: Iterable[str],
+                 model_key: str = '', window_words: int = 600, overlap_words: int = 60,
+                 max_workers: int = 4, cache: WindowCache = None):
+        self.classify = classify
+        self.clause_types = list(clause_types)
+        self.model_key = model_key
+        self.window_words = window_words
+        self.overlap_words = overlap_words
+        self.cache = cache if cache is not None else WindowCache()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix='clause-llm')
+
+    def windows(self, text: str) -> List[Tuple[int, int]]:
+        return [(span.start, span.end) for span in
+                iter_chunk_spans(text, max_words=self.window_words, overlap_words=self.overlap_words)]
+
+    def extract(self, text: str, confidence: float = 0.85) -> List[LLMClauseRecord]:
+        """LLM clauses of the whole document with offsets into ``text``"""
+        windows = self.windows(text)
+        results = self._executor.map(lambda window: self._classify_window(text[window[0]:window[1]]), windows)
+
+        records = []
+        for (window_start, _), clauses in zip(windows, results):
+            for clause in clauses:
+                records.append(LLMClauseRecord(clause['type'], window_start + clause['start'],
+                                               window_start + clause['end'], confidence, text,
+                                               clause['summary'], clause['risk_level']))
+        return records
+
+    def _classify_window(self, window_text: str) -> List[Dict[str, Any]]:
+        key = request_key(PROMPT_VERSION, self.model_key, window_text, normalize=False)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        try:
+            response, model = self.classify(build_window_prompt(window_text, self.clause_types))
+        except Exception as e:
+            logger.error(f"Clause classification of a window failed: {e}")
+            return []
+        if response is None:
+            return []
+
+        clauses = parse_window_response(response, window_text, self.clause_types)
+        if clauses is None:
+            logger.warning(f"Clause classification by {model} returned no clause list")
+            return []
+        if model == self.model_key:
+            self.cache.put(key, clauses)
+        return clauses
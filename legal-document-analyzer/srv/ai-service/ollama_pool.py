@@ -0,0 +1,172 @@
+"""Load-balanced pool of Ollama endpoints.
+
+One Ollama server caps generation throughput, so the service can spread
+requests over several (``OLLAMA_HOSTS``). Each call goes to the healthy
+endpoint with the fewest outstanding requests that serves the requested
+model; the model lists come from the ``list()`` discovery done at warm-up.
+Every endpoint has its own circuit breaker: an endpoint that keeps failing
+is ejected until its ``/api/tags`` health probe succeeds again, and a call
+that fails on one endpoint is retried on the next.
+"""
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+import requests
+
+from circuit_breakers import OPEN, CircuitBreaker, CircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+
+def serves_model(models: Optional[List[str]], model: str) -> bool:
+    """Whether a model list includes ``model``; an untagged name matches any tag.
+
+    An endpoint whose models have not been discovered yet is assumed to
+    serve every model.
+    """
+    if models is None:
+        return True
+    if ':' in model:
+        return model in models
+    return any(name.split(':', 1)[0] == model for name in models)
+
+
+class OllamaEndpoint:
+    """One Ollama server with its client, load and breaker"""
+
+    def __init__(self, url: str, breaker: CircuitBreaker):
+        self.url = url
+        self.breaker = breaker
+        self.client = None
+        self.models: Optional[List[str]] = None
+        self.outstanding = 0
+        self.completed = 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            'url': self.url,
+            'outstanding': self.outstanding,
+            'completed': self.completed,
+            'models': self.models,
+            **self.breaker.snapshot()
+        }
+
+
+class OllamaPool:
+    """Least-outstanding-requests balancing over Ollama endpoints with health-based ejection.
+
+    ``make_client(url)`` returns an ``ollama.Client`` for the endpoint, or
+    None when the library is unavailable (calls then use the HTTP API).
+    """
+
+    def __init__(self, urls: List[str], make_client: Callable[[str], Any] = None,
+                 connect_timeout: float = 2.0, failure_threshold: int = 3, reset_timeout: float = 30.0):
+        self.make_client = make_client
+        self.connect_timeout = connect_timeout
+        self.endpoints = []
+        for url in dict.fromkeys(url.rstrip('/') for url in urls if url):
+            breaker = CircuitBreaker(f"ollama@{url}", failure_threshold, reset_timeout,
+                                     probe=lambda url=url: self.probe(url))
+            self.endpoints.append(OllamaEndpoint(url, breaker))
+        self._lock = threading.Lock()
+        self._turn = 0
+
+    def get_client(self, endpoint: OllamaEndpoint):
+        """The endpoint's Ollama client, created on first use"""
+        if endpoint.client is None and self.make_client is not None:
+            with self._lock:
+                if endpoint.client is None:
+                    endpoint.client = self.make_client(endpoint.url)
+        return endpoint.client
+
+    def reset_clients(self):
+        """Drop the clients (and their keep-alive connections), e.g. after fork()"""
+        with self._lock:
+            for endpoint in self.endpoints:
+                endpoint.client = None
+
+    def probe(self, url: str) -> bool:
+        """Cheap health check used to re-admit an ejected endpoint"""
+        return requests.get(f"{url}/api/tags", timeout=self.connect_timeout).status_code == 200
+
+    def discover(self) -> Dict[str, List[str]]:
+        """List every endpoint's models; endpoints that cannot be reached are ejected"""
+        discovered = {}
+        for endpoint in self.endpoints:
+            try:
+                client = self.get_client(endpoint)
+                if client is not None:
+                    models = [model['name'] for model in client.list()['models']]
+                else:
+                    response = requests.get(f"{endpoint.url}/api/tags", timeout=self.connect_timeout)
+                    response.raise_for_status()
+                    models = [model['name'] for model in response.json().get('models', [])]
+            except Exception as e:
+                logger.warning(f"Failed to connect to Ollama at {endpoint.url}: {e}")
+                # Skip the endpoint straight away instead of after several failed requests
+                endpoint.breaker.trip(e)
+                continue
+            endpoint.models = models
+            endpoint.breaker.record_success()
+            discovered[endpoint.url] = models
+        return discovered
+
+    def _acquire(self, model: str, tried: set, prefer: str = None) -> Optional[OllamaEndpoint]:
+        """Claim the untried, healthy endpoint serving the model with the fewest outstanding requests"""
+        with self._lock:
+            # Rotating the start spreads ties between equally loaded endpoints
+            self._turn += 1
+            count = len(self.endpoints)
+            rotated = [self.endpoints[(self._turn + i) % count] for i in range(count)]
+            candidates = sorted((endpoint for endpoint in rotated
+                                 if endpoint.url not in tried and serves_model(endpoint.models, model)),
+                                key=lambda endpoint: (endpoint.url != prefer, endpoint.outstanding))
+            for endpoint in candidates:
+                if endpoint.breaker.allow():
+                    endpoint.outstanding += 1
+                    return endpoint
+        return None
+
+    def call(self, model: str, fn: Callable[[OllamaEndpoint], Any], prefer: str = None) -> Any:
+        """Run fn on the best endpoint for model, moving on to the next one when it fails.
+
+        The endpoint with url ``prefer`` is tried first while it is healthy,
+        e.g. the one whose cache holds a conversation's prompt prefix.
+
+        Raises CircuitOpenError when no healthy endpoint serves the model and
+        the last endpoint's error when all of them failed.
+        """
+        tried = set()
+        error = None
+        while True:
+            endpoint = self._acquire(model, tried, prefer)
+            if endpoint is None:
+                if error is not None:
+                    raise error
+                raise CircuitOpenError(f"No healthy Ollama endpoint serves {model}")
+            tried.add(endpoint.url)
+            try:
+                result = fn(endpoint)
+            except Exception as e:
+                endpoint.breaker.record_failure(e)
+                logger.warning(f"Ollama at {endpoint.url} failed: {e}")
+                error = e
+                continue
+            else:
+                endpoint.breaker.record_success()
+                with self._lock:
+                    endpoint.completed += 1
+                return result
+            finally:
+                with self._lock:
+                    endpoint.outstanding -= 1
+
+    def breakers(self) -> List[CircuitBreaker]:
+        return [endpoint.breaker for endpoint in self.endpoints]
+
+    def healthy(self) -> bool:
+        return any(endpoint.breaker.state != OPEN for endpoint in self.endpoints)
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        return [endpoint.snapshot() for endpoint in self.endpoints]
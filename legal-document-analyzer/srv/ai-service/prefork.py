@@ -0,0 +1,279 @@
+"""Pre-fork multi-worker server for the AI services.
+
+``app.run(debug=True)`` serves everything from one process. With
+``SERVE_MODE=prefork`` the master process loads the models, compiled
+patterns and RAG index once (``preload``), binds the listening socket and
+then forks ``WEB_WORKERS`` workers that accept connections on it. The
+workers share the master's memory copy-on-write: model weights live in
+buffers that are never written, and ``gc.freeze()`` moves everything loaded
+so far out of the garbage collector's reach so collections do not dirty
+those pages either.
+
+Workers are recycled gracefully: after ``WORKER_MAX_REQUESTS`` requests
+(plus up to ``WORKER_MAX_REQUESTS_JITTER`` so they do not all restart at
+once) a worker stops accepting, finishes its in-flight requests and exits,
+and the master forks a replacement. SIGHUP recycles every worker one at a
+time; SIGTERM or SIGINT drains all workers within ``WORKER_GRACEFUL_TIMEOUT``
+seconds and stops the server.
+
+State written after the fork lives in the worker that handled the request,
+except for the RAG index, which the AI service moves into shared memory
+before forking (``shared_index``). The master runs ``pre_fork`` before every
+fork, so the AI service catches up with the shared index there and recycled
+workers' replacements inherit that instead of replaying all of it. Sessions
+stay per worker, so the AI service passes ``max_workers=1`` to ``run``.
+"""
+import gc
+import logging
+import os
+import random
+import signal
+import socket
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from werkzeug.wsgi import ClosingIterator
+
+logger = logging.getLogger(__name__)
+
+# 'dev' keeps the single-process development server. WEB_WORKERS defaults
+# to 1: a service keeping state in worker memory (the AI service's sessions,
+# clause index and provider limiters) refuses to start with more, since a
+# request could land on a worker that does not have it
+SERVE_MODE = os.getenv('SERVE_MODE', 'dev').lower()
+WEB_WORKERS = int(os.getenv('WEB_WORKERS', '1'))
+WORKER_MAX_REQUESTS = int(os.getenv('WORKER_MAX_REQUESTS', '1000'))
+WORKER_MAX_REQUESTS_JITTER = int(os.getenv('WORKER_MAX_REQUESTS_JITTER', '100'))
+WORKER_GRACEFUL_TIMEOUT = float(os.getenv('WORKER_GRACEFUL_TIMEOUT', '30'))
+
+
+def run(app, port: int, preload: Callable[[], None] = None, post_fork: Callable[[], None] = None,
+        start_dev_server: Callable[[], None] = None, host: str = '0.0.0.0', pre_fork: Callable[[], None] = None,
+        max_workers: int = None):
+    """Serve the app in the mode selected by SERVE_MODE.
+
+    ``max_workers`` is the number of workers the app's per-process state
+    allows; more WEB_WORKERS than that is an error.
+    """
+    if SERVE_MODE == 'prefork':
+        if max_workers is not None and WEB_WORKERS > max_workers:
+            raise SystemExit(f"WEB_WORKERS={WEB_WORKERS}, but this service keeps state in each worker "
+                             f"process and runs at most {max_workers}")
+        PreforkServer(app, host, port, WEB_WORKERS, preload=preload, post_fork=post_fork, pre_fork=pre_fork,
+                      max_requests=WORKER_MAX_REQUESTS, max_requests_jitter=WORKER_MAX_REQUESTS_JITTER,
+                      graceful_timeout=WORKER_GRACEFUL_TIMEOUT).serve()
+    else:
+        if start_dev_server is not None:
+            start_dev_server()
+        app.run(host=host, port=port, debug=True)
+
+
+class _CountingApp:
+    """WSGI wrapper that tracks in-flight requests and asks for recycling after max_requests"""
+
+    def __init__(self, app, max_requests: int, on_limit: Callable[[], None]):
+        self.app = app
+        self.max_requests = max_requests
+        self.on_limit = on_limit
+        self.handled = 0
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, environ, start_response):
+        with self._lock:
+            self.handled += 1
+            self.in_flight += 1
+            limit_reached = self.max_requests > 0 and self.handled == self.max_requests
+        if limit_reached:
+            self.on_limit()
+        try:
+            body = self.app(environ, start_response)
+        except BaseException:
+            self._finished()
+            raise
+        # Streamed bodies count as in flight until the server closes them
+        return ClosingIterator(body, self._finished)
+
+    def _finished(self):
+        with self._lock:
+            self.in_flight -= 1
+
+
+class PreforkServer:
+    """Master process that preloads the app and supervises forked worker processes"""
+
+    def __init__(self, app, host: str, port: int, workers: int, preload: Callable[[], None] = None,
+                 post_fork: Callable[[], None] = None, max_requests: int = 0, max_requests_jitter: int = 0,
+                 graceful_timeout: float = 30.0, backlog: int = 2048, pre_fork: Callable[[], None] = None):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.workers = max(1, workers)
+        self.preload = preload
+        self.pre_fork = pre_fork
+        self.post_fork = post_fork
+        self.max_requests = max_requests
+        self.max_requests_jitter = max_requests_jitter
+        self.graceful_timeout = graceful_timeout
+        self.backlog = backlog
+        self.socket: Optional[socket.socket] = None
+        self.children: Dict[int, float] = {}
+        # Workers being replaced on purpose, whose exit must not fork another one
+        self._retiring = set()
+        self._stopping = False
+        self._reload = False
+
+    def bind(self) -> socket.socket:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(self.backlog)
+        # Idle workers all wake up for a new connection; the ones that lose the accept must not block
+        sock.setblocking(False)
+        sock.set_inheritable(True)
+        self.port = sock.getsockname()[1]
+        self.socket = sock
+        return sock
+
+    def serve(self):
+        started = time.perf_counter()
+        if self.preload is not None:
+            self.preload()
+        if self.socket is None:
+            self.bind()
+        # Keep the garbage collector from touching (and un-sharing) everything loaded so far
+        gc.collect()
+        gc.freeze()
+        logger.info(f"🚀 Preloaded in {time.perf_counter() - started:.2f}s; "
+                    f"forking {self.workers} workers on {self.host}:{self.port}")
+
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+        signal.signal(signal.SIGHUP, self._handle_reload)
+
+        for _ in range(self.workers):
+            self._spawn()
+        try:
+            self._supervise()
+        finally:
+            self._drain()
+            self.socket.close()
+
+    def _supervise(self):
+        while not self._stopping:
+            if self._reload:
+                self._reload = False
+                self._rolling_restart()
+            self._reap(respawn=True)
+            time.sleep(0.2)
+
+    def _reap(self, respawn: bool) -> int:
+        reaped = 0
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            if self.children.pop(pid, None) is None:
+                continue
+            reaped += 1
+            code = os.waitstatus_to_exitcode(status)
+            if code != 0:
+                logger.warning(f"Worker {pid} exited with status {code}")
+            if respawn and not self._stopping and pid not in self._retiring:
+                self._spawn()
+            self._retiring.discard(pid)
+        return reaped
+
+    def _rolling_restart(self):
+        """Replace the workers one at a time so the others keep serving"""
+        for pid in list(self.children):
+            if self._stopping:
+                return
+            self._retiring.add(pid)
+            self._spawn()
+            self._signal(pid, signal.SIGTERM)
+            deadline = time.monotonic() + self.graceful_timeout
+            while pid in self.children and time.monotonic() < deadline:
+                self._reap(respawn=True)
+                time.sleep(0.05)
+            if pid in self.children:
+                self._signal(pid, signal.SIGKILL)
+
+    def _drain(self):
+        for pid in list(self.children):
+            self._signal(pid, signal.SIGTERM)
+        deadline = time.monotonic() + self.graceful_timeout
+        while self.children and time.monotonic() < deadline:
+            if not self._reap(respawn=False):
+                time.sleep(0.05)
+        for pid in list(self.children):
+            self._signal(pid, signal.SIGKILL)
+        while self.children:
+            if not self._reap(respawn=False):
+                time.sleep(0.01)
+
+    def _signal(self, pid: int, signum: int):
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            self.children.pop(pid, None)
+
+    def _handle_stop(self, signum, frame):
+        self._stopping = True
+
+    def _handle_reload(self, signum, frame):
+        self._reload = True
+
+    def _spawn(self) -> int:
+        jitter = random.randint(0, self.max_requests_jitter) if self.max_requests_jitter > 0 else 0
+        if self.pre_fork is not None:
+            self.pre_fork()
+        pid = os.fork()
+        if pid:
+            self.children[pid] = time.monotonic()
+            return pid
+
+        code = 0
+        try:
+            self._run_worker(self.max_requests + jitter if self.max_requests > 0 else 0)
+        except BaseException:
+            logger.exception("Worker crashed")
+            code = 1
+        finally:
+            # Never return into the master's stack
+            os._exit(code)
+
+    def _run_worker(self, max_requests: int):
+        from werkzeug.serving import make_server
+
+        # Only the master reacts to SIGHUP and SIGINT (a Ctrl+C reaches the whole process group)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        if self.post_fork is not None:
+            self.post_fork()
+
+        server = None
+        stopping = threading.Event()
+
+        def stop():
+            # shutdown() waits for serve_forever to return, so it cannot run on the serving thread
+            if not stopping.is_set():
+                stopping.set()
+                threading.Thread(target=server.shutdown, daemon=True).start()
+
+        counted = _CountingApp(self.app, max_requests, stop)
+        server = make_server(self.host, self.port, counted, threaded=True, fd=self.socket.fileno())
+        server.socket.setblocking(False)
+        signal.signal(signal.SIGTERM, lambda signum, frame: stop())
+
+        server.serve_forever(poll_interval=0.2)
+
+        # Finish the requests that were already accepted
+        deadline = time.monotonic() + self.graceful_timeout
+        while counted.in_flight and time.monotonic() < deadline:
+            time.sleep(0.05)
@@ -0,0 +1,199 @@
+"""Opt-in cProfile capture of individual requests.
+
+When PROFILING_ENABLED is set, a request sent with an ``X-Profile: true``
+header or a ``profile=1`` query parameter runs under cProfile. It must carry
+``X-Profile-Token`` when PROFILING_TOKEN is configured; without a token only
+loopback clients may profile or read the stored profiles. The stats are written to
+PROFILE_DIR as ``<request_id>.prof`` and the id is returned in the
+``X-Profile-Id`` response header, so a slow production document can be
+diagnosed from ``/admin/profiles/<request_id>`` without redeploying.
+"""
+import cProfile
+import hmac
+import logging
+import os
+import pstats
+import re
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List
+
+from flask import g, jsonify, request, send_file
+
+logger = logging.getLogger(__name__)
+
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+PROFILING_TOKEN = os.getenv('PROFILING_TOKEN')
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'ai-service-profiles'))
+PROFILE_MAX_ARTIFACTS = int(os.getenv('PROFILE_MAX_ARTIFACTS', '50'))
+
+PROFILE_HEADER = 'X-Profile'
+TOKEN_HEADER = 'X-Profile-Token'
+SORT_KEYS = ('cumulative', 'tottime', 'calls', 'ncalls')
+REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+LOOPBACK_ADDRESSES = ('127.0.0.1', '::1')
+
+
+class RequestProfiler:
+    """Profiles flagged requests and keeps the most recent artifacts"""
+
+    def __init__(self, enabled: bool = PROFILING_ENABLED, directory: str = PROFILE_DIR,
+                 token: str = PROFILING_TOKEN, max_artifacts: int = PROFILE_MAX_ARTIFACTS):
+        self.enabled = enabled
+        self.directory = directory
+        self.token = token
+        self.max_artifacts = max(1, max_artifacts)
+        # request id -> metadata, oldest first
+        self.profiles: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        # cProfile cannot run two profilers at once, so one request is profiled at a time
+        self._active = threading.Lock()
+        self._lock = threading.Lock()
+
+    def authorized(self) -> bool:
+        """Token holders, or local clients when no token is configured"""
+        if not self.token:
+            return request.remote_addr in LOOPBACK_ADDRESSES
+        return hmac.compare_digest(request.headers.get(TOKEN_HEADER, '').encode(), self.token.encode())
+
+    def requested(self) -> bool:
+        """Whether the current request asked to be profiled and may be"""
+        if not self.enabled:
+            return False
+        flag = request.headers.get(PROFILE_HEADER) or request.args.get('profile', '')
+        return flag.lower() in ('1', 'true', 'yes') and self.authorized()
+
+    def start(self):
+        if not self.requested():
+            return
+        if not self._active.acquire(blocking=False):
+            g.profile_skipped = 'busy'
+            return
+
+        request_id = request.headers.get('X-Request-ID', '')
+        g.profile_id = request_id if REQUEST_ID_PATTERN.match(request_id) else uuid.uuid4().hex
+        g.profile_started = time.perf_counter()
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+    def finish(self, response):
+        profiler = g.pop('profiler', None)
+        if profiler is None:
+            if g.get('profile_skipped'):
+                response.headers['X-Profile-Skipped'] = g.profile_skipped
+            return response
+
+        profiler.disable()
+        self._active.release()
+        try:
+            self._save(profiler, g.profile_id, time.perf_counter() - g.profile_started, response.status_code)
+            response.headers['X-Profile-Id'] = g.profile_id
+        except Exception as e:
+            logger.error(f"Failed to store profile {g.profile_id}: {e}")
+        return response
+
+    def abort(self, exc=None):
+        """Release the profiler if the request ended without a response"""
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            self._active.release()
+
+    def _save(self, profiler: cProfile.Profile, profile_id: str, seconds: float, status: int):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{profile_id}.prof")
+        profiler.dump_stats(path)
+
+        with self._lock:
+            self.profiles[profile_id] = {
+                'request_id': profile_id,
+                'route': request.url_rule.rule if request.url_rule else request.path,
+                'method': request.method,
+                'status': status,
+                'duration_seconds': round(seconds, 4),
+                'captured_at': datetime.now().isoformat(),
+                'path': path
+            }
+            self.profiles.move_to_end(profile_id)
+            while len(self.profiles) > self.max_artifacts:
+                _, evicted = self.profiles.popitem(last=False)
+                if os.path.exists(evicted['path']):
+                    os.remove(evicted['path'])
+
+        logger.info(f"🔬 Stored profile {profile_id} for {request.method} {request.path} ({seconds:.3f}s)")
+
+    def top_functions(self, profile_id: str, limit: int = 20, sort: str = 'cumulative') -> List[Dict[str, Any]]:
+        """Hottest functions of a stored profile"""
+        stats = pstats.Stats(self.profiles[profile_id]['path'])
+        stats.sort_stats(sort)
+        top = []
+        for func in stats.fcn_list[:limit]:
+            primitive_calls, calls, total_time, cumulative_time, _ = stats.stats[func]
+            filename, line, name = func
+            top.append({
+                'function': f"{filename}:{line}({name})",
+                'calls': calls,
+                'primitive_calls': primitive_calls,
+                'total_time': round(total_time, 6),
+                'cumulative_time': round(cumulative_time, 6),
+                'per_call': round(cumulative_time / calls, 6) if calls else 0.0
+            })
+        return top
+
+
+def install_profiler(app, profiler: RequestProfiler = None) -> RequestProfiler:
+    """Hook per-request profiling into a Flask app and add the admin endpoints"""
+    profiler = profiler or RequestProfiler()
+
+    app.before_request(profiler.start)
+    app.after_request(profiler.finish)
+    app.teardown_request(profiler.abort)
+
+    @app.route('/admin/profiles', methods=['GET'])
+    def list_profiles():
+        """List stored request profiles, newest first"""
+        if not profiler.enabled:
+            return jsonify({'error': 'Profiling is disabled'}), 404
+        if not profiler.authorized():
+            return jsonify({'error': 'Profiling access denied'}), 403
+
+        profiles = [dict(meta) for meta in reversed(profiler.profiles.values())]
+        for meta in profiles:
+            meta.pop('path')
+        return jsonify({'profiles': profiles, 'total': len(profiles)})
+
+    @app.route('/admin/profiles/<profile_id>', methods=['GET'])
+    def get_profile(profile_id):
+        """Top-N hot functions of a stored profile (?top=20&sort=cumulative)"""
+        if not profiler.enabled:
+            return jsonify({'error': 'Profiling is disabled'}), 404
+        if not profiler.authorized():
+            return jsonify({'error': 'Profiling access denied'}), 403
+        if profile_id not in profiler.profiles:
+            return jsonify({'error': f'Unknown profile: {profile_id}'}), 404
+
+        sort = request.args.get('sort', 'cumulative')
+        if sort not in SORT_KEYS:
+            return jsonify({'error': f"sort must be one of {', '.join(SORT_KEYS)}"}), 400
+        limit = request.args.get('top', 20, type=int)
+
+        meta = {k: v for k, v in profiler.profiles[profile_id].items() if k != 'path'}
+        return jsonify(dict(meta, sort=sort, functions=profiler.top_functions(profile_id, limit, sort)))
+
+    @app.route('/admin/profiles/<profile_id>/download', methods=['GET'])
+    def download_profile(profile_id):
+        """Raw pstats artifact for snakeviz, gprof2dot and similar tools"""
+        if not profiler.enabled:
+            return jsonify({'error': 'Profiling is disabled'}), 404
+        if not profiler.authorized():
+            return jsonify({'error': 'Profiling access denied'}), 403
+        if profile_id not in profiler.profiles:
+            return jsonify({'error': f'Unknown profile: {profile_id}'}), 404
+
+        return send_file(profiler.profiles[profile_id]['path'], as_attachment=True,
+                         download_name=f"{profile_id}.prof")
+
+    return profiler
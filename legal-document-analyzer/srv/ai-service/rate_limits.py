@@ -0,0 +1,172 @@
+"""Adaptive concurrency limits and rate-limit aware retries for model providers.
+
+Each provider gets an ``AdaptiveLimiter`` whose concurrency limit follows
+AIMD: every successful call grows it by ``1 / limit`` (about one slot per
+round trip of the whole window), while a 429 or a latency above the target
+halves it. Callers beyond the limit wait in a bounded queue instead of
+failing straight into the canned fallback, and ``call_with_backoff`` retries
+rate-limited calls after the provider's ``Retry-After`` or an exponential
+delay with full jitter.
+"""
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimitedError(Exception):
+    """The provider rejected the call because of its rate limit or quota"""
+
+    def __init__(self, provider: str, retry_after: Optional[float] = None):
+        super().__init__(f"{provider} rate limited the request"
+                         + (f" (retry after {retry_after:.1f}s)" if retry_after is not None else ''))
+        self.provider = provider
+        self.retry_after = retry_after
+
+
+class LimiterQueueFull(Exception):
+    """No concurrency slot became free in time, or too many callers were waiting"""
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+def raise_for_rate_limit(provider: str, response):
+    """Raise RateLimitedError for a 429 response"""
+    if response.status_code == 429:
+        raise RateLimitedError(provider, parse_retry_after(response.headers.get('Retry-After')))
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limit with a bounded wait queue"""
+
+    def __init__(self, name: str, initial_limit: int = 4, min_limit: int = 1, max_limit: int = 64,
+                 max_queue: int = 32, queue_timeout: float = 10.0, latency_target: Optional[float] = None,
+                 backoff_ratio: float = 0.5):
+        self.name = name
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = float(min(max(initial_limit, self.min_limit), self.max_limit))
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.latency_target = latency_target
+        self.backoff_ratio = backoff_ratio
+        self.in_flight = 0
+        self.waiting = 0
+        self.stats = {'completed': 0, 'rate_limited': 0, 'rejected': 0}
+        # Calls started before the last decrease don't shrink the limit again
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    @contextmanager
+    def slot(self, timeout: float = None) -> Iterator[None]:
+        """Hold one concurrency slot; raises LimiterQueueFull when none frees up"""
+        started = self.acquire(timeout)
+        outcome = 'error'
+        try:
+            yield
+            outcome = 'success'
+        except RateLimitedError:
+            outcome = 'rate_limited'
+            raise
+        finally:
+            self.release(started, outcome)
+
+    def acquire(self, timeout: float = None) -> float:
+        timeout = self.queue_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            if self.in_flight >= int(self.limit):
+                if self.waiting >= self.max_queue:
+                    self.stats['rejected'] += 1
+                    raise LimiterQueueFull(f"{self.name}: {self.waiting} calls already waiting")
+                self.waiting += 1
+                try:
+                    while self.in_flight >= int(self.limit):
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self.stats['rejected'] += 1
+                            raise LimiterQueueFull(f"{self.name}: no slot free within {timeout:.1f}s")
+                        self._condition.wait(remaining)
+                finally:
+                    self.waiting -= 1
+            self.in_flight += 1
+        return time.monotonic()
+
+    def release(self, started: float, outcome: str = 'success'):
+        latency = time.monotonic() - started
+        with self._condition:
+            self.in_flight -= 1
+            if outcome == 'rate_limited':
+                self.stats['rate_limited'] += 1
+                self._decrease(started)
+            elif outcome == 'success':
+                self.stats['completed'] += 1
+                if self.latency_target is not None and latency > self.latency_target:
+                    self._decrease(started)
+                else:
+                    self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            self._condition.notify_all()
+
+    def _decrease(self, started: float):
+        if started < self._last_decrease:
+            return
+        previous = self.limit
+        self.limit = max(float(self.min_limit), self.limit * self.backoff_ratio)
+        self._last_decrease = time.monotonic()
+        if int(self.limit) < int(previous):
+            logger.warning(f"🚦 {self.name} concurrency limit lowered to {int(self.limit)}")
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._condition:
+            return {
+                'limit': int(self.limit),
+                'in_flight': self.in_flight,
+                'waiting': self.waiting,
+                **self.stats
+            }
+
+
+def backoff_delay(attempt: int, base_delay: float, max_delay: float, retry_after: Optional[float] = None) -> float:
+    """Delay before retry number ``attempt`` (0-based)"""
+    if retry_after is not None:
+        # Honour the provider's hint; the jitter spreads out callers that got the same hint
+        return min(max_delay, retry_after) + random.uniform(0, base_delay)
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+def call_with_backoff(limiter: AdaptiveLimiter, call: Callable[[], Any], max_retries: int = 3,
+                      base_delay: float = 0.5, max_delay: float = 20.0,
+                      sleep: Callable[[float], None] = time.sleep) -> Any:
+    """Run ``call`` inside a limiter slot, retrying rate-limited attempts"""
+    for attempt in range(max_retries + 1):
+        try:
+            with limiter.slot():
+                return call()
+        except RateLimitedError as e:
+            if attempt == max_retries:
+                raise
+            delay = backoff_delay(attempt, base_delay, max_delay, e.retry_after)
+            logger.info(f"⏳ {limiter.name} rate limited, retrying in {delay:.2f}s "
+                        f"(attempt {attempt + 1}/{max_retries})")
+            sleep(delay)
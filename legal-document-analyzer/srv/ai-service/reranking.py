@@ -0,0 +1,200 @@
+"""Result diversification for chunk retrieval.
+
+Chunks overlap by 50 words, so the nearest neighbours of a query are often
+the same passage seen through neighbouring windows. ``mmr`` re-ranks an
+over-fetched candidate list by maximal marginal relevance (relevance minus
+redundancy with what was already picked), and ``merge_adjacent`` joins the
+remaining hits that overlap or touch in the same document into one span, so
+the LLM context carries each passage once. ``CrossEncoderReranker`` is an
+optional second stage that scores (query, chunk) pairs with a cross-encoder
+under a latency budget.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Weight of redundancy against relevance; 0 keeps the plain similarity order
+DEFAULT_DIVERSITY = 0.3
+
+
+def mmr(vectors, scores, top_k: int, diversity: float = DEFAULT_DIVERSITY) -> List[int]:
+    """Indexes of the top_k candidates picked by maximal marginal relevance.
+
+    ``vectors`` are the unit-normalized candidate embeddings and ``scores``
+    their similarity to the query. Redundancy is the highest cosine
+    similarity to any candidate already picked.
+    """
+    scores = np.asarray(scores, dtype=np.float32)
+    count = min(top_k, len(scores))
+    if count <= 0:
+        return []
+    if diversity <= 0:
+        return [int(i) for i in np.argsort(-scores, kind='stable')[:count]]
+
+    vectors = np.asarray(vectors, dtype=np.float32)
+    similarities = vectors @ vectors.T
+    redundancy = np.full(len(scores), -np.inf, dtype=np.float32)
+    available = np.ones(len(scores), dtype=bool)
+    selected = []
+
+    for _ in range(count):
+        # Nothing picked yet means no redundancy penalty
+        penalty = np.where(np.isfinite(redundancy), redundancy, 0.0)
+        marginal = np.where(available, (1.0 - diversity) * scores - diversity * penalty, -np.inf)
+        best = int(np.argmax(marginal))
+        selected.append(best)
+        available[best] = False
+        redundancy = np.maximum(redundancy, similarities[best])
+
+    return selected
+
+
+def merge_adjacent(hits: List[Dict[str, Any]], document_key: str = 'document_id',
+                   source_text: Callable[[Dict[str, Any]], Optional[str]] = None) -> List[Dict[str, Any]]:
+    """Join hits of one document that overlap or are consecutive chunks.
+
+    Each hit needs ``start_offset``, ``end_offset``, ``text``, ``chunk_id``
+    and ``chunk_index``. The merged text is sliced from ``source_text(hit)``
+    when it returns the full document; otherwise the chunk texts are stitched
+    and the whitespace between consecutive chunks becomes a paragraph break.
+    A merged hit keeps the order position and similarity of its best member,
+    spans the union of the members' text and lists them in ``chunk_ids``.
+    """
+    groups: Dict[Any, List[int]] = {}
+    for position, hit in enumerate(hits):
+        groups.setdefault(hit[document_key], []).append(position)
+
+    merged_at: Dict[int, Dict[str, Any]] = {}
+    for positions in groups.values():
+        positions.sort(key=lambda p: hits[p]['start_offset'])
+        run = [positions[0]]
+        for position in positions[1:]:
+            hit = hits[position]
+            if (hit['start_offset'] <= max(hits[p]['end_offset'] for p in run)
+                    or hit['chunk_index'] - 1 in {hits[p]['chunk_index'] for p in run}):
+                run.append(position)
+            else:
+                _merge_run(hits, run, merged_at, source_text)
+                run = [position]
+        _merge_run(hits, run, merged_at, source_text)
+
+    return [merged_at[position] for position in sorted(merged_at)]
+
+
+def _merge_run(hits: List[Dict[str, Any]], run: List[int], merged_at: Dict[int, Dict[str, Any]],
+               source_text: Callable[[Dict[str, Any]], Optional[str]] = None):
+    best = min(run)
+    if len(run) == 1:
+        merged_at[best] = hits[best]
+        return
+
+    start = hits[run[0]]['start_offset']
+    end = max(hits[position]['end_offset'] for position in run)
+    document = source_text(hits[best]) if source_text else None
+    text = document[start:end] if document is not None else _stitch(hits, run)
+
+    merged_at[best] = dict(
+        hits[best],
+        text=text,
+        start_offset=start,
+        end_offset=end,
+        chunk_ids=[hits[position]['chunk_id'] for position in run]
+    )
+
+
+def _stitch(hits: List[Dict[str, Any]], run: List[int]) -> str:
+    """Join chunk texts in offset order, skipping the overlap of each next chunk"""
+    text = ''
+    end = None
+    for position in run:
+        hit = hits[position]
+        if end is None:
+            text, end = hit['text'], hit['end_offset']
+        elif hit['start_offset'] > end:
+            text += '\n\n' + hit['text']
+            end = hit['end_offset']
+        elif hit['end_offset'] > end:
+            text += hit['text'][end - hit['start_offset']:]
+            end = hit['end_offset']
+    return text
+
+
+class CrossEncoderReranker:
+    """Scores query/chunk pairs with a cross-encoder, or gives up within a latency budget.
+
+    ``load_model`` returns an object with a sentence-transformers style
+    ``predict(pairs, batch_size=...)`` (or None when unavailable). All pairs of
+    a query are scored in a single batch. Scoring runs on a worker thread; when
+    it does not finish within ``budget_seconds``, or the measured cost per pair
+    predicts that it cannot, ``rerank`` returns None and the caller keeps the
+    first-stage order. Every call skipped that way decays the estimate, so
+    after one slow call (a cold model, a GC pause) scoring is tried again
+    and re-measured instead of staying off for good. With ``ready``, the model is only used once
+    ``ready()`` is true, so requests never wait for it to load; until then
+    they keep the first-stage order too.
+    """
+
+    def __init__(self, load_model: Callable[[], Any], budget_seconds: float, smoothing: float = 0.2,
+                 ready: Callable[[], bool] = None):
+        self.load_model = load_model
+        self.ready = ready
+        self.budget_seconds = budget_seconds
+        self.smoothing = smoothing
+        # Exponentially weighted average of scoring seconds per pair
+        self.seconds_per_pair: Optional[float] = None
+        self.stats = {'reranked': 0, 'timed_out': 0, 'skipped': 0}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='rerank')
+        self._lock = threading.Lock()
+
+    def rerank(self, query: str, texts: List[str]) -> Optional[np.ndarray]:
+        """Cross-encoder score of every text, or None to keep the first-stage order"""
+        if self.ready is not None and not self.ready():
+            self._count('skipped')
+            return None
+        model = self.load_model()
+        if model is None or not texts:
+            return None
+
+        with self._lock:
+            over_budget = (self.seconds_per_pair is not None
+                           and self.seconds_per_pair * len(texts) > self.budget_seconds)
+            if over_budget:
+                self.seconds_per_pair *= 1.0 - self.smoothing
+        if over_budget:
+            self._count('skipped')
+            return None
+
+        future = self._executor.submit(self._score, model, query, texts)
+        try:
+            scores = future.result(timeout=self.budget_seconds)
+        except TimeoutError:
+            # A scoring call that already started finishes in the background and still updates the estimate
+            future.cancel()
+            self._count('timed_out')
+            logger.warning(f"Cross-encoder reranking of {len(texts)} chunks exceeded "
+                           f"{self.budget_seconds * 1000:.0f}ms; keeping first-stage order")
+            return None
+
+        self._count('reranked')
+        return scores
+
+    def _score(self, model, query: str, texts: List[str]) -> np.ndarray:
+        started = time.perf_counter()
+        scores = model.predict([(query, text) for text in texts], batch_size=len(texts))
+        per_pair = (time.perf_counter() - started) / len(texts)
+        with self._lock:
+            if self.seconds_per_pair is None:
+                self.seconds_per_pair = per_pair
+            else:
+                self.seconds_per_pair += self.smoothing * (per_pair - self.seconds_per_pair)
+        return np.asarray(scores, dtype=np.float32)
+
+    def _count(self, outcome: str):
+        with self._lock:
+            self.stats[outcome] += 1
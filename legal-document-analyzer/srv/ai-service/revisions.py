@@ -0,0 +1,49 @@
+"""Helpers for diffing a document revision against the stored version.
+
+Chunks and paragraphs are matched by a digest of their text, so unchanged
+regions keep their embeddings and analysis results even when an edit shifts
+their offsets, and only the changed regions of a redline are processed again.
+"""
+import hashlib
+from collections import defaultdict
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+PARAGRAPH_SEPARATOR = '\n\n'
+
+
+def content_key(text: str) -> bytes:
+    """Digest identifying a region of text by its content"""
+    return hashlib.blake2b(text.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+
+
+def paragraph_spans(text: str) -> List[Tuple[int, int]]:
+    """(start, end) offsets of the pieces of ``text.split('\\n\\n')``"""
+    spans = []
+    start = 0
+    while True:
+        end = text.find(PARAGRAPH_SEPARATOR, start)
+        if end < 0:
+            spans.append((start, len(text)))
+            return spans
+        spans.append((start, end))
+        start = end + len(PARAGRAPH_SEPARATOR)
+
+
+def match_unchanged(previous: Iterable[Tuple[Hashable, str]], texts: List[str]) -> List[Optional[Hashable]]:
+    """Pair each new text with an unused previous region of identical content.
+
+    ``previous`` yields ``(handle, text)`` for the stored version. Returns, for
+    every entry of ``texts``, the handle of a matching previous region or None
+    when the text is new or changed. Repeated regions are matched in order.
+    """
+    by_key: Dict[bytes, List[Hashable]] = defaultdict(list)
+    for handle, text in previous:
+        by_key[content_key(text)].append(handle)
+    for handles in by_key.values():
+        handles.reverse()
+
+    matches = []
+    for text in texts:
+        handles = by_key.get(content_key(text))
+        matches.append(handles.pop() if handles else None)
+    return matches
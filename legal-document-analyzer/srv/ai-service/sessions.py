@@ -0,0 +1,94 @@
+"""Conversational sessions over one document.
+
+A follow-up question about the same document would normally rebuild the
+prompt with the full document context, so Ollama re-processes thousands of
+prompt tokens on every turn. A session keeps the ``context`` Ollama returns
+with each generation (the token state of the conversation so far) and the
+endpoint that produced it; follow-up turns send only the new question with
+that context, and go back to the same endpoint whose cache already holds
+the prefix.
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+
+class ConversationSession:
+    """State of one conversation: document context, Ollama token context and turns"""
+
+    def __init__(self, document_context: str, model: str, document_id: str = None):
+        self.session_id = uuid.uuid4().hex
+        self.document_id = document_id
+        self.document_context = document_context
+        self.model = model
+        # Token context returned by Ollama's last generation; None until the
+        # first turn ran (or after a turn was answered by another backend)
+        self.kv_context: Optional[List[int]] = None
+        self.endpoint_url: Optional[str] = None
+        self.turns: List[Dict[str, str]] = []
+        self.last_used = 0.0
+        # Turns of one conversation run one at a time
+        self.lock = threading.Lock()
+
+    def transcript(self) -> str:
+        """Earlier questions and answers, for backends without token context"""
+        return '\n\n'.join(f"QUESTION: {turn['question']}\nANSWER: {turn['answer']}" for turn in self.turns)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'session_id': self.session_id,
+            'document_id': self.document_id,
+            'model': self.model,
+            'turns': len(self.turns),
+            'context_tokens': len(self.kv_context or []),
+            'endpoint': self.endpoint_url
+        }
+
+
+class SessionStore:
+    """Sessions by id, expiring after ``ttl_seconds`` idle and least recently used first beyond ``max_sessions``"""
+
+    def __init__(self, ttl_seconds: float = 1800, max_sessions: int = 256, clock=time.monotonic):
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self.clock = clock
+        self._sessions: 'OrderedDict[str, ConversationSession]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, document_context: str, model: str, document_id: str = None) -> ConversationSession:
+        session = ConversationSession(document_context, model, document_id)
+        with self._lock:
+            self._expire()
+            session.last_used = self.clock()
+            self._sessions[session.session_id] = session
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        return session
+
+    def get(self, session_id: str) -> Optional[ConversationSession]:
+        with self._lock:
+            self._expire()
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session.last_used = self.clock()
+                self._sessions.move_to_end(session_id)
+            return session
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def _expire(self):
+        cutoff = self.clock() - self.ttl_seconds
+        # Sessions are kept in least recently used order
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if oldest.last_used > cutoff:
+                break
+            self._sessions.popitem(last=False)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
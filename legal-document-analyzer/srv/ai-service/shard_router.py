@@ -0,0 +1,149 @@
+"""Scatter-gather search over RAG index shards.
+
+One AI service process cannot hold the whole multi-tenant corpus, so the
+documents are hash-partitioned by ``document_id`` over N index nodes, each
+running the AI service with its own RAG index. A router node sends every
+document to the shard that owns it and scatters searches to all shards in
+parallel, merging the per-shard top-k by score. Requests about one document
+(its text, removal, questions about it) go to its shard only.
+
+Shards that have not answered within the shard timeout are left out of the
+result (which is then marked ``partial``) rather than delaying it. Every
+shard has a circuit breaker, so one that keeps failing or timing out is
+skipped until its ``/health/live`` probe succeeds again.
+"""
+import hashlib
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional
+
+import requests
+
+from circuit_breakers import CircuitBreaker, CircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+
+def shard_for(document_id: str, shard_count: int) -> int:
+    """Index of the shard owning a document, stable across processes (unlike ``hash()``)"""
+    digest = hashlib.sha1(document_id.encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') % shard_count
+
+
+def merge_top_k(result_lists: List[List[Dict[str, Any]]], top_k: int) -> List[Dict[str, Any]]:
+    """Best top_k hits of several shards, by rerank score when every hit has one, else by similarity"""
+    hits = [hit for results in result_lists for hit in results]
+    key = 'rerank_score' if hits and all('rerank_score' in hit for hit in hits) else 'similarity'
+    return sorted(hits, key=lambda hit: hit[key], reverse=True)[:top_k]
+
+
+class ShardRouter:
+    """Routes documents to their owning shard and scatters searches over all shards"""
+
+    def __init__(self, urls: List[str], timeout: float = 2.0, write_timeout: float = 120.0,
+                 failure_threshold: int = 3, reset_timeout: float = 30.0, max_workers: int = 32):
+        if not urls:
+            raise ValueError('At least one shard URL is required')
+        self.urls = [url.rstrip('/') for url in urls]
+        self.timeout = timeout
+        self.write_timeout = write_timeout
+        self.breakers = [CircuitBreaker(f"shard@{url}", failure_threshold, reset_timeout,
+                                        probe=self._liveness_probe(url))
+                         for url in self.urls]
+        self.stats = {'searches': 0, 'partial': 0}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='shard-search')
+        # requests sessions are not shared between threads
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _liveness_probe(self, url: str):
+        def probe() -> bool:
+            return requests.get(f"{url}/health/live", timeout=self.timeout).ok
+        return probe
+
+    def _session(self) -> requests.Session:
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def owner(self, document_id: str) -> int:
+        return shard_for(document_id, len(self.urls))
+
+    def request(self, shard: int, method: str, path: str, timeout: float = None,
+                **kwargs) -> Optional[Dict[str, Any]]:
+        """Send a request to one shard through its breaker and return the JSON response.
+
+        Returns None when the shard answers 404 (an unknown document is not a
+        shard failure); raises on other failures.
+        """
+        def send():
+            response = self._session().request(method, f"{self.urls[shard]}{path}",
+                                               timeout=timeout or self.write_timeout, **kwargs)
+            if response.status_code == 404:
+                return None
+            response.raise_for_status()
+            return response.json()
+        return self.breakers[shard].call(send)
+
+    def post(self, shard: int, path: str, timeout: float = None, **kwargs) -> Dict[str, Any]:
+        """POST to one shard through its breaker and return the JSON response; raises on failure"""
+        return self.request(shard, 'POST', path, timeout, **kwargs)
+
+    def forward(self, document_id: str, path: str, method: str = 'POST', **kwargs) -> Dict[str, Any]:
+        """Send a request about a document to the shard owning document_id"""
+        shard = self.owner(document_id)
+        return dict(self.request(shard, method, path, **kwargs) or {}, shard=self.urls[shard])
+
+    def search(self, path: str, payload: Dict[str, Any], top_k: int, timeout: float = None) -> Dict[str, Any]:
+        """Scatter a search to all shards and merge their top_k hits.
+
+        Returns the merged ``results``, the status of every shard (``ok``,
+        ``timeout``, ``error`` or ``unavailable`` when its breaker is open)
+        and whether any shard is missing from the result (``partial``).
+        """
+        timeout = timeout or self.timeout
+        started = time.perf_counter()
+
+        def query(shard: int) -> List[Dict[str, Any]]:
+            return self.post(shard, path, timeout=timeout, json=payload)['results']
+
+        futures = {self._executor.submit(query, shard): shard for shard in range(len(self.urls))}
+        done, _ = wait(futures, timeout=timeout)
+
+        result_lists, shards = [], []
+        for future, shard in futures.items():
+            status = {'url': self.urls[shard]}
+            if future not in done or isinstance(future.exception(), requests.Timeout):
+                # An abandoned request's own read timeout ends it and counts against the breaker
+                status['status'] = 'timeout'
+            elif isinstance(future.exception(), CircuitOpenError):
+                status['status'] = 'unavailable'
+            elif future.exception() is not None:
+                status.update(status='error', error=str(future.exception()))
+            else:
+                result_lists.append(future.result())
+                status.update(status='ok', results=len(future.result()))
+            shards.append(status)
+
+        partial = len(result_lists) < len(self.urls)
+        with self._lock:
+            self.stats['searches'] += 1
+            self.stats['partial'] += partial
+        if partial:
+            logger.warning(f"⚠️ Search answered by {len(result_lists)} of {len(self.urls)} shards")
+
+        return {
+            'results': merge_top_k(result_lists, top_k),
+            'shards': shards,
+            'partial': partial,
+            'elapsed_ms': round((time.perf_counter() - started) * 1000, 1)
+        }
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            'shards': {url: breaker.snapshot() for url, breaker in zip(self.urls, self.breakers)}
+        }
@@ -0,0 +1,262 @@
+"""Embedding index shared by the worker processes of the pre-fork server.
+
+Forked workers would otherwise each hold a private copy of every embedding
+added after the fork, and documents added through one worker would never
+reach the others. ``SharedEmbeddingIndex`` keeps the matrix in memory-mapped
+files of one directory (on ``/dev/shm`` by default, i.e. plain shared
+memory): all workers map the same pages and score them in place.
+
+Writes follow a single-writer/multi-reader protocol. A writer takes an
+exclusive lock on the index (``fcntl.lockf``, so one process at a time),
+catches up with the earlier writers, appends its rows past the published row
+count, tombstones deleted rows and appends a description of its change to a
+journal. It then publishes the new row count and journal length in a header
+guarded by a sequence number that is odd while the header is being updated.
+Readers never lock: they read the header until they see the same even
+sequence before and after, and only look at rows below the published count.
+Rows are never moved or reused, so a reader's view stays valid while a
+writer appends.
+
+Journal records are opaque JSON values that tell the other processes what the
+new rows mean (for the RAG pipeline: chunk metadata and document text).
+Since every change is appended, a writer compacts a grown journal: it writes
+a description of the whole state to a new journal file of the next epoch and
+removes the old one. Readers that see a new epoch in the header read the new
+journal from its start; ones still reading the old file keep their open
+descriptor, and its contents below the length they saw never change.
+"""
+import fcntl
+import glob
+import json
+import mmap
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Iterator, List, Tuple
+
+import numpy as np
+
+from embedding_index import STORAGE_DTYPES, EmbeddingIndex
+
+MAGIC = 0x3130584449414C4C  # b'LLAIDX01'
+STORAGE_CODES = list(STORAGE_DTYPES)
+
+# Header fields (uint64); _COMPACTED is the journal length right after the last compaction
+_MAGIC, _SEQUENCE, _SIZE, _CAPACITY, _DIM, _STORAGE, _DELETED, _JOURNAL, _EPOCH, _COMPACTED = range(10)
+HEADER_BYTES = 4096
+
+FILES = ('header', 'vectors', 'scales', 'deleted')
+
+
+def journal_path(directory: str, epoch: int) -> str:
+    return os.path.join(directory, f"journal.{epoch}")
+
+
+def reset(directory: str):
+    """Remove the index files in directory (no process may have the index open)"""
+    paths = [os.path.join(directory, name) for name in FILES] + glob.glob(journal_path(directory, '*'))
+    for path in paths:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+
+class SharedEmbeddingIndex(EmbeddingIndex):
+    """EmbeddingIndex whose rows live in memory-mapped files shared between processes.
+
+    Every process opens the index on the same directory. Writes must happen
+    inside ``writing()``, which yields the journal records of other writers
+    the caller has not seen yet, and end with ``publish()``; ``compact()``
+    then replaces a journal that ``should_compact()`` with a description of
+    the current state. Readers call ``refresh()`` before searching to pick up
+    published rows and records.
+    """
+
+    def __init__(self, directory: str, storage: str = 'float32', rescore_factor: int = 4,
+                 initial_capacity: int = 1024):
+        super().__init__(storage, rescore_factor, initial_capacity)
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._fds = {name: os.open(os.path.join(directory, name), os.O_RDWR | os.O_CREAT, 0o600)
+                     for name in FILES}
+        # lockf locks belong to the process; threads of one process take this lock first
+        self._writer = threading.RLock()
+        self._mapped_capacity = 0
+        self._sequence = -1
+        self._journal_fd = None
+        self._epoch = None
+        self._journal_offset = 0
+
+        with self._locked():
+            fd = self._fds['header']
+            if os.fstat(fd).st_size < HEADER_BYTES:
+                os.ftruncate(fd, HEADER_BYTES)
+            self._header = np.frombuffer(mmap.mmap(fd, HEADER_BYTES), dtype=np.uint64)
+            if self._header[_MAGIC] == 0:
+                self._header[_STORAGE] = STORAGE_CODES.index(storage)
+                self._header[_MAGIC] = MAGIC
+            elif self._header[_MAGIC] != MAGIC:
+                raise ValueError(f"{directory} does not hold a shared embedding index")
+            elif STORAGE_CODES[int(self._header[_STORAGE])] != storage:
+                raise ValueError(f"Shared index in {directory} stores "
+                                 f"{STORAGE_CODES[int(self._header[_STORAGE])]} embeddings, not {storage}")
+            self._open_journal(int(self._header[_EPOCH]), create=True)
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        with self._writer:
+            fcntl.lockf(self._fds['header'], fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.lockf(self._fds['header'], fcntl.LOCK_UN)
+
+    def _read_header(self) -> Tuple[int, np.ndarray]:
+        """Sequence number and a consistent copy of the header"""
+        while True:
+            before = int(self._header[_SEQUENCE])
+            if before % 2 == 0:
+                fields = self._header.copy()
+                if int(self._header[_SEQUENCE]) == before:
+                    return before, fields
+            os.sched_yield()
+
+    def changed(self) -> bool:
+        """Whether another process published changes since the last refresh"""
+        return int(self._header[_SEQUENCE]) != self._sequence
+
+    def refresh(self) -> List[Any]:
+        """Map rows published by other processes and return their journal records since the last refresh.
+
+        After a compaction the records start with the description of the
+        whole state written by ``compact()``.
+        """
+        while True:
+            sequence, header = self._read_header()
+            if sequence == self._sequence:
+                return []
+            with self._writer:
+                if int(header[_EPOCH]) != self._epoch:
+                    try:
+                        self._open_journal(int(header[_EPOCH]))
+                    except FileNotFoundError:
+                        # Compacted again since the header was read
+                        continue
+                with self._lock:
+                    if header[_DIM] and self.dim is None:
+                        self.dim = int(header[_DIM])
+                    if header[_CAPACITY] > self._mapped_capacity:
+                        self._map(int(header[_CAPACITY]))
+                    self._size = int(header[_SIZE])
+                    self._deleted_count = int(header[_DELETED])
+                records = self._read_journal(int(header[_JOURNAL]))
+                self._sequence = sequence
+                return records
+
+    def _open_journal(self, epoch: int, create: bool = False):
+        """Switch to the journal file of epoch, to be read from its start"""
+        fd = os.open(journal_path(self.directory, epoch), os.O_RDWR | (os.O_CREAT if create else 0), 0o600)
+        if self._journal_fd is not None:
+            os.close(self._journal_fd)
+        self._journal_fd, self._epoch, self._journal_offset = fd, epoch, 0
+
+    def _read_journal(self, length: int) -> List[Any]:
+        if length <= self._journal_offset:
+            return []
+        data = os.pread(self._journal_fd, length - self._journal_offset, self._journal_offset)
+        self._journal_offset = length
+        return [json.loads(line) for line in data.splitlines()]
+
+    @contextmanager
+    def writing(self) -> Iterator[List[Any]]:
+        """Hold the write lock, yielding the journal records written since the last refresh"""
+        with self._locked():
+            yield self.refresh()
+
+    def publish(self, records: List[Any] = ()):
+        """Make the rows written so far and records visible to all processes; call inside ``writing()``"""
+        data = _encode(records)
+        journal_length = int(self._header[_JOURNAL])
+        if data:
+            os.pwrite(self._journal_fd, data, journal_length)
+        self._publish_header(journal_length + len(data), int(self._header[_COMPACTED]))
+
+    def should_compact(self, max_bytes: int) -> bool:
+        """Whether the journal outgrew max_bytes and twice its length after the last compaction"""
+        return int(self._header[_JOURNAL]) > max(max_bytes, 2 * int(self._header[_COMPACTED]))
+
+    def compact(self, records: List[Any]):
+        """Replace the journal with records describing the whole state; call inside ``writing()``"""
+        data = _encode(records)
+        previous = journal_path(self.directory, self._epoch)
+        self._open_journal(self._epoch + 1, create=True)
+        os.ftruncate(self._journal_fd, 0)
+        os.pwrite(self._journal_fd, data, 0)
+        self._publish_header(len(data), len(data))
+        # Processes still reading the old journal keep it open until they switch
+        os.unlink(previous)
+
+    def _publish_header(self, journal_length: int, compacted: int):
+        header = self._header
+        header[_SEQUENCE] += 1
+        header[_SIZE] = self._size
+        header[_CAPACITY] = self._mapped_capacity
+        header[_DIM] = self.dim or 0
+        header[_DELETED] = self._deleted_count
+        header[_JOURNAL] = journal_length
+        header[_EPOCH] = self._epoch
+        header[_COMPACTED] = compacted
+        header[_SEQUENCE] += 1
+
+        self._sequence = int(header[_SEQUENCE])
+        self._journal_offset = journal_length
+
+    def copy_from(self, index: EmbeddingIndex):
+        """Append the rows (and tombstones) of an index with the same storage; call inside ``writing()``"""
+        if index.storage != self.storage:
+            raise ValueError(f"Cannot copy {index.storage} rows into a {self.storage} index")
+        size = len(index)
+        if not size:
+            return
+        with self._lock:
+            if self.dim is None:
+                self.dim = index.dim
+            start = self._size
+            self._reserve(start + size)
+            self._data[start:start + size] = index._data[:size]
+            if self._scales is not None:
+                self._scales[start:start + size] = index._scales[:size]
+            if index._deleted is not None:
+                self._deleted[start:start + size] = index._deleted[:size]
+            self._deleted_count += index.deleted_count
+            self._size = start + size
+
+    def _reserve(self, needed: int):
+        """Grow the backing files geometrically; existing mappings stay valid"""
+        if needed <= self._mapped_capacity:
+            return
+        capacity = max(needed, self._mapped_capacity * 2, self._initial_capacity)
+        for name, row_bytes in self._row_bytes().items():
+            if os.fstat(self._fds[name]).st_size < capacity * row_bytes:
+                os.ftruncate(self._fds[name], capacity * row_bytes)
+        self._map(capacity)
+
+    def _row_bytes(self):
+        sizes = {'vectors': np.dtype(STORAGE_DTYPES[self.storage]).itemsize * self.dim, 'deleted': 1}
+        if self.storage == 'int8':
+            sizes['scales'] = 4
+        return sizes
+
+    def _map(self, capacity: int):
+        arrays = {name: mmap.mmap(self._fds[name], capacity * row_bytes)
+                  for name, row_bytes in self._row_bytes().items()}
+        # Searches running on the old mapping keep it alive until they finish
+        self._data = np.frombuffer(arrays['vectors'], dtype=STORAGE_DTYPES[self.storage]).reshape(capacity, self.dim)
+        self._scales = np.frombuffer(arrays['scales'], dtype=np.float32) if 'scales' in arrays else None
+        self._deleted = np.frombuffer(arrays['deleted'], dtype=bool)
+        self._mapped_capacity = capacity
+
+
+def _encode(records: List[Any]) -> bytes:
+    return ''.join(json.dumps(record) + '\n' for record in records).encode('utf-8')
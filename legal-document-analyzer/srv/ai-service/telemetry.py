@@ -0,0 +1,196 @@
+"""Per-stage timing spans and Prometheus-style latency metrics.
+
+Pipeline code wraps its stages (chunking, embedding, retrieval, prompt
+building, LLM calls, post-processing) in ``span(stage)``. Every span feeds a
+process-wide latency histogram and, while a request is being handled, the
+request's ``Trace`` so the endpoint can report where its time went.
+``instrument_app`` hooks a Flask app up to per-route request histograms and
+serves everything on ``/metrics`` in the Prometheus text format.
+"""
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from flask import Response, request
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Per-stage timings are added to responses when this is set, or per request
+# with an "X-Include-Timings: true" header or a "timings=1" query parameter
+INCLUDE_TIMINGS = os.getenv('INCLUDE_TIMINGS', 'false').lower() in ('1', 'true', 'yes')
+TIMINGS_HEADER = 'X-Include-Timings'
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram keyed by label values"""
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [bucket counts..., +Inf count, sum]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.label_names)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[len(self.buckets)] += 1
+            series[-1] += value
+
+    def count(self, **labels) -> int:
+        key = tuple(str(labels.get(name, '')) for name in self.label_names)
+        series = self._series.get(key)
+        return int(series[len(self.buckets)]) if series else 0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((key, list(values)) for key, values in self._series.items())
+
+        for key, values in series:
+            pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, key)]
+            bounds = [str(bound) for bound in self.buckets] + ['+Inf']
+            for bound, count in zip(bounds, values):
+                bucket_labels = ','.join(pairs + [f'le="{bound}"'])
+                lines.append(f"{self.name}_bucket{{{bucket_labels}}} {int(count)}")
+            label_text = '{' + ','.join(pairs) + '}' if pairs else ''
+            lines.append(f"{self.name}_sum{label_text} {values[-1]:.6f}")
+            lines.append(f"{self.name}_count{label_text} {int(values[len(self.buckets)])}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered together on /metrics"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Histogram] = {}
+
+    def histogram(self, name: str, help_text: str, label_names: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        """Return the named histogram, creating it on first use"""
+        if name not in self._metrics:
+            self._metrics[name] = Histogram(name, help_text, label_names, buckets)
+        return self._metrics[name]
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+REQUEST_LATENCY = REGISTRY.histogram(
+    'ai_service_request_duration_seconds', 'HTTP request latency by route',
+    ('route', 'method', 'status'))
+STAGE_LATENCY = REGISTRY.histogram(
+    'ai_service_stage_duration_seconds', 'Duration of pipeline stages', ('stage',))
+PROVIDER_LATENCY = REGISTRY.histogram(
+    'ai_service_provider_duration_seconds', 'Latency of model provider calls', ('provider', 'stage'))
+
+
+class Trace:
+    """Stage durations accumulated while handling one request.
+
+    Nested spans are recorded independently, so stage totals can overlap.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+
+    def add(self, stage: str, seconds: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def stage_ms(self) -> Dict[str, float]:
+        return {stage: round(seconds * 1000, 3) for stage, seconds in self.stages.items()}
+
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar('trace', default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def span(stage: str, provider: str = None) -> Iterator[None]:
+    """Time a pipeline stage; provider calls are also recorded per provider"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        STAGE_LATENCY.observe(seconds, stage=stage)
+        if provider:
+            PROVIDER_LATENCY.observe(seconds, provider=provider, stage=stage)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(stage, seconds)
+
+
+def timings_requested() -> bool:
+    """Whether the current request opted in to per-stage timings"""
+    if INCLUDE_TIMINGS:
+        return True
+    if request.headers.get(TIMINGS_HEADER, '').lower() in ('1', 'true', 'yes'):
+        return True
+    return request.args.get('timings', '').lower() in ('1', 'true', 'yes')
+
+
+def response_timings() -> Dict[str, object]:
+    """Measured processing_time (seconds) plus opt-in per-stage timings in ms"""
+    trace = _current_trace.get()
+    if trace is None:
+        return {}
+    timings = {'processing_time': round(trace.elapsed(), 4)}
+    if timings_requested():
+        timings['timings'] = trace.stage_ms()
+    return timings
+
+
+def instrument_app(app):
+    """Record per-route request latency and serve /metrics"""
+
+    @app.before_request
+    def _start_trace():
+        _current_trace.set(Trace())
+
+    @app.after_request
+    def _record_request(response):
+        trace = _current_trace.get()
+        if trace is not None:
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            REQUEST_LATENCY.observe(trace.elapsed(), route=route, method=request.method,
+                                    status=response.status_code)
+        return response
+
+    @app.teardown_request
+    def _end_trace(exc=None):
+        _current_trace.set(None)
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        """Prometheus scrape endpoint"""
+        return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+    return app
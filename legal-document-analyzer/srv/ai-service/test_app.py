@@ -1,5 +1,7 @@
 import pytest
 import json
+import subprocess
+import sys
 from app import app, clause_extractor
 
 @pytest.fixture
@@ -18,6 +20,33 @@ def test_health_check(client):
     assert 'status' in data
     assert data['status'] == 'healthy'
 
+def test_health_liveness_and_readiness(client):
+    """Test the split between liveness and readiness probes."""
+    response = client.get('/health/live')
+    assert response.status_code == 200
+
+    response = client.get('/health/ready')
+    assert response.status_code in [200, 503]
+
+    data = json.loads(response.data)
+    assert data['status'] in ['ready', 'warming_up']
+    assert set(data['components']) == {'embedding_model', 'ollama', 'vector_store'}
+
+def test_import_does_not_load_models():
+    """Test that importing the service stays off the heavy model imports."""
+    code = (
+        "import sys, app; "
+        "heavy = [m for m in ('torch', 'sentence_transformers', 'ollama') if m in sys.modules]; "
+        "print(heavy, app.startup_metrics['import_seconds'])"
+    )
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True,
+                            cwd=__file__.rsplit('/', 1)[0] or '.', timeout=60)
+
+    assert result.returncode == 0, result.stderr
+    heavy, import_seconds = result.stdout.strip().rsplit(' ', 1)
+    assert heavy == '[]'
+    assert float(import_seconds) < 5.0
+
 def test_generate_embedding(client):
     """Test the embedding generation endpoint."""
     test_data = {
@@ -160,6 +189,84 @@ def test_query_llm_empty_question(client):
     data = json.loads(response.data)
     assert 'error' in data
 
+def test_ingest_stream_ndjson(client):
+    """Test streaming ingestion of NDJSON documents split across lines."""
+    lines = [
+        {'document_id': 'stream-doc-1', 'text': 'CONFIDENTIALITY: Each party shall keep '},
+        {'document_id': 'stream-doc-1', 'text': 'the other party\'s information secret.'},
+        {'document_id': 'stream-doc-2', 'text': 'TERMINATION: Either party may terminate with notice.'}
+    ]
+
+    response = client.post('/api/ingest-stream',
+                          data='\n'.join(json.dumps(line) for line in lines),
+                          content_type='application/x-ndjson')
+
+    assert response.status_code == 200
+
+    data = json.loads(response.data)
+    assert data['total_documents'] == 2
+    assert [d['document_id'] for d in data['documents']] == ['stream-doc-1', 'stream-doc-2']
+    assert all(d['chunks_created'] == 1 for d in data['documents'])
+def test_ingest_stream_reports_documents_before_an_invalid_line(client):
+    """Test that a bad NDJSON line lists the documents already ingested."""
+    lines = [
+        {'document_id': 'partial-doc-1', 'text': 'PAYMENT: Client shall pay within 30 days.'},
+        {'document_id': '', 'text': 'Orphaned text without an id.'},
+        {'document_id': 'partial-doc-2', 'text': 'TERMINATION: Either party may terminate with notice.'}
+    ]
+
+    response = client.post('/api/ingest-stream',
+                          data='\n'.join(json.dumps(line) for line in lines),
+                          content_type='application/x-ndjson')
+
+    assert response.status_code == 400
+
+    data = json.loads(response.data)
+    assert 'document_id' in data['error']
+    assert [d['document_id'] for d in data['documents']] == ['partial-doc-1']
+
+def test_ingest_stream_rejects_metadata(client):
+    """Test that NDJSON metadata is rejected instead of silently dropped."""
+    line = {'document_id': 'meta-doc', 'text': 'Some contract text', 'metadata': {'document_type': 'lease'}}
+
+    response = client.post('/api/ingest-stream', data=json.dumps(line), content_type='application/x-ndjson')
+
+    assert response.status_code == 400
+
+    data = json.loads(response.data)
+    assert 'metadata' in data['error']
+    assert data['documents'] == []
+
+def test_ingest_stream_text_requires_document_id(client):
+    """Test that raw text uploads need a document_id query parameter."""
+    response = client.post('/api/ingest-stream',
+                          data='Some contract text',
+                          content_type='text/plain')
+
+    assert response.status_code == 400
+
+    data = json.loads(response.data)
+    assert 'error' in data
+
+def test_metrics_and_opt_in_timings(client):
+    """Test that requests report measured timings and feed /metrics."""
+    payload = {'document_id': 'timed-doc', 'text': '1. PAYMENT TERMS\nClient shall pay within 30 days.'}
+
+    response = client.post('/api/add-document', json=payload)
+    data = json.loads(response.data)
+    assert data['processing_time'] >= 0
+    assert 'timings' not in data
+
+    response = client.post('/api/add-document?timings=1', json=payload)
+    data = json.loads(response.data)
+    assert 'chunking' in data['timings']
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    body = response.data.decode()
+    assert 'ai_service_request_duration_seconds_count{route="/api/add-document",method="POST",status="200"}' in body
+    assert 'ai_service_stage_duration_seconds_bucket{stage="chunking"' in body
+
 class TestLegalClauseExtractor:
     """Test the LegalClauseExtractor class."""
     
@@ -0,0 +1,73 @@
+import importlib.util
+import json
+import os
+import sys
+
+import pytest
+
+
+@pytest.fixture(scope='module')
+def app_simple():
+    """Load app-simple.py under an importable name so pool workers can unpickle tasks."""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app-simple.py')
+    spec = importlib.util.spec_from_file_location('app_simple', path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules['app_simple'] = module
+    spec.loader.exec_module(module)
+    module.ANALYSIS_WORKERS = 2
+    yield module
+    if module._analysis_pool is not None:
+        module._analysis_pool.shutdown()
+    del sys.modules['app_simple']
+
+
+@pytest.fixture
+def client(app_simple):
+    app_simple.app.config['TESTING'] = True
+    with app_simple.app.test_client() as client:
+        yield client
+
+
+def read_lines(response):
+    return [json.loads(line) for line in response.data.decode().splitlines()]
+
+
+def test_batch_streams_one_result_per_document(client, app_simple):
+    """Every document should get a result line, followed by a summary."""
+    documents = [
+        {'document_id': f'contract-{i}', 'text': f'{i}. LIABILITY\nThe liability of the Supplier is limited.'}
+        for i in range(5)
+    ] + [{'document_id': 'empty', 'text': ''}]
+
+    response = client.post('/api/analyze-documents', json={'documents': documents})
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+
+    lines = read_lines(response)
+    results = {line['document_id']: line for line in lines[:-1]}
+    assert set(results) == {d['document_id'] for d in documents}
+    assert results['empty']['status'] == 'failed'
+    assert results['contract-3']['analysis']['document_id'] == 'contract-3'
+    assert 'liability' in results['contract-3']['analysis']['clause_analysis']['clause_types']
+    assert lines[-1] == dict(lines[-1], status='done', completed=5, failed=1)
+    assert 'contract-0' in app_simple.rag_pipeline.documents
+
+
+def test_batch_accepts_ndjson(client):
+    """NDJSON uploads are grouped by document_id like the ingestion endpoint."""
+    body = '\n'.join(json.dumps(line) for line in [
+        {'document_id': 'nda', 'text': 'Confidential information '},
+        {'document_id': 'nda', 'text': 'must not be disclosed.'},
+        {'document_id': 'msa', 'text': 'Payment terms: invoice due in 30 days.'}
+    ])
+    response = client.post('/api/analyze-documents?add_to_rag=false', data=body,
+                           content_type='application/x-ndjson')
+
+    lines = read_lines(response)
+    assert sorted(line['document_id'] for line in lines[:-1]) == ['msa', 'nda']
+    assert lines[-1]['completed'] == 2
+
+
+def test_batch_requires_documents(client):
+    response = client.post('/api/analyze-documents', json={'documents': []})
+    assert response.status_code == 400
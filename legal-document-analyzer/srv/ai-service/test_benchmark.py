@@ -0,0 +1,37 @@
+import pytest
+
+from benchmark import compare_reports, generate_contract, parse_size, run_benchmarks
+
+
+class TestBenchmark:
+    """Smoke tests for the benchmark suite"""
+
+    @pytest.mark.parametrize('value, expected', [('2048', 2048), ('10KB', 10240), ('1mb', 1048576)])
+    def test_parse_size(self, value, expected):
+        assert parse_size(value) == expected
+
+    def test_generate_contract_is_deterministic(self):
+        text = generate_contract(4096, seed=7)
+        assert len(text) == 4096
+        assert text == generate_contract(4096, seed=7)
+        assert text != generate_contract(4096, seed=8)
+
+    def test_run_benchmarks_report(self):
+        import app
+        originals = {name: getattr(app, name) for name in ('query_llama3', 'call_external_ai_api',
+                                                           'get_embedding_model')}
+
+        report = run_benchmarks([2048], repeats=1, operations=('extract_clauses', 'semantic_search'))
+
+        assert report['meta']['repeats'] == 1
+        assert [r['operation'] for r in report['results']] == ['extract_clauses', 'semantic_search']
+        for result in report['results']:
+            assert result['runs'] == 1
+            assert result['p50_ms'] > 0
+            assert result['peak_memory_mb'] is not None
+
+        comparison = compare_reports(report, report)
+        assert all(c['p50_change_pct'] == 0 for c in comparison)
+
+        # The stubbed providers do not leak into later tests
+        assert all(getattr(app, name) is original for name, original in originals.items())
@@ -0,0 +1,52 @@
+import os
+import pytest
+from bulk_ingest import bulk_ingest, iter_document_paths
+from vector_store import SQLiteVectorStore
+
+
+class StorePipeline:
+    """Minimal stand-in for RAGPipeline that writes fixed embeddings to the store."""
+
+    def __init__(self, store):
+        self.store = store
+
+    def index_chunks(self, chunks, texts):
+        for chunk, text in zip(chunks, texts):
+            chunk['embedding'] = [float(len(text))] * 4
+        self.store.add_chunks([dict(chunk, text=text) for chunk, text in zip(chunks, texts)])
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    """Create a small directory of contracts."""
+    (tmp_path / 'nested').mkdir()
+    (tmp_path / 'msa.txt').write_text('1. PAYMENT TERMS\nClient shall pay within 30 days.\n')
+    (tmp_path / 'nested' / 'nda.txt').write_text('1. CONFIDENTIALITY\nRecipient shall keep information secret.\n')
+    (tmp_path / 'notes.csv').write_text('not,a,contract\n')
+    return tmp_path
+
+
+def test_iter_document_paths_filters_extensions(corpus):
+    """Only supported document types should be picked up."""
+    paths = [os.path.relpath(p, corpus) for p in iter_document_paths(str(corpus))]
+    assert paths == ['msa.txt', os.path.join('nested', 'nda.txt')]
+
+
+def test_bulk_ingest_writes_store_and_reports_metrics(corpus, tmp_path):
+    """Bulk ingestion should persist chunks and report throughput."""
+    store = SQLiteVectorStore(str(tmp_path / 'store.db'))
+    summary = bulk_ingest(StorePipeline(store), str(corpus), workers=2, batch_size=1)
+
+    assert summary['documents'] == 2
+    assert summary['chunks'] == 2
+    assert summary['failed'] == 0
+    assert {'docs_per_second', 'chunks_per_second', 'peak_rss_mb'} <= set(summary)
+
+    chunks = list(store.iter_chunks())
+    assert sorted(c['document_id'] for c in chunks) == ['msa.txt', 'nested/nda.txt']
+    assert chunks[0]['text'].startswith('1. ')
+    assert len(chunks[0]['embedding']) == 4
+
+    rerun = bulk_ingest(StorePipeline(store), str(corpus), workers=2, skip_existing=True)
+    assert rerun['skipped'] == 2
+    assert store.count() == 2
@@ -0,0 +1,84 @@
+import pytest
+from chunking import iter_chunk_spans, iter_stream_chunks
+
+
+SECTIONED_TEXT = """MASTER SERVICES AGREEMENT
+
+1. DEFINITIONS
+Capitalized terms have the meanings given in this Section. The Services are described in each Statement of Work.
+
+2. PAYMENT TERMS
+Client shall pay all invoices within thirty (30) days of receipt. Late payments accrue interest at 1.5% per month.
+
+3. CONFIDENTIALITY
+Each party shall protect the Confidential Information of the other party with reasonable care.
+"""
+
+
+class TestIterChunkSpans:
+    """Test the structure-aware chunker."""
+
+    def test_spans_map_back_to_original_text(self):
+        """Every span should be an exact slice of the source document."""
+        spans = list(iter_chunk_spans(SECTIONED_TEXT, max_words=20, overlap_words=5))
+
+        assert spans
+        for span in spans:
+            chunk = SECTIONED_TEXT[span.start:span.end]
+            assert chunk == chunk.strip()
+            assert chunk.split()[0] in SECTIONED_TEXT.split()
+
+    def test_chunks_start_at_numbered_sections(self):
+        """Chunks should break at numbered section headings."""
+        spans = list(iter_chunk_spans(SECTIONED_TEXT, max_words=30, min_words=5))
+        starts = [SECTIONED_TEXT[span.start:span.end].split('\n')[0] for span in spans]
+
+        assert '2. PAYMENT TERMS' in starts
+        assert '3. CONFIDENTIALITY' in starts
+
+    def test_cuts_at_sentence_boundaries(self):
+        """Oversized sections should be cut after a full sentence."""
+        text = ' '.join(['The Supplier shall deliver the goods on time.'] * 40)
+        spans = list(iter_chunk_spans(text, max_words=50, overlap_words=10))
+
+        assert len(spans) > 1
+        for span in spans:
+            assert text[span.start:span.end].endswith('.')
+        # Sentence cuts need no overlap
+        assert all(a.end < b.start for a, b in zip(spans, spans[1:]))
+
+    def test_hard_cut_overlaps(self):
+        """Text without boundaries falls back to word-overlapping cuts."""
+        text = ' '.join(f'word{i}' for i in range(120))
+        spans = list(iter_chunk_spans(text, max_words=50, overlap_words=10))
+
+        assert [len(text[s.start:s.end].split()) for s in spans] == [50, 50, 40]
+        assert text[spans[1].start:spans[1].end].split()[0] == 'word40'
+
+    def test_fewer_chunks_than_fixed_windows(self):
+        """Boundary-aware chunking should not produce more chunks than fixed windows."""
+        text = '\n\n'.join(SECTIONED_TEXT for _ in range(30))
+        words = len(text.split())
+        fixed_windows = len(range(0, words, 100 - 10))
+
+        assert len(list(iter_chunk_spans(text, max_words=100, overlap_words=10))) <= fixed_windows
+
+    @pytest.mark.parametrize('text', ['', '   \n\n  '])
+    def test_empty_text(self, text):
+        """Whitespace-only documents produce no chunks."""
+        assert list(iter_chunk_spans(text)) == []
+
+
+class TestIterStreamChunks:
+    """Test chunking of documents that arrive in blocks."""
+
+    def test_matches_whole_document_chunking(self):
+        """Streaming in small blocks should give the same spans as chunking the full text."""
+        text = '\n\n'.join(SECTIONED_TEXT for _ in range(50))
+        blocks = (text[i:i + 97] for i in range(0, len(text), 97))
+
+        streamed = list(iter_stream_chunks(blocks, max_words=40, overlap_words=5, buffer_chars=500))
+        expected = list(iter_chunk_spans(text, max_words=40, overlap_words=5))
+
+        assert [span for span, _ in streamed] == expected
+        assert all(chunk == text[span.start:span.end] for span, chunk in streamed)
@@ -0,0 +1,124 @@
+import json
+
+import pytest
+
+import app
+from circuit_breakers import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError, probe_open_breakers
+from ollama_pool import OllamaPool
+from rate_limits import RateLimitedError
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def fail():
+    raise ConnectionError('connection refused')
+
+
+def test_breaker_opens_fails_fast_and_recovers_through_half_open():
+    clock = FakeClock()
+    breaker = CircuitBreaker('backend', failure_threshold=2, reset_timeout=10, clock=clock)
+
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            breaker.call(fail)
+    assert breaker.state == OPEN
+
+    calls = []
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda: calls.append(1))
+    assert calls == []
+    assert breaker.snapshot()['retry_in_seconds'] == 10
+
+    # After the reset timeout one trial goes through; a failure re-opens the breaker
+    clock.now = 10
+    assert breaker.allow() and breaker.state == HALF_OPEN
+    assert not breaker.allow()
+    breaker.record_failure(ConnectionError('still down'))
+    assert breaker.state == OPEN
+
+    clock.now = 20
+    assert breaker.call(lambda: 'ok') == 'ok'
+    assert breaker.snapshot() == {'state': CLOSED, 'consecutive_failures': 0}
+
+
+def test_excluded_errors_do_not_trip_the_breaker():
+    breaker = CircuitBreaker('provider', failure_threshold=1, excluded_exceptions=(RateLimitedError,))
+
+    def limited():
+        raise RateLimitedError('provider')
+
+    with pytest.raises(RateLimitedError):
+        breaker.call(limited)
+    assert breaker.state == CLOSED
+
+
+def test_health_probe_closes_open_breaker():
+    clock = FakeClock()
+    healthy = [False]
+    breaker = CircuitBreaker('ollama', failure_threshold=1, reset_timeout=5, probe=lambda: healthy[0], clock=clock)
+    breaker.record_failure()
+
+    probe_open_breakers([breaker])
+    assert breaker.state == OPEN  # not due yet
+
+    clock.now = 5
+    probe_open_breakers([breaker])
+    assert breaker.state == OPEN and breaker.opened_at == 5
+
+    clock.now = 10
+    healthy[0] = True
+    probe_open_breakers([breaker])
+    assert breaker.state == CLOSED
+
+
+def test_query_llama3_fails_over_without_retrying_dead_ollama(monkeypatch):
+    attempts = []
+
+    def dead_ollama(prompt, model, endpoint):
+        attempts.append(model)
+        raise ConnectionError('connection refused')
+
+    monkeypatch.setattr(app, '_generate_with_ollama', dead_ollama)
+    monkeypatch.setattr(app, 'ollama_pool', OllamaPool(['http://ollama:11434'], failure_threshold=1, reset_timeout=60))
+    monkeypatch.setitem(app.AI_PROVIDERS['claude'], 'api_key', 'test-key')
+    monkeypatch.setattr(app, 'LLM_FAILOVER_ORDER', ['claude'])
+    monkeypatch.setattr(app, 'call_provider', lambda provider, prompt, context='': f'{provider} answer')
+
+    first = app.query_llama3('Who is liable?')
+    second = app.query_llama3('Who is liable?')
+
+    assert attempts == ['llama3']
+    assert second['method'] == 'Failover-claude'
+    assert second['response'] == 'claude answer'
+    assert first['method'] == 'Failover-claude'
+
+    data = json.loads(app.app.test_client().get('/health').data)
+    assert data['ollama_endpoints'][0]['state'] == OPEN
+
+
+def test_named_provider_fails_over_only_when_allowed(monkeypatch):
+    """A provider without an API key is not silently swapped for another paid one."""
+    monkeypatch.setitem(app.AI_PROVIDERS['openai'], 'api_key', None)
+    monkeypatch.setitem(app.AI_PROVIDERS['claude'], 'api_key', 'test-key')
+    monkeypatch.setattr(app, 'LLM_FAILOVER_ORDER', ['openai', 'claude'])
+    monkeypatch.setattr(app, 'DEFAULT_AI_PROVIDER', 'openai')
+    monkeypatch.setattr(app, 'call_provider', lambda provider, prompt, context='': f'{provider} answer')
+    client = app.app.test_client()
+
+    data = json.loads(client.post('/api/query', json={'question': 'Who is liable?', 'provider': 'openai'}).data)
+    assert data['provider'] == data['model_used'] == 'fallback'
+
+    # Without a named provider, the default one fails over along LLM_FAILOVER_ORDER
+    data = json.loads(client.post('/api/query', json={'question': 'Who is liable?'}).data)
+    assert data['answer'] == 'claude answer'
+    assert data['provider'] == 'claude'
+    assert data['model_used'] == f"claude_{app.AI_PROVIDERS['claude']['model']}"
+
+    monkeypatch.setattr(app, 'LLM_FAILOVER_EXPLICIT', True)
+    assert app.call_external_ai_api('openai', 'Who is liable?') == ('claude answer', 'claude')
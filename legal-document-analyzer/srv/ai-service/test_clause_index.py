@@ -0,0 +1,77 @@
+import json
+
+import pytest
+
+import app
+from clause_index import ClauseIndex
+from vector_store import SQLiteVectorStore
+
+def clause(clause_type, content, start=0):
+    return {'type': clause_type, 'content': content, 'confidence': 0.8,
+            'start_position': start, 'end_position': start + len(content)}
+
+
+@pytest.fixture
+def index(tmp_path, embedder):
+    store = SQLiteVectorStore(str(tmp_path / 'clauses.db'))
+    index = ClauseIndex(embedder.encode, store=store)
+    index.index_document('msa', [
+        clause('liability', 'Liability of the supplier is limited to fees paid'),
+        clause('payment', 'Invoices are payable within thirty days', 100)
+    ])
+    index.index_document('nda', [
+        clause('liability', 'The supplier liability is limited to the fees paid in the prior year'),
+        clause('confidentiality', 'Confidential information must not be disclosed')
+    ])
+    index.index_document('lease', [clause('liability', 'Tenant bears liability for all damage to the premises')])
+    return index
+
+
+def test_similar_clauses_are_filtered_by_type_and_document(index):
+    """Neighbours come from other documents and the clause's own type."""
+    matches = index.similar_to('msa_clause_0', top_k=5)
+
+    assert [m['clause_id'] for m in matches] == ['nda_clause_0', 'lease_clause_0']
+    assert matches[0]['similarity'] > matches[1]['similarity']
+    assert all(m['type'] == 'liability' for m in matches)
+
+    assert index.similar_to('msa_clause_0', top_k=5, min_similarity=0.5)[0]['document_id'] == 'nda'
+
+
+def test_reindexing_replaces_document_clauses(index, embedder):
+    """Re-extracting a document drops its old clauses from searches and the store."""
+    index.index_document('nda', [clause('payment', 'Fees are payable on signature')])
+
+    assert index.get('nda_clause_1') is None
+    assert [m['clause_id'] for m in index.search(embedder.encode('limited liability'), 5, 'liability')] == \
+        ['msa_clause_0', 'lease_clause_0']
+
+    reloaded = ClauseIndex(embedder.encode, store=index.store)
+    assert reloaded.load_from_store() == 4
+    assert {m['clause_id'] for m in reloaded.search(embedder.encode('fees payable'), 5, 'payment')} == \
+        {'msa_clause_1', 'nda_clause_0'}
+
+
+def test_similar_clauses_endpoint(monkeypatch, hashed_embeddings):
+    """Clauses extracted with a document_id become searchable across documents."""
+    monkeypatch.setattr(app, 'clause_index', ClauseIndex(lambda texts: app.generate_embeddings_batch(texts)))
+    client = app.app.test_client()
+
+    for document_id, text in [('a', 'The liability of the Supplier is limited to the fees.'),
+                              ('b', 'Supplier liability is limited to the annual fees.')]:
+        response = client.post('/api/extract-clauses', json={'document_id': document_id, 'text': text,
+                                                              'index_clauses': True})
+        clauses = json.loads(response.data)['clauses']
+        assert clauses[0]['clause_id'] == f'{document_id}_clause_0'
+
+    # Indexing is opt-in, so plain extraction never waits for the embedding model
+    response = client.post('/api/extract-clauses', json={'document_id': 'c', 'text': 'Liability is limited.'})
+    assert 'clause_id' not in json.loads(response.data)['clauses'][0]
+
+    response = client.post('/api/similar-clauses', json={'clause_id': 'a_clause_0'})
+    data = json.loads(response.data)
+    assert data['clause_type'] == 'liability'
+    assert [m['document_id'] for m in data['clauses']] == ['b']
+
+    assert client.post('/api/similar-clauses', json={'clause_id': 'missing'}).status_code == 404
+    assert client.post('/api/similar-clauses', json={}).status_code == 400
@@ -0,0 +1,49 @@
+import json
+
+from clauses import ClauseRecord, compile_clause_patterns, find_clauses
+
+PATTERNS = compile_clause_patterns({
+    'liability': [r'liability.*?limited', r'(?:limitation|exclusion).*?liability'],
+    'payment': [r'invoice.*?due']
+})
+
+
+class TestFindClauses:
+    """Tests for offset-based clause records."""
+
+    def test_overlapping_windows_merge(self):
+        text = 'Liability is limited. ' * 5
+        clauses = find_clauses(text, PATTERNS)
+
+        assert len(clauses) == 1
+        clause = clauses[0]
+        assert clause['type'] == 'liability'
+        assert clause['start_position'] == 0
+        assert clause['end_position'] == len(text) - 2
+        assert clause['content'] == text.strip()
+
+    def test_distant_matches_stay_separate(self):
+        text = 'Liability is limited.' + ' filler' * 200 + ' Liability is limited.'
+        clauses = find_clauses(text, PATTERNS, context_chars=20)
+        assert [c['start_position'] for c in clauses] == [0, text.rindex('Liability')]
+
+    def test_keyword_gap_is_bounded(self):
+        text = 'liability ' + 'x' * 1000 + ' limited'
+        assert find_clauses(text, compile_clause_patterns({'liability': [r'liability.*?limited']}, max_gap=100)) == []
+        assert len(find_clauses(text, compile_clause_patterns({'liability': [r'liability.*?limited']}, max_gap=2000))) == 1
+
+    def test_record_serializes_like_clause_dict(self):
+        text = 'The invoice is due in 30 days.'
+        clause = find_clauses(text, PATTERNS)[0]
+
+        assert isinstance(clause, ClauseRecord)
+        assert json.loads(json.dumps(clause.to_dict())) == {
+            'type': 'payment',
+            'title': 'Payment Clause',
+            'content': text,
+            'confidence': 0.8,
+            'start_position': 4,
+            'end_position': 18
+        }
+        assert dict(clause) == clause.to_dict()
+        assert not hasattr(clause, '__dict__')
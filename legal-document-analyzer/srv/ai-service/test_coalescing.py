@@ -0,0 +1,81 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import app
+from coalescing import SingleFlight, request_key
+from ollama_pool import OllamaPool
+
+
+def run_concurrently(fn, count):
+    with ThreadPoolExecutor(max_workers=count) as pool:
+        futures = [pool.submit(fn, i) for i in range(count)]
+        return [future.result() for future in futures]
+
+
+def test_concurrent_duplicates_share_one_call():
+    flights = SingleFlight('test')
+    calls = []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.2)
+        return 'answer'
+
+    results = run_concurrently(lambda i: flights.do('key', slow), 5)
+
+    assert results == ['answer'] * 5
+    assert len(calls) == 1
+    assert flights.snapshot() == {'in_flight': 0, 'calls': 1, 'coalesced': 4}
+
+    # Nothing is cached once the call finished
+    flights.do('key', slow)
+    assert len(calls) == 2
+
+
+def test_followers_receive_the_leaders_error():
+    flights = SingleFlight('test')
+    started = threading.Event()
+
+    def failing():
+        started.set()
+        time.sleep(0.1)
+        raise ConnectionError('backend down')
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        leader = pool.submit(flights.do, 'key', failing)
+        started.wait()
+        follower = pool.submit(flights.do, 'key', failing)
+        for future in (leader, follower):
+            with pytest.raises(ConnectionError):
+                future.result()
+    assert flights.stats == {'calls': 1, 'coalesced': 1}
+
+
+def test_request_key_normalizes_whitespace():
+    assert request_key('What is  the term?\n', 'ctx') == request_key('What is the term?', 'ctx')
+    assert request_key('a', 'bc') != request_key('ab', 'c')
+    assert request_key('a  b', normalize=False) != request_key('a b', normalize=False)
+
+
+def test_identical_llama3_queries_share_one_generation(monkeypatch):
+    generations = []
+
+    def slow_ollama(prompt, model, endpoint):
+        generations.append(prompt)
+        time.sleep(0.2)
+        return {'response': 'The term is two years.', 'model': model, 'method': 'Direct-Ollama'}
+
+    monkeypatch.setattr(app, '_generate_with_ollama', slow_ollama)
+    monkeypatch.setattr(app, 'ollama_pool', OllamaPool(['http://ollama:11434']))
+    monkeypatch.setattr(app, 'llm_flights', SingleFlight('llm'))
+
+    questions = ['What is the term?', 'What is  the term? ', 'What is the term?', 'Who pays?']
+    results = run_concurrently(lambda i: app.query_llama3(questions[i], 'The term is two years.'), 4)
+
+    assert len(generations) == 2
+    assert all(result['response'] == 'The term is two years.' for result in results)
+    assert results[0] is not results[2]
+    assert app.llm_flights.stats['coalesced'] == 2
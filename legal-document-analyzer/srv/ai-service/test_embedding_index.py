@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+from embedding_index import EmbeddingIndex, quantize_int8
+
+
+@pytest.fixture
+def corpus():
+    """Clustered unit vectors resembling sentence embeddings, plus noisy queries."""
+    rng = np.random.default_rng(42)
+    centers = rng.normal(size=(50, 384))
+    vectors = centers[rng.integers(0, 50, 3000)] + 0.7 * rng.normal(size=(3000, 384))
+    vectors = (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+    queries = vectors[rng.integers(0, 3000, 50)] + 0.3 * rng.normal(size=(50, 384))
+    return vectors, queries.astype(np.float32)
+
+
+def recall_at_k(index, reference, queries, k=10, rescore=None):
+    hits = 0
+    for query in queries:
+        expected, _ = reference.search(query, k)
+        found, _ = index.search(query, k, rescore=rescore)
+        hits += len(set(expected) & set(found))
+    return hits / (k * len(queries))
+
+
+class TestEmbeddingIndex:
+    """Test compact and quantized embedding storage."""
+
+    def test_float32_search_matches_brute_force(self, corpus):
+        """float32 storage should return the exact top-k by dot product."""
+        vectors, queries = corpus
+        index = EmbeddingIndex('float32', initial_capacity=16)
+        for start in range(0, len(vectors), 700):
+            index.add(vectors[start:start + 700])
+
+        rows, scores = index.search(queries[0], 5)
+
+        expected = np.argsort(-(vectors @ queries[0]))[:5]
+        assert list(rows) == list(expected)
+        assert np.allclose(scores, vectors[expected] @ queries[0], atol=1e-5)
+
+    @pytest.mark.parametrize('storage,min_recall', [('float16', 0.99), ('int8', 0.95)])
+    def test_quantized_recall(self, corpus, storage, min_recall):
+        """Quantized kernels should lose little recall, and rescoring should recover it."""
+        vectors, queries = corpus
+        reference = EmbeddingIndex('float32')
+        reference.add(vectors)
+        index = EmbeddingIndex(storage)
+        index.add(vectors)
+
+        assert recall_at_k(index, reference, queries) >= min_recall
+        assert recall_at_k(index, reference, queries, rescore=lambda rows: vectors[rows]) >= 0.99
+
+    def test_memory_reduction(self, corpus):
+        """int8 storage should be far smaller than Python float lists."""
+        vectors, _ = corpus
+        index = EmbeddingIndex('int8')
+        index.add(vectors)
+
+        # A list of 384 Python floats costs a pointer plus a float object per value
+        list_bytes = len(vectors) * 384 * (8 + 24)
+        assert list_bytes / index.memory_bytes() > 30
+
+    def test_search_restricted_to_rows(self, corpus):
+        """Filtering by rows should only return those rows."""
+        vectors, queries = corpus
+        index = EmbeddingIndex('int8')
+        index.add(vectors)
+
+        allowed = np.arange(100, 200)
+        rows, _ = index.search(queries[0], 10, rows=allowed)
+
+        assert len(rows) == 10
+        assert set(rows) <= set(allowed)
+
+    def test_deleted_rows_are_never_returned(self, corpus):
+        """Deleted rows should drop out of results, even when few rows are live."""
+        vectors, queries = corpus
+        index = EmbeddingIndex()
+        index.add(vectors[:20])
+
+        best, _ = index.search(queries[0], 5)
+        index.delete(best)
+        rows, _ = index.search(queries[0], 5)
+        assert not set(rows) & set(best)
+        assert index.deleted_count == 5
+
+        index.delete(np.arange(20))
+        index.add(vectors[20:25])
+        rows, _ = index.search(queries[0], 10)
+        assert sorted(rows) == list(range(20, 25))
+
+    def test_quantize_zero_vector(self):
+        """Zero vectors should quantize without dividing by zero."""
+        codes, scales = quantize_int8(np.zeros((1, 4)))
+        assert not codes.any()
+        assert scales[0] == 0
+
+    def test_rejects_dimension_mismatch(self):
+        """All rows must share one dimension."""
+        index = EmbeddingIndex()
+        index.add(np.ones((1, 4)))
+        with pytest.raises(ValueError):
+            index.add(np.ones((1, 3)))
@@ -0,0 +1,106 @@
+import pytest
+
+import app
+from fingerprints import SimHashIndex, hamming_distance, simhash
+
+SECTIONS = [f"{i + 1}. SECTION {i + 1}\nThe Supplier shall deliver item {i} within {i + 10} days "
+            f"and the Client shall pay invoice {i} within thirty days of receipt. " * 20 for i in range(6)]
+
+
+def contract(party):
+    return f"MASTER SERVICES AGREEMENT between {party} and the Client.\n\n" + '\n\n'.join(SECTIONS)
+
+
+def test_simhash_is_close_for_templated_documents():
+    """Changing a party name flips few bits; unrelated text flips many."""
+    base = simhash(contract('Acme Corp'))
+    assert hamming_distance(base, simhash(contract('Globex Ltd'))) <= 3
+    assert hamming_distance(base, simhash('The tenant shall pay rent monthly to the landlord. ' * 50)) > 10
+    assert simhash('') == 0
+
+
+def test_simhash_index_finds_neighbours_within_distance():
+    index = SimHashIndex(max_distance=3)
+    index.add('a', 0b1011)
+    index.add('b', 0b1011 ^ (1 << 40) ^ (1 << 63))
+    index.add('c', (1 << 64) - 1)
+
+    assert index.query(0b1011) == [('a', 0), ('b', 2)]
+    assert index.query(0b1011, exclude='a') == [('b', 2)]
+    index.remove('b')
+    assert index.query(0b1011) == [('a', 0)]
+
+
+class TestNearDuplicateIngestion:
+    """Templated contracts should share embeddings and collapse in search."""
+
+    @pytest.fixture
+    def pipeline(self, hashed_embeddings):
+        self.embedded = hashed_embeddings
+        return app.RAGPipeline()
+
+    def test_identical_chunks_share_rows(self, pipeline):
+        first = pipeline.add_document_version('acme', contract('Acme Corp'))
+        assert first['near_duplicates'] == []
+
+        self.embedded.clear()
+        second = pipeline.add_document_version('globex', contract('Globex Ltd'))
+        assert second['near_duplicates'] == ['acme']
+        assert second['chunks_embedded'] == len(self.embedded) < second['chunks']
+        assert len(pipeline.embedding_index) < first['chunks'] + second['chunks']
+
+        # The shared chunks stay searchable for the other document once one is removed
+        pipeline.remove_document('acme')
+        results = pipeline.retrieve_relevant_chunks('deliver item 3', top_k=3)
+        assert results and all(r['document_id'] == 'globex' for r in results)
+        assert all(r['duplicates'] == [] for r in results)
+
+    def test_search_collapses_duplicates(self, pipeline):
+        pipeline.add_document_version('acme', contract('Acme Corp'))
+        pipeline.add_document_version('globex', contract('Globex Ltd'))
+
+        # Identical chunks share a row, which lists the other document's chunk
+        results = pipeline.retrieve_relevant_chunks('deliver item 3 within 13 days', top_k=3,
+                                                     diversity=0, merge_adjacent_hits=False)
+        assert len(results) == 3
+        assert [r['duplicates'] for r in results] == [[r['chunk_id'].replace('acme', 'globex')] for r in results]
+
+        # Chunks differing only in the party name are folded into the better hit
+        results = pipeline.retrieve_relevant_chunks('services agreement between Acme Corp', top_k=2, diversity=0)
+        assert results[0]['chunk_id'] == 'acme_0'
+        assert results[0]['duplicates'] == ['globex_0']
+        assert results[1]['chunk_id'] != 'globex_0'
+
+        raw = pipeline.retrieve_relevant_chunks('services agreement between Acme Corp', top_k=2,
+                                             collapse_duplicates=False, diversity=0)
+        assert [r['chunk_id'] for r in raw] == ['acme_0', 'globex_0']
+
+    def test_search_within_one_document_uses_its_own_chunks(self, pipeline):
+        pipeline.add_document_version('acme', contract('Acme Corp'))
+        pipeline.add_document_version('globex', contract('Globex Ltd'))
+
+        # Shared rows belong to acme's chunks first; globex gets its aliases
+        results = pipeline.retrieve_relevant_chunks('deliver item 3', top_k=3, document_id='globex',
+                                                     merge_adjacent_hits=False)
+        assert results and all(r['document_id'] == 'globex' for r in results)
+        assert all(r['duplicates'] == [r['chunk_id'].replace('globex', 'acme')] for r in results)
+        assert pipeline.retrieve_relevant_chunks('deliver item 3', document_id='unknown') == []
+
+    def test_rows_dropped_during_an_update_are_embedded_again(self, pipeline, monkeypatch):
+        pipeline.add_document_version('acme', contract('Acme Corp'))
+        embed = app.generate_embeddings_batch
+
+        def embed_while_acme_is_removed(texts):
+            # The owner of the shared rows goes away between the diff and the write
+            if 'acme' in pipeline.documents:
+                pipeline.remove_document('acme')
+            return embed(texts)
+
+        monkeypatch.setattr(app, 'generate_embeddings_batch', embed_while_acme_is_removed)
+        self.embedded.clear()
+        update = pipeline.add_document_version('globex', contract('Globex Ltd'))
+        assert update['chunks_embedded'] == len(self.embedded) == update['chunks']
+        assert update['chunks_reused'] == 0
+        assert sorted(pipeline.document_rows['globex']) == sorted(pipeline.row_fingerprints)
+        results = pipeline.retrieve_relevant_chunks('deliver item 3', top_k=3)
+        assert results and all(r['document_id'] == 'globex' for r in results)
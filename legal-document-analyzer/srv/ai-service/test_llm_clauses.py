@@ -0,0 +1,122 @@
+import json
+import threading
+import time
+
+import app
+from clauses import ClauseRecord
+from llm_clauses import LLMClauseClassifier, LLMClauseRecord, merge_clause_hits, parse_window_response
+
+TYPES = ['liability', 'confidentiality', 'termination', 'payment', 'intellectual_property']
+
+SECTIONS = [
+    "1. PAYMENT\nInvoices are due within thirty days of receipt. Late payments accrue interest at one percent per month.",
+    "2. CONFIDENTIALITY\nEach party shall keep the other party's confidential information secret for five years.",
+    "3. TERMINATION\nEither party may terminate this agreement on sixty days written notice."
+]
+
+
+def test_parse_window_response_locates_quotes_and_drops_invented_ones():
+    window = "Late payments accrue\ninterest at one percent per month. Governing law is Delaware."
+    response = 'Here is the JSON: ' + json.dumps({'clauses': [
+        {'type': 'Payment', 'quote': 'late payments accrue interest at one percent per month.',
+         'summary': 'Late interest', 'risk_level': 'medium'},
+        {'type': 'payment', 'quote': 'Payment is due upon signature.', 'summary': 'Not in the text'},
+        {'type': 'governing_law', 'quote': 'Governing law is Delaware.'}
+    ]})
+
+    clauses = parse_window_response(response, window, TYPES)
+    assert clauses == [{'type': 'payment', 'start': 0, 'end': window.index(' Governing'),
+                        'summary': 'Late interest', 'risk_level': 'Medium'}]
+    assert parse_window_response('not json at all', window, TYPES) is None
+    assert parse_window_response('{"answer": "none"}', window, TYPES) is None
+    assert parse_window_response('{"clauses": []}', window, TYPES) == []
+    assert parse_window_response('[{"type": "payment", "quote": "Late payments"}]', window, TYPES)[0]['end'] == 13
+
+
+def test_merge_prefers_llm_clauses_and_keeps_other_regex_hits():
+    text = 'x' * 400
+    llm = [LLMClauseRecord('payment', 100, 200, 0.85, text, 'Late interest', 'Medium'),
+           LLMClauseRecord('payment', 150, 190, 0.85, text)]
+    regex = [ClauseRecord('payment', 120, 140, 0, 340, 0.8, text),
+             ClauseRecord('liability', 120, 140, 0, 340, 0.8, text),
+             ClauseRecord('payment', 300, 320, 100, 400, 0.8, text)]
+
+    merged = merge_clause_hits(llm, regex)
+    assert [(r['type'], r['start_position']) for r in merged] == [('payment', 100), ('liability', 120), ('payment', 300)]
+    assert merged[0]['confidence'] == 0.95 and merged[0]['source'] == 'llm'
+    assert merged[0].to_dict()['summary'] == 'Late interest'
+
+
+class FakeModel:
+    """Quotes the first sentence of every numbered section in the window."""
+
+    def __init__(self, delay=0.0, model='llama3'):
+        self.delay = delay
+        self.model = model
+        self.prompts = []
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, prompt):
+        with self._lock:
+            self.prompts.append(prompt)
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(self.delay)
+        excerpt = prompt.split('EXCERPT:\n', 1)[1]
+        clauses = []
+        for section in SECTIONS:
+            heading, body = section.split('\n')
+            if body in excerpt:
+                clauses.append({'type': heading.split()[1].lower(), 'quote': body.split('. ')[0],
+                                'summary': heading, 'risk_level': 'Low'})
+        with self._lock:
+            self.active -= 1
+        return json.dumps({'clauses': clauses}), self.model
+
+
+def test_windows_are_classified_concurrently_and_cached():
+    model = FakeModel(delay=0.05)
+    classifier = LLMClauseClassifier(model, TYPES, model_key='llama3', window_words=20, overlap_words=2,
+                                     max_workers=3)
+    text = '\n\n'.join(SECTIONS)
+
+    records = classifier.extract(text)
+    assert len(classifier.windows(text)) == 3
+    assert model.peak > 1
+    assert sorted(r.type for r in records) == ['confidentiality', 'payment', 'termination']
+    assert all(text[r.start:r.end] in SECTIONS[i] for i, r in enumerate(sorted(records, key=lambda r: r.start)))
+
+    calls = len(model.prompts)
+    assert len(classifier.extract(text)) == 3
+    assert len(model.prompts) == calls
+    assert classifier.cache.stats['hits'] == 3
+
+
+def test_garbage_and_fallback_answers_are_not_cached():
+    text = '\n\n'.join(SECTIONS)
+    garbage = LLMClauseClassifier(lambda prompt: ('I cannot help with that.', 'llama3'), TYPES,
+                                  model_key='llama3', window_words=20, overlap_words=2)
+    assert garbage.extract(text) == [] and len(garbage.cache) == 0
+
+    fallback = FakeModel(model='openai_gpt-4')
+    classifier = LLMClauseClassifier(fallback, TYPES, model_key='llama3', window_words=20, overlap_words=2)
+    assert len(classifier.extract(text)) == 3 and len(classifier.cache) == 0
+    assert len(classifier.extract(text)) == 3 and len(fallback.prompts) == 6
+
+
+def test_extract_clauses_endpoint_uses_llm_when_asked(monkeypatch):
+    model = FakeModel()
+    monkeypatch.setattr(app, 'classify_clause_window', model)
+    extractor = app.LegalClauseExtractor()
+    monkeypatch.setattr(app, 'clause_extractor', extractor)
+    client = app.app.test_client()
+    text = '\n\n'.join(SECTIONS)
+
+    plain = json.loads(client.post('/api/extract-clauses', json={'text': text}).data)
+    with_llm = json.loads(client.post('/api/extract-clauses', json={'text': text, 'use_llm': True}).data)
+
+    assert model.prompts and not any(c.get('source') == 'llm' for c in plain['clauses'])
+    llm_types = sorted(c['type'] for c in with_llm['clauses'] if c.get('source') == 'llm')
+    assert llm_types == ['confidentiality', 'payment', 'termination']
@@ -0,0 +1,82 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from circuit_breakers import CLOSED, OPEN, CircuitOpenError, probe_open_breakers
+from ollama_pool import OllamaPool, serves_model
+
+
+class FakeClient:
+    def __init__(self, models=None):
+        self.models = models
+
+    def list(self):
+        if self.models is None:
+            raise ConnectionError('connection refused')
+        return {'models': [{'name': name} for name in self.models]}
+
+
+def make_pool(models_by_url, **kwargs):
+    clients = {url: FakeClient(models) for url, models in models_by_url.items()}
+    return OllamaPool(list(models_by_url), make_client=clients.get, **kwargs)
+
+
+def test_serves_model_matches_untagged_names():
+    assert serves_model(['llama3:latest'], 'llama3')
+    assert not serves_model(['llama3:latest'], 'llama3:70b')
+    assert not serves_model(['mistral:latest'], 'llama3')
+    assert serves_model(None, 'llama3')
+
+
+def test_requests_spread_over_least_outstanding_endpoints():
+    pool = make_pool({'http://a:11434': ['llama3:latest'], 'http://b:11434': ['llama3:latest'],
+                      'http://c:11434': ['mistral:latest']})
+    pool.discover()
+    served = []
+    lock = threading.Lock()
+
+    def generate(endpoint):
+        with lock:
+            served.append(endpoint.url)
+        time.sleep(0.1)
+        return endpoint.url
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(lambda _: pool.call('llama3', generate), range(4)))
+
+    # Only the endpoints serving llama3 are used, and the load is split between them
+    assert sorted(served) == ['http://a:11434'] * 2 + ['http://b:11434'] * 2
+    assert pool.call('mistral', lambda endpoint: endpoint.url) == 'http://c:11434'
+    assert all(endpoint['outstanding'] == 0 for endpoint in pool.snapshot())
+
+
+def test_unreachable_and_failing_endpoints_are_ejected():
+    pool = make_pool({'http://down:11434': None, 'http://flaky:11434': ['llama3'], 'http://up:11434': ['llama3']},
+                     failure_threshold=1)
+    assert set(pool.discover()) == {'http://flaky:11434', 'http://up:11434'}
+    assert pool.endpoints[0].breaker.state == OPEN
+
+    def generate(endpoint):
+        if endpoint.url == 'http://flaky:11434':
+            raise ConnectionError('model server crashed')
+        return endpoint.url
+
+    # A failure moves the call to the next endpoint and ejects the failing one
+    assert {pool.call('llama3', generate) for _ in range(3)} == {'http://up:11434'}
+    assert pool.endpoints[1].breaker.state == OPEN
+
+    with pytest.raises(CircuitOpenError):
+        pool.call('llama3:70b', generate)
+
+
+def test_health_probe_readmits_endpoint(monkeypatch):
+    pool = make_pool({'http://a:11434': None}, reset_timeout=0)
+    pool.discover()
+    assert not pool.healthy()
+
+    monkeypatch.setattr(pool, 'probe', lambda url: True)
+    probe_open_breakers(pool.breakers())
+    assert pool.endpoints[0].breaker.state == CLOSED
+    assert pool.healthy()
@@ -0,0 +1,83 @@
+import json
+import os
+import signal
+import subprocess
+import sys
+import textwrap
+import time
+import urllib.request
+
+import pytest
+
+SERVER = textwrap.dedent('''
+    import os, sys
+    from flask import Flask, jsonify
+    from prefork import PreforkServer
+
+    app = Flask(__name__)
+    state = {}
+
+    def preload():
+        state['loaded_in'] = os.getpid()
+
+    def pre_fork():
+        state['spawned'] = state.get('spawned', 0) + 1
+
+    def post_fork():
+        state['forked'] = True
+
+    @app.route('/')
+    def index():
+        return jsonify(pid=os.getpid(), loaded_in=state['loaded_in'], forked=state.get('forked', False),
+                       spawned=state['spawned'])
+
+    server = PreforkServer(app, '127.0.0.1', 0, workers=2, preload=preload, post_fork=post_fork,
+                           max_requests=3, graceful_timeout=5, pre_fork=pre_fork)
+    server.bind()
+    print(server.port, flush=True)
+    server.serve()
+''')
+
+
+def get(port):
+    with urllib.request.urlopen(f'http://127.0.0.1:{port}/', timeout=5) as response:
+        return json.loads(response.read())
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='pre-fork serving needs fork()')
+def test_workers_share_the_preload_and_are_recycled():
+    process = subprocess.Popen([sys.executable, '-c', SERVER], stdout=subprocess.PIPE, text=True,
+                               cwd=os.path.dirname(os.path.abspath(__file__)))
+    try:
+        port = int(process.stdout.readline())
+        responses = []
+        deadline = time.monotonic() + 20
+        while len(responses) < 12 and time.monotonic() < deadline:
+            try:
+                responses.append(get(port))
+            except OSError:
+                time.sleep(0.05)
+
+        assert len(responses) == 12
+        # Loaded once in the master, served by forked workers that get replaced after 3 requests each
+        assert {r['loaded_in'] for r in responses} == {process.pid}
+        assert all(r['forked'] and r['pid'] != process.pid for r in responses)
+        assert len({r['pid'] for r in responses}) >= 4
+        # Replacements inherit what the master did in pre_fork after the first workers were forked
+        assert max(r['spawned'] for r in responses) >= 3
+
+        process.send_signal(signal.SIGTERM)
+        assert process.wait(timeout=15) == 0
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+
+
+def test_services_with_per_worker_state_refuse_more_workers(monkeypatch):
+    import prefork
+
+    monkeypatch.setattr(prefork, 'SERVE_MODE', 'prefork')
+    monkeypatch.setattr(prefork, 'WEB_WORKERS', 2)
+    with pytest.raises(SystemExit, match='at most 1'):
+        prefork.run(None, 0, max_workers=1)
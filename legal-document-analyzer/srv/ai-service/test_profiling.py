@@ -0,0 +1,86 @@
+import pytest
+from flask import Flask, jsonify
+
+from profiling import RequestProfiler, install_profiler
+
+
+def busy_work(n):
+    return sum(i * i for i in range(n))
+
+
+@pytest.fixture
+def make_client(tmp_path):
+    """Create a test client for a small app with profiling installed."""
+    def factory(**kwargs):
+        app = Flask(__name__)
+
+        @app.route('/work', methods=['POST'])
+        def work():
+            return jsonify({'result': busy_work(20000)})
+
+        install_profiler(app, RequestProfiler(directory=str(tmp_path), **kwargs))
+        return app.test_client()
+    return factory
+
+
+def test_profile_is_stored_and_summarized(make_client, tmp_path):
+    """A flagged request should produce an artifact and a top-N summary."""
+    client = make_client(enabled=True)
+
+    response = client.post('/work')
+    assert 'X-Profile-Id' not in response.headers
+
+    response = client.post('/work?profile=1', headers={'X-Request-ID': 'req-42'})
+    assert response.headers['X-Profile-Id'] == 'req-42'
+    assert (tmp_path / 'req-42.prof').exists()
+
+    listing = client.get('/admin/profiles').get_json()
+    assert [p['request_id'] for p in listing['profiles']] == ['req-42']
+
+    summary = client.get('/admin/profiles/req-42?top=5&sort=cumulative').get_json()
+    assert summary['route'] == '/work'
+    assert len(summary['functions']) <= 5
+    assert any('busy_work' in f['function'] for f in client.get('/admin/profiles/req-42?top=50').get_json()['functions'])
+
+
+def test_profiling_disabled_by_default(make_client):
+    """Without config the flag is ignored and admin endpoints are hidden."""
+    client = make_client(enabled=False)
+
+    response = client.post('/work', headers={'X-Profile': 'true'})
+    assert 'X-Profile-Id' not in response.headers
+    assert client.get('/admin/profiles').status_code == 404
+
+
+def test_token_required_when_configured(make_client):
+    """A configured token gates both profiling and the admin endpoints."""
+    client = make_client(enabled=True, token='secret')
+
+    response = client.post('/work', headers={'X-Profile': 'true'})
+    assert 'X-Profile-Id' not in response.headers
+    assert client.get('/admin/profiles').status_code == 403
+
+    response = client.post('/work', headers={'X-Profile': 'true', 'X-Profile-Token': 'secret'})
+    assert 'X-Profile-Id' in response.headers
+
+
+
+def test_without_token_only_loopback_clients_may_profile(make_client):
+    """With no token configured, remote clients can neither profile nor read profiles."""
+    client = make_client(enabled=True)
+    remote = {'REMOTE_ADDR': '10.0.0.7'}
+
+    response = client.post('/work', headers={'X-Profile': 'true'}, environ_base=remote)
+    assert 'X-Profile-Id' not in response.headers
+    assert client.get('/admin/profiles', environ_base=remote).status_code == 403
+
+    response = client.post('/work', headers={'X-Profile': 'true'}, environ_base={'REMOTE_ADDR': '::1'})
+    assert 'X-Profile-Id' in response.headers
+
+def test_old_artifacts_are_evicted(make_client, tmp_path):
+    """Only the most recent max_artifacts profiles are kept."""
+    client = make_client(enabled=True, max_artifacts=2)
+    for i in range(3):
+        client.post('/work?profile=1', headers={'X-Request-ID': f'r{i}'})
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['r1.prof', 'r2.prof']
@@ -0,0 +1,92 @@
+import threading
+import time
+
+import pytest
+
+import app
+from rate_limits import (AdaptiveLimiter, LimiterQueueFull, RateLimitedError, call_with_backoff,
+                         parse_retry_after)
+
+
+def test_parse_retry_after():
+    assert parse_retry_after('2.5') == 2.5
+    assert parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT') == 0.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after('soon') is None
+
+
+def test_limit_grows_additively_and_halves_on_rate_limit():
+    limiter = AdaptiveLimiter('test', initial_limit=4, max_limit=8)
+    for _ in range(8):
+        limiter.release(limiter.acquire())
+    assert limiter.snapshot()['limit'] == 5
+
+    started = [limiter.acquire() for _ in range(3)]
+    for s in started:
+        # A burst of 429s from the same window only halves the limit once
+        limiter.release(s, 'rate_limited')
+    assert limiter.snapshot()['limit'] == 2
+    assert limiter.snapshot()['rate_limited'] == 3
+
+
+def test_callers_queue_for_a_slot_and_overflow_is_rejected():
+    limiter = AdaptiveLimiter('test', initial_limit=1, max_limit=1, max_queue=1, queue_timeout=1.0)
+    held = limiter.acquire()
+
+    acquired = []
+    waiter = threading.Thread(target=lambda: acquired.append(limiter.acquire()))
+    waiter.start()
+    time.sleep(0.05)
+    assert limiter.snapshot()['waiting'] == 1
+    with pytest.raises(LimiterQueueFull):
+        limiter.acquire()
+
+    limiter.release(held)
+    waiter.join(1)
+    assert acquired and limiter.snapshot()['in_flight'] == 1
+    with pytest.raises(LimiterQueueFull):
+        limiter.acquire(timeout=0.05)
+
+
+def test_call_with_backoff_honours_retry_after():
+    limiter = AdaptiveLimiter('test')
+    responses = [RateLimitedError('test', retry_after=3.0), RateLimitedError('test'), 'answer']
+    delays = []
+
+    def call():
+        result = responses.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    assert call_with_backoff(limiter, call, base_delay=0.5, sleep=delays.append) == 'answer'
+    assert 3.0 <= delays[0] <= 3.5
+    assert 0 <= delays[1] <= 1.0
+
+    def always_limited():
+        raise RateLimitedError('test')
+
+    with pytest.raises(RateLimitedError):
+        call_with_backoff(limiter, always_limited, max_retries=1, sleep=lambda _: None)
+
+
+class FakeResponse:
+    def __init__(self, status_code, payload=None, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self._payload = payload
+
+    def json(self):
+        return self._payload
+
+
+def test_external_api_retries_rate_limited_calls(monkeypatch):
+    """A 429 is retried after Retry-After instead of returning the fallback."""
+    responses = [FakeResponse(429, headers={'Retry-After': '0'}),
+                 FakeResponse(200, {'choices': [{'message': {'content': 'Provider answer'}}]})]
+    monkeypatch.setattr(app.requests, 'post', lambda *args, **kwargs: responses.pop(0))
+    monkeypatch.setitem(app.AI_PROVIDERS['openai'], 'api_key', 'test-key')
+    monkeypatch.setitem(app.provider_limiters, 'openai', AdaptiveLimiter('openai'))
+
+    assert app.call_external_ai_api('openai', 'Who is liable?') == ('Provider answer', 'openai')
+    assert app.provider_limiters['openai'].snapshot()['rate_limited'] == 1
@@ -0,0 +1,114 @@
+import time
+
+import numpy as np
+
+import app
+from reranking import CrossEncoderReranker, merge_adjacent, mmr
+
+
+def test_mmr_skips_redundant_candidates():
+    """A near-copy of the best hit loses to a less similar but distinct one."""
+    vectors = np.array([[1.0, 0.0, 0.0], [0.99, 0.14, 0.0], [0.6, 0.0, 0.8]], dtype=np.float32)
+    scores = [0.9, 0.89, 0.7]
+
+    assert mmr(vectors, scores, 2, diversity=0.5) == [0, 2]
+    assert mmr(vectors, scores, 2, diversity=0) == [0, 1]
+    assert sorted(mmr(vectors, scores, 10)) == [0, 1, 2]
+    assert mmr(vectors[:0], [], 3) == []
+
+
+def hit(chunk_index, start, end, text, document_id='msa'):
+    return {'chunk_id': f'{document_id}_{chunk_index}', 'chunk_index': chunk_index, 'document_id': document_id,
+            'start_offset': start, 'end_offset': end, 'text': text[start:end], 'similarity': 1.0 / (chunk_index + 1)}
+
+
+def test_merge_adjacent_joins_overlapping_and_consecutive_chunks():
+    text = 'alpha beta gamma delta epsilon zeta eta theta'
+    hits = [hit(1, 6, 22, text), hit(3, 36, 45, text), hit(0, 0, 16, text), hit(0, 0, 5, 'other text', 'nda')]
+
+    merged = merge_adjacent(hits)
+    assert [h['chunk_id'] for h in merged] == ['msa_1', 'msa_3', 'nda_0']
+    assert merged[0]['chunk_ids'] == ['msa_0', 'msa_1']
+    assert merged[0]['text'] == 'alpha beta gamma delta'
+    assert (merged[0]['start_offset'], merged[0]['end_offset']) == (0, 22)
+    assert 'chunk_ids' not in merged[1]
+
+    # Consecutive chunks with a gap are sliced from the source text when available
+    hits = [hit(0, 0, 10, text), hit(1, 11, 22, text)]
+    assert merge_adjacent(hits)[0]['text'] == 'alpha beta\n\ngamma delta'
+    assert merge_adjacent(hits, source_text=lambda h: text)[0]['text'] == 'alpha beta gamma delta'
+
+
+class KeywordCrossEncoder:
+    """Scores a pair by how often the query's last word occurs in the text."""
+
+    def __init__(self, delay_seconds=0.0):
+        self.delay_seconds = delay_seconds
+        self.batches = []
+
+    def predict(self, pairs, batch_size=32):
+        self.batches.append(len(pairs))
+        time.sleep(self.delay_seconds)
+        return [text.lower().count(query.split()[-1]) for query, text in pairs]
+
+
+def test_cross_encoder_scores_in_one_batch():
+    model = KeywordCrossEncoder()
+    reranker = CrossEncoderReranker(lambda: model, budget_seconds=1.0)
+
+    scores = reranker.rerank('who pays the invoice', ['no match', 'invoice invoice', 'one invoice'])
+    assert list(scores) == [0, 2, 1]
+    assert model.batches == [3]
+    assert reranker.stats['reranked'] == 1
+    assert CrossEncoderReranker(lambda: None, 1.0).rerank('q', ['text']) is None
+
+
+def test_cross_encoder_falls_back_past_budget():
+    """Slow scoring times out, then the learned cost skips the model up front."""
+    model = KeywordCrossEncoder(delay_seconds=0.2)
+    reranker = CrossEncoderReranker(lambda: model, budget_seconds=0.05)
+
+    assert reranker.rerank('invoice', ['invoice']) is None
+    assert reranker.stats['timed_out'] == 1
+    time.sleep(0.25)
+    assert reranker.rerank('invoice', ['invoice']) is None
+    assert reranker.stats['skipped'] == 1
+    assert model.batches == [1]
+
+
+def test_cross_encoder_resumes_after_one_slow_call():
+    """Skipping decays the estimate, so a later call re-measures the now fast model."""
+    model = KeywordCrossEncoder(delay_seconds=0.2)
+    reranker = CrossEncoderReranker(lambda: model, budget_seconds=0.05)
+    assert reranker.rerank('invoice', ['invoice']) is None
+    time.sleep(0.25)
+
+    model.delay_seconds = 0.0
+    results = [reranker.rerank('invoice', ['invoice']) for _ in range(20)]
+    assert results[0] is None and results[-1] is not None
+    assert reranker.stats['reranked'] >= 1 and reranker.seconds_per_pair < 0.05
+
+
+def test_cross_encoder_is_skipped_until_ready():
+    """Requests never load the model themselves."""
+    model, loads, ready = KeywordCrossEncoder(), [], []
+    reranker = CrossEncoderReranker(lambda: loads.append(1) or model, budget_seconds=1.0, ready=lambda: bool(ready))
+
+    assert reranker.rerank('invoice', ['invoice']) is None
+    assert reranker.stats['skipped'] == 1 and loads == []
+    ready.append(True)
+    assert list(reranker.rerank('invoice', ['invoice'])) == [1]
+
+
+def test_pipeline_reranks_candidates(monkeypatch, hashed_embeddings):
+    monkeypatch.setattr(app, 'reranker', CrossEncoderReranker(KeywordCrossEncoder, budget_seconds=1.0))
+    pipeline = app.RAGPipeline()
+    sections = [f"{i + 1}. SECTION {i + 1}\n" + ('Payment terms apply to the services. ' * 60 if i != 4
+                                                  else 'Late fees accrue on unpaid amounts. ' * 60)
+                for i in range(6)]
+    pipeline.add_document('msa', '\n\n'.join(sections))
+
+    first_stage = pipeline.retrieve_relevant_chunks('payment terms fees', top_k=1, rerank=False)
+    reranked = pipeline.retrieve_relevant_chunks('payment terms fees', top_k=1, rerank=True)
+    assert 'rerank_score' not in first_stage[0]
+    assert 'Late fees' in reranked[0]['text'] and reranked[0]['rerank_score'] > 0
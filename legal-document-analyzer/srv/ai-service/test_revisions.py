@@ -0,0 +1,99 @@
+import importlib.util
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import app
+from revisions import match_unchanged, paragraph_spans
+
+
+@pytest.mark.parametrize('text', ['', 'one', 'one\n\ntwo', '\n\none\n\n\n\ntwo\n\n', 'a\n\n\nb'])
+def test_paragraph_spans_match_split(text):
+    """Spans should cover exactly the pieces of text.split('\\n\\n')."""
+    assert [text[start:end] for start, end in paragraph_spans(text)] == text.split('\n\n')
+
+
+def test_match_unchanged_pairs_identical_text_in_order():
+    """Repeated regions pair up in order; edited regions get no match."""
+    previous = [('a', 'alpha'), ('b', 'beta'), ('c', 'alpha')]
+    assert match_unchanged(previous, ['alpha', 'gamma', 'alpha', 'alpha']) == ['a', None, 'c', None]
+
+
+def revision(paragraphs, edited):
+    return '\n\n'.join(p + ' Amended.' if i == edited else p for i, p in enumerate(paragraphs))
+
+
+PARAGRAPHS = [f"{i + 1}. SECTION {i + 1}\nThe Supplier shall deliver item {i} within {i + 10} days. " * 30
+              for i in range(8)]
+
+
+class TestIncrementalRAG:
+    """Re-adding a revised document should only embed changed chunks."""
+
+    def test_only_changed_chunks_are_embedded(self, monkeypatch):
+        embedded = []
+        original = app.generate_embeddings_batch
+        monkeypatch.setattr(app, 'generate_embeddings_batch', lambda texts: embedded.extend(texts) or original(texts))
+        pipeline = app.RAGPipeline()
+
+        first = pipeline.add_document_version('msa', revision(PARAGRAPHS, None))
+        assert first['chunks_embedded'] == first['chunks']
+
+        embedded.clear()
+        second = pipeline.add_document_version('msa', revision(PARAGRAPHS, 4))
+        assert 0 < second['chunks_embedded'] < second['chunks']
+        assert len(embedded) == second['chunks_embedded']
+        assert second['chunks_reused'] + second['chunks_embedded'] == second['chunks']
+
+        # Only the chunks of the current version are retrievable, with current text
+        results = pipeline.retrieve_relevant_chunks('deliver', top_k=100, merge_adjacent_hits=False)
+        assert len(results) == second['chunks']
+        text = pipeline.documents['msa']
+        assert all(text[r['start_offset']:r['end_offset']] == r['text'] for r in results)
+
+
+class TestIncrementalAnalysis:
+    """Re-analysis of a revision should only process changed paragraphs."""
+
+    @pytest.fixture
+    def extractor(self):
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app-simple.py')
+        spec = importlib.util.spec_from_file_location('app_simple', path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module.LegalClauseExtractor
+
+    def test_revision_matches_full_analysis(self, extractor):
+        cached = extractor()
+        cached.analyze_document_comprehensive(revision(PARAGRAPHS, None), 'msa')
+
+        amended = revision(PARAGRAPHS, 2).replace('Amended.', 'The Supplier shall indemnify the Customer.')
+        incremental = cached.analyze_document_comprehensive(amended, 'msa')
+        full = extractor().analyze_document_comprehensive(amended)
+
+        assert incremental['incremental_analysis'] == {'paragraphs': 8, 'paragraphs_reanalyzed': 1}
+        for key in ('document_stats', 'clause_analysis', 'risk_assessment', 'key_terms',
+                    'document_structure', 'compliance_indicators'):
+            assert incremental[key] == full[key]
+        assert incremental['risk_assessment']['risk_factors'][0]['indicators'] == ['indemnify']
+
+    def test_clauses_span_paragraph_breaks(self, extractor):
+        """Clauses are matched on the whole text, not per cached paragraph."""
+        text = 'The Recipient shall protect all Confidential\n\nInformation disclosed by the Discloser.'
+        analyzer = extractor()
+        analysis = analyzer.analyze_document_comprehensive(text, 'nda')
+
+        assert analysis['incremental_analysis']['paragraphs'] == 2
+        assert 'confidentiality' in analysis['clause_analysis']['clause_types']
+        assert analysis['clause_analysis']['total_clauses'] == len(analyzer.extract_clauses(text))
+
+    def test_paragraph_cache_is_shared_by_request_threads(self, extractor):
+        analyzer = extractor(max_cached_documents=4)
+        texts = [revision(PARAGRAPHS, i % 8) for i in range(8)]
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            analyses = list(pool.map(lambda i: analyzer.analyze_document_comprehensive(texts[i % 8], f"doc-{i % 6}"),
+                                     range(48)))
+
+        assert len(analyses) == 48
+        assert len(analyzer._paragraph_cache) == 4
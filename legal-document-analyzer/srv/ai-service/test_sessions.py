@@ -0,0 +1,86 @@
+import json
+
+import app
+from ollama_pool import OllamaPool
+from sessions import SessionStore
+
+DOCUMENT = 'SERVICES AGREEMENT. The term of this agreement is two years. Either party may terminate on notice.'
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_sessions_expire_when_idle_and_evict_least_recently_used():
+    clock = FakeClock()
+    store = SessionStore(ttl_seconds=60, max_sessions=2, clock=clock)
+    first = store.create('doc one', 'llama3')
+    second = store.create('doc two', 'llama3')
+
+    clock.now = 30
+    assert store.get(first.session_id) is first
+    clock.now = 40
+    third = store.create('doc three', 'llama3')
+    assert store.get(second.session_id) is None
+    assert len(store) == 2
+
+    clock.now = 95
+    assert store.get(first.session_id) is None
+    assert store.get(third.session_id) is third
+    assert store.delete(third.session_id) and len(store) == 0
+
+
+def test_follow_ups_send_only_the_question_with_ollama_context(monkeypatch):
+    calls = []
+
+    def fake_ollama(prompt, model, endpoint, kv_context=None, keep_context=False):
+        calls.append({'prompt': prompt, 'kv_context': kv_context, 'endpoint': endpoint.url})
+        return {'response': f'answer {len(calls)}', 'model': model, 'confidence': 0.9,
+                'method': 'LLaMA3-Ollama', 'kv_context': list(range(len(calls) * 10))}
+
+    monkeypatch.setattr(app, '_generate_with_ollama', fake_ollama)
+    monkeypatch.setattr(app, 'ollama_pool', OllamaPool(['http://a:11434', 'http://b:11434']))
+    monkeypatch.setattr(app, 'sessions', SessionStore())
+    client = app.app.test_client()
+
+    response = client.post('/api/sessions', json={'text': DOCUMENT})
+    assert response.status_code == 201
+    session_id = json.loads(response.data)['session_id']
+
+    first = json.loads(client.post(f'/api/sessions/{session_id}/query', json={'question': 'What is the term?'}).data)
+    second = json.loads(client.post(f'/api/sessions/{session_id}/query', json={'question': 'Can I terminate?'}).data)
+
+    assert first['answer'] == 'answer 1' and not first['reused_context']
+    assert second['answer'] == 'answer 2' and second['reused_context'] and second['turn'] == 2
+    assert DOCUMENT in calls[0]['prompt'] and calls[0]['kv_context'] is None
+    assert DOCUMENT not in calls[1]['prompt'] and 'Can I terminate?' in calls[1]['prompt']
+    assert calls[1]['kv_context'] == list(range(10))
+    # The follow-up goes back to the endpoint that holds the conversation's prefix
+    assert calls[1]['endpoint'] == calls[0]['endpoint']
+
+    assert client.delete(f'/api/sessions/{session_id}').status_code == 200
+    assert client.post(f'/api/sessions/{session_id}/query', json={'question': 'Hello?'}).status_code == 404
+
+
+def test_failover_turn_carries_the_transcript(monkeypatch):
+    def dead_ollama(prompt, model, endpoint, kv_context=None, keep_context=False):
+        raise ConnectionError('connection refused')
+
+    contexts = []
+    monkeypatch.setattr(app, '_generate_with_ollama', dead_ollama)
+    monkeypatch.setattr(app, 'ollama_pool', OllamaPool(['http://a:11434']))
+    monkeypatch.setattr(app, 'failover_providers', lambda: ['claude'])
+    monkeypatch.setattr(app, 'call_provider', lambda provider, prompt, context='': contexts.append(context) or 'ok')
+
+    session = app.SessionStore().create(DOCUMENT, 'llama3')
+    session.turns.append({'question': 'What is the term?', 'answer': 'Two years.'})
+    session.kv_context = [1, 2, 3]
+
+    result = app.ask_in_session(session, 'Can I terminate?')
+    assert result['method'] == 'Failover-claude' and not result['reused_context']
+    assert session.kv_context is None
+    assert DOCUMENT in contexts[0] and 'Two years.' in contexts[0]
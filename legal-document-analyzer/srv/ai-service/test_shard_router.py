@@ -0,0 +1,169 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+import textwrap
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+import app
+from shard_router import ShardRouter, merge_top_k, shard_for
+
+# One AI service per shard, each with its own in-memory RAG index
+SHARD = textwrap.dedent('''
+    from werkzeug.serving import make_server
+    import app
+
+    server = make_server('127.0.0.1', 0, app.app, threaded=True)
+    print('PORT', server.server_port, flush=True)
+    server.serve_forever()
+''')
+
+DOCUMENTS = {f"contract-{i}": f"Contract {i}. The Recipient shall keep the Confidential Information of "
+                              f"party {i} secret for {i + 1} years." for i in range(8)}
+
+
+def test_shard_for_is_stable_and_spreads_documents():
+    owners = [shard_for(f"doc-{i}", 4) for i in range(1000)]
+    assert owners == [shard_for(f"doc-{i}", 4) for i in range(1000)]
+    assert all(200 < owners.count(shard) < 300 for shard in range(4))
+
+
+def test_merge_top_k_orders_by_rerank_score_when_all_hits_have_one():
+    first = [{'chunk_id': 'a', 'similarity': 0.9}, {'chunk_id': 'b', 'similarity': 0.5}]
+    second = [{'chunk_id': 'c', 'similarity': 0.7}]
+    assert [hit['chunk_id'] for hit in merge_top_k([first, second], 2)] == ['a', 'c']
+
+    reranked = [[dict(hit, rerank_score=score) for hit, score in zip(first, [0.1, 3.0])],
+                [dict(second[0], rerank_score=1.0)]]
+    assert [hit['chunk_id'] for hit in merge_top_k(reranked, 3)] == ['b', 'c', 'a']
+
+
+@pytest.fixture(scope='module')
+def shards():
+    processes = [subprocess.Popen([sys.executable, '-c', SHARD], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                  text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+                 for _ in range(2)]
+    try:
+        urls = []
+        for process in processes:
+            line = process.stdout.readline()
+            while line and not line.startswith('PORT'):
+                line = process.stdout.readline()
+            urls.append(f"http://127.0.0.1:{line.split()[1]}")
+        yield urls
+    finally:
+        for process in processes:
+            process.kill()
+            process.wait()
+
+
+@pytest.fixture
+def slow_shard():
+    """A shard that answers searches only after two seconds"""
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            time.sleep(2)
+            body = json.dumps({'results': [{'chunk_id': 'late', 'document_id': 'late', 'similarity': 1.0}]})
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.end_headers()
+            self.wfile.write(body.encode())
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+def unused_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def search_ids(pipeline, query='confidential information'):
+    result = pipeline.search(query, top_k=50, collapse_duplicates=False, merge_adjacent_hits=False, diversity=0)
+    return result, {hit['document_id'] for hit in result['results']}
+
+
+class TestShardedRAGPipeline:
+    """Documents are partitioned by document_id and searches gathered from every shard."""
+
+    def test_documents_go_to_their_shard_and_searches_reach_all(self, shards):
+        router = ShardRouter(shards, timeout=10)
+        pipeline = app.ShardedRAGPipeline(router)
+
+        for document_id, text in DOCUMENTS.items():
+            update = pipeline.add_document_version(document_id, text)
+            assert update['shard'] == shards[shard_for(document_id, 2)]
+            assert update['chunks'] == 1
+        pipeline.add_document_stream('streamed', iter(['The Supplier shall keep ', 'all records confidential.']))
+
+        # Each shard only holds the documents it owns
+        for shard, url in enumerate(shards):
+            hits = requests.post(f"{url}/api/semantic-search", timeout=10,
+                                 json={'query': 'confidential', 'top_k': 50, 'diversity': 0}).json()['results']
+            owned = {document_id for document_id in list(DOCUMENTS) + ['streamed']
+                     if shard_for(document_id, 2) == shard}
+            assert {hit['document_id'] for hit in hits} == owned
+
+        result, found = search_ids(pipeline)
+        assert found == set(DOCUMENTS) | {'streamed'}
+        assert not result['partial'] and [s['status'] for s in result['shards']] == ['ok', 'ok']
+        assert len(pipeline.retrieve_relevant_chunks('confidential information', top_k=3)) == 3
+
+    def test_slow_and_dead_shards_are_left_out(self, shards, slow_shard):
+        dead = f"http://127.0.0.1:{unused_port()}"
+        pipeline = app.ShardedRAGPipeline(ShardRouter(shards + [slow_shard, dead], timeout=0.5,
+                                                      failure_threshold=1))
+        for document_id, text in DOCUMENTS.items():
+            if shard_for(document_id, 4) < 2:
+                pipeline.add_document_version(document_id, text)
+
+        started = time.monotonic()
+        result, found = search_ids(pipeline)
+        assert time.monotonic() - started < 1.5
+        assert result['partial']
+        assert [s['status'] for s in result['shards']] == ['ok', 'ok', 'timeout', 'error']
+        assert 'late' not in found and found
+
+        # The dead shard's breaker opened, so it is no longer called
+        result, _ = search_ids(pipeline)
+        assert result['shards'][3]['status'] == 'unavailable'
+        assert pipeline.router.snapshot()['partial'] == 2
+
+    def test_document_requests_go_to_the_owning_shard(self, shards, monkeypatch):
+        pipeline = app.ShardedRAGPipeline(ShardRouter(shards, timeout=10))
+        monkeypatch.setattr(app, 'rag_pipeline', pipeline)
+        client = app.app.test_client()
+        pipeline.add_document_version('lease/2024', 'The Tenant shall pay the rent monthly in advance.')
+        owner = shards[shard_for('lease/2024', 2)]
+        # Another tenant's lease on the same shard
+        neighbour = next(f"lease-{i}" for i in range(100) if shards[shard_for(f"lease-{i}", 2)] == owner)
+        pipeline.add_document_version(neighbour, 'The Tenant shall pay the rent weekly in arrears.')
+
+        assert pipeline.get_document('lease/2024') == 'The Tenant shall pay the rent monthly in advance.'
+        assert pipeline.get_document('unknown') is None
+        response = client.post('/api/sessions', json={'document_id': 'lease/2024'})
+        assert response.status_code == 201
+        assert client.post('/api/sessions', json={'document_id': 'unknown'}).status_code == 400
+
+        answer = pipeline.answer_question('When is the rent due?', 'lease/2024')
+        assert answer['shard'] == owner and answer['sources'] and answer['answer']
+        assert all(source.startswith('lease/2024_') for source in answer['sources'])
+
+        assert client.delete('/api/documents/lease%2F2024').status_code == 200
+        assert pipeline.get_document('lease/2024') is None
+        _, found = search_ids(pipeline, 'tenant rent')
+        assert 'lease/2024' not in found
+        # A missing document does not count against the shard's breaker
+        assert all(breaker['state'] == 'closed' for breaker in pipeline.router.snapshot()['shards'].values())
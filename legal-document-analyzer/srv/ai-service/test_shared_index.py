@@ -0,0 +1,176 @@
+import multiprocessing
+
+import numpy as np
+import pytest
+
+import app
+from embedding_index import EmbeddingIndex
+from shared_index import SharedEmbeddingIndex
+
+
+def run_in_child(target, *args):
+    """Run target in a forked process, as a pre-fork worker would"""
+    process = multiprocessing.get_context('fork').Process(target=target, args=args)
+    process.start()
+    process.join(30)
+    assert process.exitcode == 0
+
+
+def unit_vectors(count, dim=16, seed=0):
+    vectors = np.random.default_rng(seed).normal(size=(count, dim))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def write_rows(directory, vectors, deleted_rows):
+    index = SharedEmbeddingIndex(directory, initial_capacity=4)
+    with index.writing():
+        index.add(vectors)
+        index.delete(deleted_rows)
+        index.publish([{'rows': len(vectors)}])
+
+
+class TestSharedEmbeddingIndex:
+    """Rows written by one process should be searchable in all of them."""
+
+    def test_rows_written_in_another_process_are_searchable(self, tmp_path):
+        index = SharedEmbeddingIndex(str(tmp_path))
+        assert index.refresh() == []
+        vectors = unit_vectors(50)
+
+        # Grows the files past the initial capacity in the child
+        run_in_child(write_rows, str(tmp_path), vectors, [3])
+
+        assert index.changed()
+        assert index.refresh() == [{'rows': 50}]
+        assert len(index) == 50 and index.deleted_count == 1
+        reference = EmbeddingIndex()
+        reference.add(vectors)
+        reference.delete([3])
+        for query in vectors[:5]:
+            assert index.search(query, 5)[0].tolist() == reference.search(query, 5)[0].tolist()
+        assert 3 not in index.search(vectors[3], 50)[0]
+
+        # Nothing new: no records are replayed twice
+        assert not index.changed()
+        assert index.refresh() == []
+
+    def test_writers_append_after_each_other(self, tmp_path):
+        index = SharedEmbeddingIndex(str(tmp_path))
+        with index.writing():
+            index.add(unit_vectors(3, seed=1))
+            index.publish(['first'])
+
+        run_in_child(write_rows, str(tmp_path), unit_vectors(2, seed=2), [])
+
+        with index.writing() as records:
+            assert records == [{'rows': 2}]
+            assert index.add(unit_vectors(1, seed=3)) == 5
+            index.publish(['third'])
+        np.testing.assert_allclose(index.vectors([3, 4]), unit_vectors(2, seed=2))
+
+    def test_compacted_journal_starts_from_the_snapshot(self, tmp_path):
+        writer, reader = SharedEmbeddingIndex(str(tmp_path)), SharedEmbeddingIndex(str(tmp_path))
+        with writer.writing():
+            writer.publish(['first', 'second'])
+        assert reader.refresh() == ['first', 'second']
+        assert writer.should_compact(0) and not writer.should_compact(1024)
+
+        with writer.writing():
+            writer.publish(['third'])
+            writer.compact(['state'])
+        # Not compacted again until the journal doubles
+        assert not writer.should_compact(0)
+        with writer.writing():
+            writer.publish(['fourth'])
+        # Only the newest journal is left, and it is read from its snapshot
+        assert [path.name for path in tmp_path.glob('journal.*')] == ['journal.1']
+        assert reader.refresh() == ['state', 'fourth']
+        assert SharedEmbeddingIndex(str(tmp_path)).refresh() == ['state', 'fourth']
+
+    def test_storage_must_match(self, tmp_path):
+        SharedEmbeddingIndex(str(tmp_path), storage='int8')
+        with pytest.raises(ValueError):
+            SharedEmbeddingIndex(str(tmp_path), storage='float32')
+
+    def test_copy_keeps_quantized_rows_and_tombstones(self, tmp_path):
+        private = EmbeddingIndex('int8')
+        private.add(unit_vectors(10))
+        private.delete([2])
+
+        index = SharedEmbeddingIndex(str(tmp_path), storage='int8')
+        with index.writing():
+            index.copy_from(private)
+            index.publish()
+        np.testing.assert_array_equal(index.vectors(range(10)), private.vectors(range(10)))
+        assert index.deleted_count == 1
+
+
+DOCUMENTS = {
+    'nda': 'The Recipient shall keep all Confidential Information strictly confidential.\n\n'
+           'This Agreement is governed by the laws of the State of Delaware.',
+    'lease': 'The Tenant shall pay rent monthly in advance.\n\n'
+             'This Agreement is governed by the laws of the State of Delaware.'
+}
+DOCUMENTS['nda-copy'] = DOCUMENTS['nda']
+
+
+def add_documents(pipeline):
+    for document_id, text in DOCUMENTS.items():
+        pipeline.add_document_version(document_id, text)
+
+
+def remove_nda(pipeline):
+    pipeline.remove_document('nda')
+
+
+class TestSharedRAGPipeline:
+    """Documents added or removed through one worker should be visible to the others."""
+
+    def test_workers_see_each_others_documents(self, tmp_path):
+        pipeline = app.RAGPipeline()
+        pipeline.add_document_version('msa', 'The Supplier shall deliver the goods within thirty days.')
+        pipeline.share_index(str(tmp_path))
+        assert len(pipeline.retrieve_relevant_chunks('deliver goods', top_k=10)) == 1
+
+        run_in_child(add_documents, pipeline)
+
+        results = pipeline.retrieve_relevant_chunks('governing law Delaware', top_k=10,
+                                                    collapse_duplicates=False, merge_adjacent_hits=False)
+        assert {r['document_id'] for r in results} == {'msa', 'nda', 'lease'}
+        assert pipeline.documents['nda'] == DOCUMENTS['nda']
+        assert all(r['text'] in pipeline.documents[r['document_id']] for r in results)
+        # The copy shares the original's row
+        assert len(pipeline.embedding_index) == 3
+        assert [r['duplicates'] for r in results if r['document_id'] == 'nda'] == [['nda-copy_0']]
+
+        run_in_child(remove_nda, pipeline)
+
+        results = pipeline.retrieve_relevant_chunks('governing law Delaware', top_k=10,
+                                                    collapse_duplicates=False, merge_adjacent_hits=False)
+        assert {r['document_id'] for r in results} == {'msa', 'nda-copy', 'lease'}
+        assert 'nda' not in pipeline.documents
+
+        # This worker's own update goes after the rows the others appended
+        update = pipeline.add_document_version('lease', DOCUMENTS['lease'] + ' Rent is due on the first day.')
+        assert update['chunks'] >= 1
+        assert len(pipeline.embedding_index) == 4
+
+    def test_workers_replay_a_compacted_journal(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(app, 'SHARED_JOURNAL_MAX_BYTES', 0)
+        pipeline = app.RAGPipeline()
+        pipeline.add_document_version('msa', 'The Supplier shall deliver the goods within thirty days.')
+        pipeline.share_index(str(tmp_path))
+
+        run_in_child(add_documents, pipeline)
+        run_in_child(remove_nda, pipeline)
+        assert [path.name for path in tmp_path.glob('journal.*')] != ['journal.0']
+
+        results = pipeline.retrieve_relevant_chunks('governing law Delaware', top_k=10,
+                                                    collapse_duplicates=False, merge_adjacent_hits=False)
+        assert {r['document_id'] for r in results} == {'msa', 'nda-copy', 'lease'}
+        assert set(pipeline.documents) == {'msa', 'nda-copy', 'lease'}
+        assert pipeline.fingerprints.query(app.simhash(DOCUMENTS['nda'])) == [('nda-copy', 0)]
+        assert sorted(pipeline.row_fingerprints) == sorted(pipeline.row_keys)
+
+        update = pipeline.add_document_version('nda-copy', DOCUMENTS['nda'])
+        assert update['chunks_embedded'] == 0
@@ -0,0 +1,39 @@
+from telemetry import Histogram, Trace, _current_trace, span
+
+
+class TestHistogram:
+    """Tests for the Prometheus histogram."""
+
+    def test_observe_fills_cumulative_buckets(self):
+        histogram = Histogram('test_seconds', 'Test latency', ('route',), buckets=(0.1, 1.0))
+        histogram.observe(0.05, route='/a')
+        histogram.observe(0.5, route='/a')
+        histogram.observe(5.0, route='/a')
+
+        lines = histogram.render()
+        assert 'test_seconds_bucket{route="/a",le="0.1"} 1' in lines
+        assert 'test_seconds_bucket{route="/a",le="1.0"} 2' in lines
+        assert 'test_seconds_bucket{route="/a",le="+Inf"} 3' in lines
+        assert 'test_seconds_count{route="/a"} 3' in lines
+        assert histogram.count(route='/a') == 3
+
+    def test_label_values_are_escaped(self):
+        histogram = Histogram('test_seconds', 'Test latency', ('route',), buckets=(1.0,))
+        histogram.observe(0.5, route='say "hi"')
+        assert 'test_seconds_count{route="say \\"hi\\""} 1' in histogram.render()
+
+
+def test_span_records_into_current_trace():
+    """Spans add their duration to the active request trace."""
+    trace = Trace()
+    _current_trace.set(trace)
+    try:
+        with span('retrieval'):
+            pass
+        with span('retrieval'):
+            pass
+    finally:
+        _current_trace.set(None)
+
+    assert set(trace.stage_ms()) == {'retrieval'}
+    assert trace.stages['retrieval'] >= 0
@@ -0,0 +1,84 @@
+import gzip
+import json
+
+import numpy as np
+import pytest
+
+import app
+import wire_format
+from wire_format import decode_float32
+
+CLAUSES = ['Liability is limited to the fees paid.', 'Either party may terminate on notice.']
+
+
+@pytest.fixture
+def client(monkeypatch, embedder):
+    monkeypatch.setattr(app, 'get_embedding_model', lambda: embedder)
+    app.app.config['TESTING'] = True
+    with app.app.test_client() as client:
+        yield client
+
+
+def test_embed_keeps_json_floats_by_default(client):
+    data = json.loads(client.post('/api/embed', json={'text': CLAUSES[0]}).data)
+    assert len(data['embedding']) == data['dimension'] == 384
+    assert data['model'] == app.EMBEDDING_MODEL_NAME
+
+
+def test_embed_base64_and_raw_float32_match_the_floats(client, embedder):
+    expected = embedder.encode(CLAUSES)
+
+    data = json.loads(client.post('/api/embed', json={'texts': CLAUSES, 'encoding': 'base64'}).data)
+    assert data['count'] == 2 and data['encoding'] == 'base64'
+    assert np.array_equal(np.stack([decode_float32(vector) for vector in data['embeddings']]), expected)
+
+    response = client.post('/api/embed', json={'texts': CLAUSES}, headers={'Accept': 'application/octet-stream'})
+    assert response.mimetype == 'application/octet-stream'
+    assert response.headers['X-Embedding-Count'] == '2'
+    assert len(response.data) == 2 * 384 * 4
+    assert np.array_equal(decode_float32(response.data, int(response.headers['X-Embedding-Dimension'])), expected)
+
+    assert client.post('/api/embed', json={'texts': ['ok', '']}).status_code == 400
+
+
+def test_gzip_request_and_response_bodies(client):
+    body = gzip.compress(json.dumps({'texts': CLAUSES * 4}).encode())
+    response = client.post('/api/embed', data=body, content_type='application/json',
+                           headers={'Content-Encoding': 'gzip', 'Accept-Encoding': 'gzip'})
+
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert json.loads(gzip.decompress(response.data))['count'] == 8
+
+    # Small responses and clients that do not accept gzip stay uncompressed
+    assert 'Content-Encoding' not in client.post('/api/embed', json={'texts': CLAUSES}).headers
+    assert 'Content-Encoding' not in client.get('/health/live', headers={'Accept-Encoding': 'gzip'}).headers
+
+
+def test_gzip_bodies_expanding_past_the_limit_are_rejected(client, monkeypatch):
+    """A few KB of gzip must not decode into an unbounded body."""
+    monkeypatch.setitem(app.app.config, 'MAX_DECODED_CONTENT_LENGTH', 1024 * 1024)
+    bomb = gzip.compress(b'{"texts": ["' + b'a' * (16 * 1024 * 1024) + b'"]}')
+    assert len(bomb) < 64 * 1024
+
+    response = client.post('/api/embed', data=bomb, content_type='application/json',
+                           headers={'Content-Encoding': 'gzip'})
+    assert response.status_code == 413
+    assert 'error' in json.loads(response.data)
+
+    # The compressed body itself is capped by MAX_CONTENT_LENGTH
+    monkeypatch.setitem(app.app.config, 'MAX_CONTENT_LENGTH', 1024)
+    response = client.post('/api/embed', data=bomb, content_type='application/json',
+                           headers={'Content-Encoding': 'gzip'})
+    assert response.status_code == 413
+
+
+def test_msgpack_round_trip(client, embedder):
+    msgpack = pytest.importorskip('msgpack')
+    response = client.post('/api/embed', data=msgpack.packb({'texts': CLAUSES}), content_type='application/msgpack',
+                           headers={'Accept': 'application/msgpack'})
+
+    data = msgpack.unpackb(response.data, raw=False)
+    assert response.mimetype == wire_format.MSGPACK
+    assert np.array_equal(decode_float32(data['embeddings'], data['dimension']), embedder.encode(CLAUSES))
@@ -0,0 +1,208 @@
+"""Persistent chunk embedding store backed by SQLite.
+
+Mirrors the columns of the HANA tables LEGAL_DOCUMENT_ANALYZER_DOCUMENT_EMBEDDINGS
+and LEGAL_DOCUMENT_ANALYZER_CLAUSE_EMBEDDINGS (db/src/vector-tables.hdbtable)
+so the AI service can keep its RAG and clause indexes across restarts and
+bulk loads can run without the CAP/HANA stack.
+Embeddings are stored as little-endian float32 blobs.
+"""
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterator, List
+
+import numpy as np
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS document_embeddings (
+    id TEXT PRIMARY KEY,
+    document_id TEXT NOT NULL,
+    chunk_id TEXT NOT NULL,
+    chunk_text TEXT,
+    embedding_vector BLOB NOT NULL,
+    chunk_index INTEGER,
+    start_offset INTEGER,
+    end_offset INTEGER,
+    created_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_doc_embeddings_doc_id ON document_embeddings (document_id);
+CREATE TABLE IF NOT EXISTS clause_embeddings (
+    id TEXT PRIMARY KEY,
+    clause_id TEXT NOT NULL,
+    document_id TEXT NOT NULL,
+    clause_type TEXT,
+    clause_text TEXT,
+    embedding_vector BLOB NOT NULL,
+    confidence_score REAL,
+    start_offset INTEGER,
+    end_offset INTEGER,
+    created_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_clause_embeddings_doc_id ON clause_embeddings (document_id);
+CREATE INDEX IF NOT EXISTS idx_clause_embeddings_type ON clause_embeddings (clause_type);
+"""
+
+INSERT_SQL = (
+    'INSERT OR REPLACE INTO document_embeddings '
+    '(id, document_id, chunk_id, chunk_text, embedding_vector, chunk_index, '
+    'start_offset, end_offset, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)'
+)
+
+INSERT_CLAUSE_SQL = (
+    'INSERT OR REPLACE INTO clause_embeddings '
+    '(id, clause_id, document_id, clause_type, clause_text, embedding_vector, confidence_score, '
+    'start_offset, end_offset, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'
+)
+
+
+class SQLiteVectorStore:
+    """Chunk embeddings persisted in a local SQLite database"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(SCHEMA)
+
+    def reopen(self):
+        """Open a fresh connection in a forked worker; SQLite connections must not cross fork()"""
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+
+    def add_chunks(self, chunks: List[Dict[str, Any]]):
+        """Insert or replace chunk rows in one transaction"""
+        now = datetime.now().isoformat()
+        rows = [self._row(chunk, now) for chunk in chunks]
+        with self._lock, self._conn:
+            self._conn.executemany(INSERT_SQL, rows)
+
+    @staticmethod
+    def _row(chunk: Dict[str, Any], created_at: str) -> tuple:
+        return (
+            chunk['chunk_id'],
+            chunk['document_id'],
+            chunk['chunk_id'],
+            chunk.get('text'),
+            np.asarray(chunk['embedding'], dtype='<f4').tobytes(),
+            chunk.get('chunk_index'),
+            chunk.get('start_offset'),
+            chunk.get('end_offset'),
+            created_at
+        )
+
+    def replace_document(self, document_id: str, chunks: List[Dict[str, Any]]):
+        """Atomically replace all stored chunks of a document"""
+        now = datetime.now().isoformat()
+        rows = [self._row(chunk, now) for chunk in chunks]
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM document_embeddings WHERE document_id = ?', (document_id,))
+            self._conn.executemany(INSERT_SQL, rows)
+
+    def iter_chunks(self, batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """Yield stored chunks in insertion order"""
+        with self._lock:
+            cursor = self._conn.execute(
+                'SELECT document_id, chunk_id, chunk_text, embedding_vector, chunk_index, '
+                'start_offset, end_offset FROM document_embeddings ORDER BY rowid'
+            )
+            rows = cursor.fetchmany(batch_size)
+        while rows:
+            for document_id, chunk_id, text, blob, chunk_index, start, end in rows:
+                yield {
+                    'document_id': document_id,
+                    'chunk_id': chunk_id,
+                    'text': text,
+                    'embedding': np.frombuffer(blob, dtype='<f4'),
+                    'chunk_index': chunk_index,
+                    'start_offset': start,
+                    'end_offset': end
+                }
+            with self._lock:
+                rows = cursor.fetchmany(batch_size)
+
+    def get_embeddings(self, chunk_ids: List[str]) -> np.ndarray:
+        """Full-precision embeddings for the given chunks, in the given order"""
+        placeholders = ','.join('?' * len(chunk_ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f'SELECT chunk_id, embedding_vector FROM document_embeddings WHERE id IN ({placeholders})',
+                list(chunk_ids)
+            ).fetchall()
+        by_id = {chunk_id: blob for chunk_id, blob in rows}
+        return np.stack([np.frombuffer(by_id[chunk_id], dtype='<f4') for chunk_id in chunk_ids])
+
+    def replace_document_clauses(self, document_id: str, clauses: List[Dict[str, Any]]):
+        """Atomically replace all stored clause embeddings of a document"""
+        now = datetime.now().isoformat()
+        rows = [(
+            clause['clause_id'],
+            clause['clause_id'],
+            document_id,
+            clause['type'],
+            clause.get('content'),
+            np.asarray(clause['embedding'], dtype='<f4').tobytes(),
+            clause.get('confidence'),
+            clause.get('start_position'),
+            clause.get('end_position'),
+            now
+        ) for clause in clauses]
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM clause_embeddings WHERE document_id = ?', (document_id,))
+            self._conn.executemany(INSERT_CLAUSE_SQL, rows)
+
+    def iter_clauses(self, batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """Yield stored clause embeddings in insertion order"""
+        with self._lock:
+            cursor = self._conn.execute(
+                'SELECT clause_id, document_id, clause_type, clause_text, embedding_vector, '
+                'confidence_score, start_offset, end_offset FROM clause_embeddings ORDER BY rowid'
+            )
+            rows = cursor.fetchmany(batch_size)
+        while rows:
+            for clause_id, document_id, clause_type, text, blob, confidence, start, end in rows:
+                yield {
+                    'clause_id': clause_id,
+                    'document_id': document_id,
+                    'type': clause_type,
+                    'content': text,
+                    'embedding': np.frombuffer(blob, dtype='<f4'),
+                    'confidence': confidence,
+                    'start_position': start,
+                    'end_position': end
+                }
+            with self._lock:
+                rows = cursor.fetchmany(batch_size)
+
+    def delete_document_clauses(self, document_id: str) -> int:
+        """Remove all clause embeddings of a document"""
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                'DELETE FROM clause_embeddings WHERE document_id = ?', (document_id,)
+            )
+        return cursor.rowcount
+
+    def has_document(self, document_id: str) -> bool:
+        """Check whether any chunk of the document is stored"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT 1 FROM document_embeddings WHERE document_id = ? LIMIT 1', (document_id,)
+            ).fetchone()
+        return row is not None
+
+    def delete_document(self, document_id: str) -> int:
+        """Remove all chunks of a document"""
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                'DELETE FROM document_embeddings WHERE document_id = ?', (document_id,)
+            )
+        return cursor.rowcount
+
+    def count(self) -> int:
+        """Number of stored chunks"""
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM document_embeddings').fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,231 @@
+"""Compact wire formats and body compression for the AI service APIs.
+
+JSON float lists cost about 8 KB of text per 384-dimensional embedding and
+slow float formatting and parsing on both ends. Endpoints that return
+vectors negotiate a compact representation:
+
+* ``Accept: application/octet-stream``: raw little-endian float32, row-major,
+  with the shape in ``X-Embedding-Count`` / ``X-Embedding-Dimension`` headers
+* ``Accept: application/msgpack``: MessagePack with vectors as float32 bytes
+  (needs the optional ``msgpack`` package)
+* JSON with ``encoding: "base64"``: each vector as base64 of its float32 bytes
+
+MessagePack request bodies are accepted wherever JSON is. ``install_compression``
+decodes gzip or zstd request bodies (``Content-Encoding``) and compresses
+responses for clients that send ``Accept-Encoding``; zstd needs the optional
+``zstandard`` package. Encoded bodies are answered with 413 once they grow
+past the app's ``MAX_CONTENT_LENGTH`` as sent or ``MAX_DECODED_CONTENT_LENGTH``
+once decoded, so a small compressed body cannot expand without bound.
+"""
+import base64
+import gzip
+import importlib.util
+import io
+from typing import Any, Dict, List
+
+import numpy as np
+from flask import Response, jsonify, request
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.wsgi import LimitedStream
+
+MSGPACK_AVAILABLE = importlib.util.find_spec('msgpack') is not None
+ZSTD_AVAILABLE = importlib.util.find_spec('zstandard') is not None
+
+JSON = 'application/json'
+MSGPACK = 'application/msgpack'
+FLOAT32 = 'application/octet-stream'
+MSGPACK_TYPES = (MSGPACK, 'application/x-msgpack')
+
+FLOAT32_LE = np.dtype('<f4')
+
+# Responses smaller than this are not worth compressing
+MIN_COMPRESS_BYTES = 1024
+GZIP_LEVEL = 5
+ZSTD_LEVEL = 3
+
+# Set in the WSGI environ when a decoded request body went past its limit
+BODY_TOO_LARGE = 'wire_format.body_too_large'
+
+
+def negotiate(raw_vectors: bool = False) -> str:
+    """Response format the client prefers among the ones this endpoint offers"""
+    offers = [JSON]
+    if MSGPACK_AVAILABLE:
+        offers += list(MSGPACK_TYPES)
+    if raw_vectors:
+        offers.append(FLOAT32)
+    best = request.accept_mimetypes.best_match(offers, default=JSON)
+    return MSGPACK if best in MSGPACK_TYPES else best
+
+
+def read_payload() -> Dict[str, Any]:
+    """Request body as a dict, from JSON or MessagePack"""
+    if request.mimetype in MSGPACK_TYPES:
+        if not MSGPACK_AVAILABLE:
+            raise ValueError('MessagePack request bodies need the msgpack package')
+        import msgpack
+        return msgpack.unpackb(request.get_data(), raw=False)
+    return request.get_json()
+
+
+def float32_bytes(vectors) -> bytes:
+    """Little-endian float32 bytes of a vector or row-major matrix"""
+    return np.ascontiguousarray(vectors, dtype=FLOAT32_LE).tobytes()
+
+
+def encode_base64(vector) -> str:
+    return base64.b64encode(float32_bytes(vector)).decode('ascii')
+
+
+def decode_float32(data, dimension: int = None) -> np.ndarray:
+    """Vectors from float32 bytes or their base64 text (one row per vector when dimension is given)"""
+    if isinstance(data, str):
+        data = base64.b64decode(data)
+    vectors = np.frombuffer(data, dtype=FLOAT32_LE).astype(np.float32)
+    return vectors.reshape(-1, dimension) if dimension else vectors
+
+
+def vectors_response(vectors: np.ndarray, fmt: str, encoding: str = None, single: bool = False,
+                     **fields) -> Response:
+    """Embedding response in the negotiated format.
+
+    ``vectors`` is a (count, dimension) matrix; ``single`` returns the one
+    vector under ``embedding`` instead of a list under ``embeddings``.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    count, dimension = vectors.shape
+    if fmt == FLOAT32:
+        response = Response(float32_bytes(vectors), mimetype=FLOAT32)
+        response.headers['X-Embedding-Count'] = str(count)
+        response.headers['X-Embedding-Dimension'] = str(dimension)
+        response.headers['X-Embedding-Dtype'] = 'float32-le'
+        for name, value in fields.items():
+            response.headers[f"X-Embedding-{name.replace('_', '-').title()}"] = str(value)
+        return response
+
+    if fmt == MSGPACK:
+        # Binary vectors: the whole matrix for batches, like the raw format
+        payload = {'embedding' if single else 'embeddings': float32_bytes(vectors[0] if single else vectors)}
+        return payload_response({**payload, 'dtype': 'float32-le', 'count': count,
+                                 'dimension': dimension, **fields}, MSGPACK)
+
+    if encoding == 'base64':
+        encoded = [encode_base64(vector) for vector in vectors]
+        extra = {'encoding': 'base64', 'dtype': 'float32-le'}
+    else:
+        encoded = vectors.tolist()
+        extra = {}
+    payload = {'embedding': encoded[0]} if single else {'embeddings': encoded, 'count': count}
+    return payload_response({**payload, 'dimension': dimension, **extra, **fields}, JSON)
+
+
+def payload_response(payload: Dict[str, Any], fmt: str, status: int = 200) -> Response:
+    """JSON or MessagePack response of a plain payload"""
+    if fmt == MSGPACK:
+        import msgpack
+        return Response(msgpack.packb(payload, use_bin_type=True), status=status, mimetype=MSGPACK)
+    response = jsonify(payload)
+    response.status_code = status
+    return response
+
+
+def _preferred_encoding(accepted) -> str:
+    """Response coding to use for an Accept-Encoding header (None for identity)"""
+    candidates: List[str] = (['zstd'] if ZSTD_AVAILABLE else []) + ['gzip']
+    qualities = {coding: accepted[coding] for coding in candidates}
+    best = max(candidates, key=lambda coding: qualities[coding])
+    return best if qualities[best] > 0 else None
+
+
+def compress(data: bytes, coding: str) -> bytes:
+    if coding == 'zstd':
+        import zstandard
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+
+class _DecodedBodyLimit(io.RawIOBase):
+    """Decoded request body that raises 413 once more than max_bytes come out of the decoder"""
+
+    def __init__(self, decoder, max_bytes: int, environ):
+        self.decoder = decoder
+        self.max_bytes = max_bytes
+        self.remaining = max_bytes
+        self.environ = environ
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        # One byte past the limit tells a body that ends exactly there from a larger one
+        data = self.decoder.read(min(len(buffer), self.remaining + 1))
+        if len(data) > self.remaining:
+            self.environ[BODY_TOO_LARGE] = True
+            raise RequestEntityTooLarge(f"Decoded request body exceeds {self.max_bytes} bytes")
+        self.remaining -= len(data)
+        buffer[:len(data)] = data
+        return len(data)
+
+
+class _DecodeRequestBody:
+    """WSGI middleware streaming gzip or zstd request bodies through a decompressor"""
+
+    def __init__(self, wsgi_app, config):
+        self.wsgi_app = wsgi_app
+        self.config = config
+
+    def __call__(self, environ, start_response):
+        coding = environ.get('HTTP_CONTENT_ENCODING', '').strip().lower()
+        if coding in ('gzip', 'zstd'):
+            if coding == 'zstd' and not ZSTD_AVAILABLE:
+                start_response('415 Unsupported Media Type', [('Content-Type', 'text/plain')])
+                return [b'zstd request bodies need the zstandard package']
+            body = environ['wsgi.input']
+            length = environ.get('CONTENT_LENGTH')
+            max_length = self.config.get('MAX_CONTENT_LENGTH')
+            if length and max_length and int(length) > max_length:
+                start_response('413 Request Entity Too Large', [('Content-Type', 'text/plain')])
+                return [f"Request body exceeds {max_length} bytes".encode()]
+            if length:
+                # Never read past the body on keep-alive connections
+                body = LimitedStream(body, int(length))
+            if coding == 'gzip':
+                decoder = gzip.GzipFile(fileobj=body, mode='rb')
+            else:
+                import zstandard
+                decoder = zstandard.ZstdDecompressor().stream_reader(body)
+            max_decoded = self.config.get('MAX_DECODED_CONTENT_LENGTH')
+            if max_decoded:
+                decoder = io.BufferedReader(_DecodedBodyLimit(decoder, max_decoded, environ))
+            environ['wsgi.input'] = decoder
+            # The decoded length is unknown; the stream ends where the compressed body does
+            environ.pop('CONTENT_LENGTH', None)
+            environ.pop('HTTP_CONTENT_ENCODING')
+            environ['wsgi.input_terminated'] = True
+        return self.wsgi_app(environ, start_response)
+
+
+def install_compression(app, min_size: int = MIN_COMPRESS_BYTES):
+    """Accept compressed request bodies and compress responses the client accepts"""
+    app.wsgi_app = _DecodeRequestBody(app.wsgi_app, app.config)
+
+    @app.after_request
+    def _compress_response(response):
+        if request.environ.get(BODY_TOO_LARGE):
+            # Endpoints report errors reading the body as 500s; the client sent too much
+            return payload_response({'error': RequestEntityTooLarge.description}, JSON, 413)
+        if (response.direct_passthrough or response.is_streamed or 'Content-Encoding' in response.headers
+                or not 200 <= response.status_code < 300):
+            return response
+        coding = _preferred_encoding(request.accept_encodings)
+        if coding is None:
+            return response
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+        response.set_data(compress(data, coding))
+        response.headers['Content-Encoding'] = coding
+        response.vary.add('Accept-Encoding')
+        return response
+
+    return app
@@ -536,8 +536,10 @@ class LegalDocumentService extends cds.ApplicationService {
 
     // Try the AI service first
     try {
+      // base64 float32 is a fraction of the size of JSON floats and much cheaper to parse
       const response = await axios.post('http://localhost:5000/api/embed', {
-        text: text.trim()
+        text: text.trim(),
+        encoding: 'base64'
       }, {
         timeout: 15000, // 15 second timeout
         headers: {
@@ -545,7 +547,10 @@ class LegalDocumentService extends cds.ApplicationService {
         }
       });
 
-      if (response.data && response.data.embedding) {
+      if (response.data && response.data.encoding === 'base64') {
+        const bytes = Buffer.from(response.data.embedding, 'base64');
+        return Array.from({ length: bytes.length / 4 }, (_, i) => bytes.readFloatLE(i * 4));
+      } else if (response.data && response.data.embedding) {
         return response.data.embedding;
       } else {
         throw new Error('Invalid response from embedding service');